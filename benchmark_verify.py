@@ -0,0 +1,589 @@
+#!/usr/bin/env python3
+"""
+Reproducible benchmark of verify_quote() across the raw, hashed and merkle backends.
+
+A corpus is generated from a seed: --posters tracked twitter accounts with
+--posts posts between them, and a set of labeled inputs drawn from those
+posts. The same posts are loaded into each backend's storage in its own
+directory under bench/:
+
+  raw      blockchain.log, one block per post, as server.js appends them
+  hashed   quotes.db (migrated, see common/quotes_store.py) and chain.log
+           with one {recordId, commitment} block per row
+  merkle   quotes.db and chain.log with blocks of --max-records commitments;
+           the last partial group is mined too, so every post is on chain
+
+Chains are written as binary logs (common/chain_log.py), which every reader
+prefers to the JSON; `chain_log.py to-json` converts one if server.js should
+load it.
+
+Each backend's verify_quote.py then runs in a fresh process with
+VERIFY_DATA_DIR pointing at its corpus and the result cache off, and reports
+
+  coldStart   import and a first batch with one input of each kind, which
+              loads the model and builds the embedding store, poster index
+              and corpus-wide index from scratch (with --snapshot, from a
+              verifier.snapshot built beforehand instead)
+  latencyMs   p50/p95/p99 of single verify_quote() calls once warm
+  throughput  sequential verify_quote() and batched verify_quotes() rates
+  peakRssMb   maximum resident set of the process
+  accuracy    share of inputs whose outcome matches the label, by kind
+
+Results go to bench/results/ as JSON; `compare` diffs two of them and exits
+non-zero when a metric regressed by more than --tolerance.
+
+    python3 benchmark_verify.py generate [--posts 10000] [--posters 50] [--seed 1]
+    python3 benchmark_verify.py run [--posts 10000] [--posters 50] [--modes raw,hashed,merkle]
+    python3 benchmark_verify.py compare bench/results/old.json bench/results/new.json
+"""
+import argparse
+import json
+import os
+import platform as platform_info
+import random
+import resource
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from ingest_posts import QUOTE_COLUMNS, commitment, js_iso, mine
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BENCH_DIR = os.path.join(BASE_DIR, "bench")
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+BACKENDS = {
+    "raw": os.path.join(BASE_DIR, "raw_data_blockchain"),
+    "hashed": os.path.join(BASE_DIR, "hash_on_blockchain"),
+    "merkle": os.path.join(BASE_DIR, "merkle_tree_blockchain"),
+}
+GENERATOR_VERSION = 2  # bump when the corpus or labels change shape
+POSTS = 10000
+POSTERS = 50
+INPUTS = 200
+SEED = 1
+DIFFICULTY = 0  # mining cost is not what is measured here
+MAX_RECORDS = 16
+BATCH = 32
+TOLERANCE = 0.10
+
+EPOCH = datetime(2025, 1, 1, tzinfo=timezone.utc)
+EPOCH_MS = int(EPOCH.timestamp() * 1000)
+FIRST_POST_ID = 1900000000000000000
+KINDS = ("verbatim", "paraphrase", "partial", "unattributed", "fabricated")
+
+WORDS = """
+people country government president judge court vote election law policy budget
+economy market price energy power climate weather fire water border city state
+nation world war peace army security freedom rights justice history future
+family school health hospital doctor worker job wage tax business company bank
+money trade tariff factory farm food car rocket space satellite engine internet
+phone speech media press news truth story report question answer decision plan
+promise record reform crisis support growth progress community leader member
+senate congress parliament minister council union europe america ukraine russia
+china germany refugee winter summer morning tonight tomorrow week year decade
+great terrible strong weak fair unfair free open secret important historic new
+old real fake honest corrupt proud angry happy worried ready simple serious
+must should will never always again finally today together against because
+build protect fight win lose stop start cut raise lower fund ban allow demand
+deliver destroy restore defend attack ignore respect thank welcome remember
+""".split()
+SYLLABLES = "ka vor lin dre mu sel tor ean bri zon qua fen ros tal wyn gar ix ul pem sha".split()
+
+
+# -- corpus ------------------------------------------------------------------
+
+def sentence(rng, low=12, high=28):
+    words = [rng.choice(WORDS) for _ in range(rng.randint(low, high))]
+    return " ".join(words).capitalize() + "."
+
+
+def make_posters(rng, count):
+    """[(handle, display name)], unique, built from syllables no vocabulary word contains."""
+    posters, seen = [], set()
+    while len(posters) < count:
+        first = "".join(rng.choice(SYLLABLES) for _ in range(2)).capitalize()
+        last = "".join(rng.choice(SYLLABLES) for _ in range(3)).capitalize()
+        handle = f"{first}{last}"
+        if handle.lower() not in seen:
+            seen.add(handle.lower())
+            posters.append((handle, f"{first} {last}"))
+    return posters
+
+
+def iter_corpus(meta):
+    """Quotes rows (platform, poster, post_id, content, post_time, tweet_url), the same on every call."""
+    rng = random.Random(f"{meta['seed']}:posts")
+    handles = [handle for handle, _ in meta["posters"]]
+    for i in range(meta["posts"]):
+        poster = rng.choice(handles)
+        post_id = str(FIRST_POST_ID + i)
+        yield ("twitter", poster, post_id, sentence(rng), js_iso(EPOCH + timedelta(seconds=37 * i)),
+               f"https://twitter.com/{poster}/status/{post_id}")
+
+
+def paraphrase(rng, text):
+    """Drop about a sixth of the words and swap one neighbouring pair."""
+    words = text.rstrip(".").split()
+    kept = [w for i, w in enumerate(words) if i == 0 or rng.random() > 0.17]
+    if len(kept) > 3:
+        j = rng.randrange(1, len(kept) - 1)
+        kept[j], kept[j + 1] = kept[j + 1], kept[j]
+    return " ".join(kept)
+
+
+def excerpt(rng, text, words=9):
+    """A run of `words` consecutive words from text."""
+    tokens = text.rstrip(".").split()
+    start = rng.randrange(max(1, len(tokens) - words + 1))
+    return " ".join(tokens[start:start + words])
+
+
+def make_inputs(meta, count):
+    """Labeled inputs, spread evenly over KINDS; `expect` is what a correct verifier returns."""
+    rng = random.Random(f"{meta['seed']}:inputs")
+    names = dict(meta["posters"])
+    picks = set(rng.sample(range(meta["posts"]), min(count, meta["posts"])))
+    sources = [row for i, row in enumerate(iter_corpus(meta)) if i in picks]
+    rng.shuffle(sources)
+
+    inputs = []
+    for n, (_, poster, post_id, content, _, _) in enumerate(sources):
+        kind = KINDS[n % len(KINDS)]
+        alias = rng.choice([poster, names[poster]])
+        if kind == "verbatim":
+            text, expect = f'{alias}: "{content}"', {"verified": True, "poster": poster, "postId": post_id}
+        elif kind == "paraphrase":
+            text = f"{alias} said that {paraphrase(rng, content)}"
+            expect = {"verified": True, "poster": poster, "postId": post_id}
+        elif kind == "partial":
+            text = f"{alias} said that {paraphrase(rng, excerpt(rng, content))}"
+            expect = {"verified": True, "poster": poster, "postId": post_id}
+        elif kind == "unattributed":
+            text, expect = content, {"verified": True, "poster": poster, "postId": post_id}
+        else:
+            text, expect = f'{alias}: "{sentence(rng)}"', {"verified": False}
+        inputs.append({"tweetId": f"bench-{n}", "content": text, "kind": kind, "expect": expect})
+    return inputs
+
+
+def blocks_raw(meta):
+    prev = mine({
+        "index": 0,
+        "timestamp": EPOCH_MS,
+        "data": {"platform": "genesis", "poster": "genesis", "post_id": "0",
+                 "content": "Genesis Block", "post_time": js_iso(EPOCH)},
+        "previousHash": "0",
+    }, 0)
+    yield prev
+    for i, (platform, poster, post_id, content, post_time, url) in enumerate(iter_corpus(meta), 1):
+        prev = mine({
+            "index": i,
+            "timestamp": EPOCH_MS + i,
+            "data": {"platform": platform, "poster": poster, "post_id": post_id,
+                     "content": content, "post_time": post_time, "tweetUrl": url},
+            "previousHash": prev["hash"],
+        }, meta["difficulty"])
+        yield prev
+
+
+def blocks_hashed(meta):
+    prev = mine({"index": 0, "timestamp": EPOCH_MS, "data": {"info": "genesis"}, "previousHash": "0"}, 0)
+    yield prev
+    # A fresh AUTOINCREMENT table numbers the rows 1..n in insertion order.
+    for i, row in enumerate(iter_corpus(meta), 1):
+        prev = mine({
+            "index": i,
+            "timestamp": EPOCH_MS + i,
+            "data": {"recordId": i, "commitment": commitment(row)},
+            "previousHash": prev["hash"],
+        }, meta["difficulty"])
+        yield prev
+
+
+def blocks_merkle(meta):
+    from merkle import MerkleTree
+
+    def block(index, records, prev_hash, difficulty):
+        root = MerkleTree([r["commitment"] for r in records]).root if records else None
+        header = mine({"index": index, "timestamp": EPOCH_MS + index, "merkleRoot": root,
+                       "previousHash": prev_hash}, difficulty)
+        return {"index": index, "timestamp": header["timestamp"], "records": records,
+                "previousHash": prev_hash, "nonce": header["nonce"], "merkleRoot": root, "hash": header["hash"]}
+
+    prev = block(0, [], "0", 0)
+    yield prev
+    group = []
+    for row in iter_corpus(meta):
+        group.append({"recordId": row[2], "commitment": commitment(row)})
+        if len(group) == meta["maxRecords"]:
+            prev = block(prev["index"] + 1, group, prev["hash"], meta["difficulty"])
+            yield prev
+            group = []
+    if group:
+        yield block(prev["index"] + 1, group, prev["hash"], meta["difficulty"])
+
+
+def write_quotes_db(path, meta):
+    from common.quotes_store import migrate
+
+    conn = sqlite3.connect(path)
+    try:
+        # The schema init-db.js creates; migrate() adds the indexes afterwards.
+        conn.execute("""
+            CREATE TABLE quotes (
+              id         INTEGER PRIMARY KEY AUTOINCREMENT,
+              platform   TEXT    NOT NULL,
+              poster     TEXT    NOT NULL,
+              post_id    TEXT    NOT NULL,
+              content    TEXT    NOT NULL,
+              post_time  TEXT    NOT NULL,
+              tweet_url  TEXT
+            )
+        """)
+        with conn:
+            conn.executemany(f"INSERT INTO quotes ({QUOTE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)", iter_corpus(meta))
+        migrate(conn)
+    finally:
+        conn.close()
+
+
+def load_backend(mode, directory, meta):
+    """Write one backend's storage for the corpus; returns seconds taken and bytes written."""
+    from common.chain_log import ChainLog
+
+    started = time.perf_counter()
+    os.makedirs(directory)
+    tracked = {"twitter": {handle: [handle, name] for handle, name in meta["posters"]}}
+    with open(os.path.join(directory, "tracked_people.json"), "w", encoding="utf-8") as f:
+        json.dump(tracked, f, indent=2)
+    if mode == "raw":
+        ChainLog.create(os.path.join(directory, "blockchain.log"), blocks_raw(meta)).close()
+    else:
+        write_quotes_db(os.path.join(directory, "quotes.db"), meta)
+        blocks = blocks_hashed(meta) if mode == "hashed" else blocks_merkle(meta)
+        ChainLog.create(os.path.join(directory, "chain.log"), blocks).close()
+    size = sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+    return {"seconds": round(time.perf_counter() - started, 3), "bytes": size}
+
+
+def corpus_dir(posts, posters, seed):
+    return os.path.join(BENCH_DIR, f"corpus-{posts}x{posters}-s{seed}")
+
+
+def generate(posts=POSTS, posters=POSTERS, seed=SEED, inputs=INPUTS, difficulty=DIFFICULTY,
+             max_records=MAX_RECORDS, modes=tuple(BACKENDS), rebuild=False):
+    """Build (or reuse) the corpus for these parameters and return its corpus.json."""
+    root = corpus_dir(posts, posters, seed)
+    meta_path = os.path.join(root, "corpus.json")
+    params = {"generator": GENERATOR_VERSION, "posts": posts, "seed": seed, "inputs": inputs,
+              "difficulty": difficulty, "maxRecords": max_records}
+    if not rebuild:
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            if all(meta.get(k) == v for k, v in params.items()) and all(m in meta["loads"] for m in modes):
+                return meta
+        except (OSError, ValueError):
+            pass
+    if os.path.isdir(root):
+        shutil.rmtree(root)
+    os.makedirs(root)
+
+    meta = dict(params, posters=make_posters(random.Random(f"{seed}:posters"), posters), loads={})
+    with open(os.path.join(root, "inputs.json"), "w", encoding="utf-8") as f:
+        json.dump(make_inputs(meta, inputs), f, indent=1, ensure_ascii=False)
+    # Loaders import merkle.py from the merkle backend; the rest comes from common/.
+    sys.path.insert(0, BACKENDS["merkle"])
+    for mode in modes:
+        meta["loads"][mode] = load_backend(mode, os.path.join(root, mode), meta)
+        print(f"Loaded {posts} posts into {mode} in {meta['loads'][mode]['seconds']}s", file=sys.stderr)
+    with open(meta_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f, indent=1)
+    return meta
+
+
+# -- measurement -------------------------------------------------------------
+
+def percentile(sorted_values, q):
+    if not sorted_values:
+        return None
+    k = (len(sorted_values) - 1) * q
+    lo, hi = int(k), min(int(k) + 1, len(sorted_values) - 1)
+    return sorted_values[lo] + (sorted_values[hi] - sorted_values[lo]) * (k - lo)
+
+
+def correct(item, result):
+    expect = item["expect"]
+    if bool(result.get("verified")) != expect["verified"]:
+        return False
+    if not expect["verified"]:
+        return True
+    poster = (result.get("identifiedPoster") or "").lower()
+    ids = {str(m.get("tweetId")) for m in result.get("matches") or []}
+    return poster == expect["poster"].lower() and expect["postId"] in ids
+
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS.
+    return round(peak / (1 << 20 if sys.platform == "darwin" else 1 << 10), 1)
+
+
+def measure(mode, inputs_path, output_path, repeat, batch):
+    """Runs in the child process: import the backend's verifier and time it."""
+    with open(inputs_path, "r", encoding="utf-8") as f:
+        items = json.load(f)
+    requests = [{"tweetId": item["tweetId"], "content": item["content"]} for item in items]
+
+    started = time.perf_counter()
+    sys.path.insert(0, BACKENDS[mode])
+    import verify_quote
+    imported = time.perf_counter()
+    # Inputs cycle through KINDS, so this touches every path once: exact,
+    # encoded against a poster, and the corpus-wide search.
+    verify_quote.verify_quotes(requests[:len(KINDS)])
+    first = time.perf_counter()
+
+    latencies, results = [], []
+    for _ in range(repeat):
+        results = []
+        for request in requests:
+            t = time.perf_counter()
+            results.append(verify_quote.verify_quote(request))
+            latencies.append(time.perf_counter() - t)
+    t = time.perf_counter()
+    for _ in range(repeat):
+        for i in range(0, len(requests), batch):
+            verify_quote.verify_quotes(requests[i:i + batch])
+    batched = time.perf_counter() - t
+
+    by_kind = {}
+    for item, result in zip(items, results):
+        counts = by_kind.setdefault(item["kind"], [0, 0])
+        counts[0] += correct(item, result)
+        counts[1] += 1
+    latencies.sort()
+    report = {
+        "coldStart": {
+            "importSeconds": round(imported - started, 4),
+            "firstQuerySeconds": round(first - imported, 4),
+        },
+        "latencyMs": {
+            name: round(percentile(latencies, q) * 1000, 3)
+            for name, q in (("p50", 0.50), ("p95", 0.95), ("p99", 0.99))
+        },
+        "throughput": {
+            "sequential": round(len(latencies) / sum(latencies), 1),
+            "batched": round(len(requests) * repeat / batched, 1),
+        },
+        "peakRssMb": peak_rss_mb(),
+        "accuracy": {
+            "overall": round(sum(c for c, _ in by_kind.values()) / len(items), 4),
+            **{kind: round(c / n, 4) for kind, (c, n) in sorted(by_kind.items())},
+        },
+    }
+    with open(output_path, "w", encoding="utf-8") as f:
+        json.dump(report, f)
+
+
+def run_mode(mode, root, repeat, batch, keep_caches=False, cache=False, snapshot=False):
+    """Measure one backend in a fresh interpreter, so imports and RSS start from zero."""
+    data_dir = os.path.join(root, mode)
+    if not keep_caches:
+        # Derived state the verifier would otherwise reuse from an earlier run.
+        shutil.rmtree(os.path.join(data_dir, "embeddings"), ignore_errors=True)
+        for name in ("poster_index.json", "proof_index.json", "verifier.snapshot"):
+            if os.path.exists(os.path.join(data_dir, name)):
+                os.remove(os.path.join(data_dir, name))
+    env = dict(os.environ, VERIFY_DATA_DIR=data_dir)
+    if not cache:
+        env["VERIFY_CACHE_SIZE"] = "0"
+        env.pop("VERIFY_CACHE_DB", None)
+
+    built = None
+    if snapshot:
+        # Measured separately: cold start is then the start of a worker that finds a snapshot.
+        started = time.perf_counter()
+        proc = subprocess.run([sys.executable, os.path.join(BACKENDS[mode], "verify_quote.py"), "--build-snapshot"],
+                              env=env, capture_output=True, text=True)
+        if proc.returncode != 0:
+            return {"error": (proc.stderr or "").strip().splitlines()[-1:] or [f"exit {proc.returncode}"]}
+        built = {"seconds": round(time.perf_counter() - started, 3), **json.loads(proc.stdout)}
+
+    fd, output_path = tempfile.mkstemp(suffix=".json")
+    os.close(fd)
+    try:
+        proc = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "_measure", mode, os.path.join(root, "inputs.json"),
+             output_path, "--repeat", str(repeat), "--batch", str(batch)],
+            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        )
+        if proc.returncode != 0:
+            return {"error": (proc.stderr or "").strip().splitlines()[-1:] or [f"exit {proc.returncode}"]}
+        with open(output_path, "r", encoding="utf-8") as f:
+            report = json.load(f)
+        if built:
+            report["snapshot"] = built
+        return report
+    finally:
+        os.remove(output_path)
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                                text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform_info.python_version(),
+        "platform": platform_info.platform(),
+        "cpus": os.cpu_count(),
+    }
+
+
+def run(args):
+    modes = args.modes.split(",")
+    meta = generate(args.posts, args.posters, args.seed, args.inputs, args.difficulty,
+                    args.max_records, modes, args.rebuild)
+    root = corpus_dir(args.posts, args.posters, args.seed)
+    report = {
+        "startedAt": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "corpus": {k: meta[k] for k in ("generator", "posts", "seed", "inputs", "difficulty", "maxRecords")},
+        "settings": {"repeat": args.repeat, "batch": args.batch, "keepCaches": args.keep_caches,
+                     "cache": args.cache, "snapshot": args.snapshot,
+                     "encoder": os.getenv("VERIFY_ENCODER") or "torch",
+                     "tier": os.getenv("VERIFY_TIER") or "fp32"},
+        "environment": environment(),
+        "modes": {},
+    }
+    report["corpus"]["posters"] = len(meta["posters"])
+    for mode in modes:
+        print(f"Measuring {mode}...", file=sys.stderr)
+        report["modes"][mode] = dict(run_mode(mode, root, args.repeat, args.batch, args.keep_caches,
+                                              args.cache, args.snapshot),
+                                     load=meta["loads"][mode])
+
+    output = args.output or os.path.join(
+        RESULTS_DIR, f"verify-{args.posts}x{args.posters}-{time.strftime('%Y%m%d-%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=2)
+    print_summary(report)
+    print(f"Saved {output}", file=sys.stderr)
+
+
+def print_summary(report):
+    header = f"{'mode':<8}{'import s':>10}{'first s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}" \
+             f"{'seq/s':>10}{'batch/s':>10}{'rss MB':>10}{'accuracy':>10}"
+    print(header)
+    for mode, r in report["modes"].items():
+        if "error" in r:
+            print(f"{mode:<8}  error: {' '.join(r['error'])}")
+            continue
+        print(f"{mode:<8}{r['coldStart']['importSeconds']:>10}{r['coldStart']['firstQuerySeconds']:>10}"
+              f"{r['latencyMs']['p50']:>10}{r['latencyMs']['p95']:>10}{r['latencyMs']['p99']:>10}"
+              f"{r['throughput']['sequential']:>10}{r['throughput']['batched']:>10}"
+              f"{r['peakRssMb']:>10}{r['accuracy']['overall']:>10}")
+
+
+# -- comparison --------------------------------------------------------------
+
+# (path, True when higher is better)
+METRICS = [
+    (("coldStart", "importSeconds"), False),
+    (("coldStart", "firstQuerySeconds"), False),
+    (("latencyMs", "p50"), False),
+    (("latencyMs", "p95"), False),
+    (("latencyMs", "p99"), False),
+    (("throughput", "sequential"), True),
+    (("throughput", "batched"), True),
+    (("peakRssMb",), False),
+    (("accuracy", "overall"), True),
+]
+
+
+def compare(base_path, new_path, tolerance=TOLERANCE):
+    """Print per-metric changes; returns the regressions beyond tolerance (any accuracy drop counts)."""
+    with open(base_path, "r", encoding="utf-8") as f:
+        base = json.load(f)
+    with open(new_path, "r", encoding="utf-8") as f:
+        new = json.load(f)
+    if base["corpus"] != new["corpus"]:
+        print(f"Warning: corpora differ: {base['corpus']} vs {new['corpus']}", file=sys.stderr)
+
+    regressions = []
+    print(f"{'mode':<8}{'metric':<30}{'base':>12}{'new':>12}{'change':>10}")
+    for mode in sorted(set(base["modes"]) & set(new["modes"])):
+        for path, higher_better in METRICS:
+            old_value, new_value = base["modes"][mode], new["modes"][mode]
+            for key in path:
+                old_value = old_value.get(key) if isinstance(old_value, dict) else None
+                new_value = new_value.get(key) if isinstance(new_value, dict) else None
+            if old_value is None or new_value is None:
+                continue
+            change = (new_value - old_value) / old_value if old_value else 0.0
+            worse = -change if higher_better else change
+            regressed = worse > 0 if path[0] == "accuracy" else worse > tolerance
+            name = ".".join(path)
+            print(f"{mode:<8}{name:<30}{old_value:>12}{new_value:>12}{change:>+10.1%}{'  REGRESSED' if regressed else ''}")
+            if regressed:
+                regressions.append((mode, name, old_value, new_value))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark verify_quote() on synthetic corpora.")
+    sub = parser.add_subparsers(dest="command", required=True)
+
+    def corpus_args(p):
+        p.add_argument("--posts", type=int, default=POSTS)
+        p.add_argument("--posters", type=int, default=POSTERS)
+        p.add_argument("--seed", type=int, default=SEED)
+        p.add_argument("--inputs", type=int, default=INPUTS, help="labeled inputs to verify")
+        p.add_argument("--difficulty", type=int, default=DIFFICULTY)
+        p.add_argument("--max-records", type=int, default=MAX_RECORDS, help="records per merkle block")
+        p.add_argument("--modes", default=",".join(BACKENDS))
+        p.add_argument("--rebuild", action="store_true", help="regenerate even if the corpus exists")
+
+    corpus_args(sub.add_parser("generate", help="build the corpus and load it into each backend"))
+    run_parser = sub.add_parser("run", help="generate if needed, measure every mode, save the results")
+    corpus_args(run_parser)
+    run_parser.add_argument("--repeat", type=int, default=1, help="passes over the inputs")
+    run_parser.add_argument("--batch", type=int, default=BATCH, help="inputs per verify_quotes() call")
+    run_parser.add_argument("--keep-caches", action="store_true", help="reuse embeddings and indexes from an earlier run")
+    run_parser.add_argument("--cache", action="store_true", help="leave the result cache on")
+    run_parser.add_argument("--snapshot", action="store_true", help="build verifier.snapshot before measuring")
+    run_parser.add_argument("--output")
+    compare_parser = sub.add_parser("compare", help="diff two result files")
+    compare_parser.add_argument("base")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    measure_parser = sub.add_parser("_measure")
+    measure_parser.add_argument("mode", choices=sorted(BACKENDS))
+    measure_parser.add_argument("inputs")
+    measure_parser.add_argument("output")
+    measure_parser.add_argument("--repeat", type=int, default=1)
+    measure_parser.add_argument("--batch", type=int, default=BATCH)
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        meta = generate(args.posts, args.posters, args.seed, args.inputs, args.difficulty,
+                        args.max_records, args.modes.split(","), args.rebuild)
+        print(json.dumps({"corpus": corpus_dir(args.posts, args.posters, args.seed), "loads": meta["loads"]}))
+    elif args.command == "run":
+        run(args)
+    elif args.command == "compare":
+        if compare(args.base, args.new, args.tolerance):
+            sys.exit(1)
+    else:
+        measure(args.mode, args.inputs, args.output, args.repeat, args.batch)
+
+
+if __name__ == "__main__":
+    main()
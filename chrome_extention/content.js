@@ -155,34 +155,68 @@
     return match ? match[1] : null;
   }
 
+  // Tweets are queued and sent to /verifyBatch together, so a page of
+  // timeline costs one request instead of one per tweet.
+  const BATCH_SIZE = 50;
+  const BATCH_DELAY_MS = 100;
+  let pendingTweets = [];
+  let flushTimer = null;
+
   function processTweet(articleElement) {
     console.log("Processing tweet:", articleElement);
-    if (articleElement.getAttribute("data-verified-checked") === "true") return;
+    if (articleElement.hasAttribute("data-verified-checked")) return;
     const tweetId = extractTweetId(articleElement);
     if (!tweetId) return;
 
-    const tweetContent = articleElement.innerText;
+    articleElement.setAttribute("data-verified-checked", "pending");
+    pendingTweets.push({
+      articleElement,
+      tweetId,
+      content: articleElement.innerText,
+    });
+    if (pendingTweets.length >= BATCH_SIZE) {
+      flushTweets();
+    } else if (!flushTimer) {
+      flushTimer = setTimeout(flushTweets, BATCH_DELAY_MS);
+    }
+  }
+
+  function flushTweets() {
+    clearTimeout(flushTimer);
+    flushTimer = null;
+    const batch = pendingTweets.splice(0, BATCH_SIZE);
+    if (pendingTweets.length > 0) {
+      flushTimer = setTimeout(flushTweets, 0);
+    }
+    if (batch.length === 0) return;
 
-    fetch(`http://localhost:${serverPort}/verify`, {
+    fetch(`http://localhost:${serverPort}/verifyBatch`, {
       method: "POST",
       headers: { "Content-Type": "application/json" },
-      body: JSON.stringify({ tweetId, content: tweetContent }),
+      body: JSON.stringify({
+        items: batch.map(({ tweetId, content }) => ({ tweetId, content })),
+      }),
     })
       .then((response) => response.json())
-      .then((data) => {
-        if (
-          data.verified &&
-          Array.isArray(data.matches) &&
-          data.matches.length > 0
-        ) {
-          console.log("HERE Verification successful for tweet ID:", tweetId, data);
-          addVerificationBadge(articleElement, "✅ Verified", data.matches, data.identifiedPoster);
-        }
-        articleElement.setAttribute("data-verified-checked", "true");
+      .then(({ results }) => {
+        batch.forEach(({ articleElement, tweetId }, i) => {
+          const data = results[i] || {};
+          if (
+            data.verified &&
+            Array.isArray(data.matches) &&
+            data.matches.length > 0
+          ) {
+            console.log("HERE Verification successful for tweet ID:", tweetId, data);
+            addVerificationBadge(articleElement, "✅ Verified", data.matches, data.identifiedPoster);
+          }
+          articleElement.setAttribute("data-verified-checked", "true");
+        });
       })
       .catch((err) => {
-        console.error("Verification error for tweet ID " + tweetId + ":", err);
-        articleElement.setAttribute("data-verified-checked", "true");
+        console.error("Batch verification error:", err);
+        batch.forEach(({ articleElement }) =>
+          articleElement.setAttribute("data-verified-checked", "true")
+        );
       });
   }
 
@@ -0,0 +1,7 @@
+"""
+Modules shared by the three backends (raw_data_blockchain, hash_on_blockchain,
+merkle_tree_blockchain): the verifier's matching, indexing and caching, the
+binary chain log and quotes.db access. What differs per backend, its data
+paths and port, stays in the backend's own verify_quote.py and
+verify_server.py, which put the repository root on sys.path to import these.
+"""
@@ -0,0 +1,109 @@
+"""
+Single-pass alias matcher for tracked_people.json.
+
+Every alias of every tracked poster is folded into one trie-shaped,
+case-insensitive regular expression, so a single scan over the text finds
+the earliest alias hit and, at that position, the longest alias. Shared
+prefixes ("Kamala" / "Kamala Harris") are only tried once, which keeps the
+scan close to an Aho-Corasick pass however many accounts are tracked.
+
+The matcher re-reads tracked_people.json when its mtime changes and only
+recompiles when the alias table itself changed. state()/restore() carry the
+table through verify_quote's snapshot.
+"""
+import json
+import os
+import re
+
+
+def trie_pattern(words):
+    """Build a regex matching any of `words`, preferring the longest at a given position."""
+    trie = {}
+    for word in words:
+        node = trie
+        for ch in word:
+            node = node.setdefault(ch, {})
+        node[""] = {}
+
+    def emit(node):
+        branches = [re.escape(ch) + emit(child) for ch, child in sorted(node.items()) if ch]
+        if not branches:
+            return ""
+        body = branches[0] if len(branches) == 1 else "(?:" + "|".join(branches) + ")"
+        # A word may end here; the greedy optional group still tries the longer words first.
+        return f"(?:{body})?" if "" in node else body
+
+    return emit(trie)
+
+
+class AliasMatcher:
+    def __init__(self, path, platform="twitter"):
+        self.path = path
+        self.platform = platform
+        self._mtime = None
+        self._owners = {}  # lowercased alias -> canonical poster
+        self._pattern = None
+
+    def _refresh(self):
+        try:
+            mtime = os.path.getmtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        with open(self.path, "r", encoding="utf-8") as f:
+            tracked = json.load(f).get(self.platform, {})
+        self._mtime = mtime
+        self.update(tracked)
+
+    def update(self, tracked):
+        """Load a {canonical: [aliases]} table, recompiling only if it changed."""
+        owners = {}
+        for canonical, aliases in tracked.items():
+            if isinstance(aliases, str):
+                aliases = [aliases]
+            for alias in aliases:
+                # The first poster listing an alias keeps it, as the old nested loop did.
+                if alias:
+                    owners.setdefault(alias.lower(), canonical)
+        if owners == self._owners and self._pattern is not None:
+            return
+        self._owners = owners
+        self._pattern = re.compile(trie_pattern(owners), re.IGNORECASE) if owners else None
+
+    def state(self):
+        """The alias table and the tracked_people.json mtime it was read at, for a snapshot."""
+        self._refresh()
+        return {"owners": self._owners, "mtime": self._mtime}
+
+    def restore(self, state):
+        """Adopt a state(); tracked_people.json is only re-read if it changed since."""
+        self._owners = state["owners"]
+        self._pattern = re.compile(trie_pattern(self._owners), re.IGNORECASE) if self._owners else None
+        self._mtime = state["mtime"]
+
+    def _owner(self, matched):
+        owner = self._owners.get(matched.lower())
+        if owner is None:
+            # re.IGNORECASE also folds characters .lower() leaves alone (the long s in
+            # "Muſk", the Kelvin sign), so fall back to matching each alias the same way.
+            owner = next((canonical for alias, canonical in self._owners.items()
+                          if re.fullmatch(re.escape(alias), matched, re.IGNORECASE)), None)
+        return owner
+
+    def _hits(self, text):
+        self._refresh()
+        if self._pattern is None:
+            return
+        for m in self._pattern.finditer(text):
+            owner = self._owner(m.group(0))
+            if owner is not None:
+                yield owner, m.start(), m.end()
+
+    def find_all(self, text):
+        """Every non-overlapping alias hit as (canonical, start, end), in text order."""
+        return list(self._hits(text))
+
+    def find(self, text):
+        """The earliest (then longest) alias hit as (canonical, start, end), or None."""
+        return next(self._hits(text), None)
@@ -0,0 +1,232 @@
+"""
+Corpus-wide approximate nearest-neighbour index for verify_quote.
+
+An inverted-file (IVF) index over the normalised post embeddings: spherical
+k-means splits the corpus into ~sqrt(n) lists, and a query is only scored
+against the lists of its `nprobe` closest centroids. That keeps lookups
+sub-linear in the number of posts while staying CPU-only and numpy-based.
+
+The index is saved as a directory of .npy files (memory-mapped on load) plus
+a meta.json holding one metadata record per row (verify_quote keeps a row
+id there; see post_index.py) and the data version the index was built from. In a compressed tier (compressed.py) the probed lists
+are scanned through saved int8 or binary codes and only the best `rerank`
+rows are scored against the fp32 vectors.
+
+Posts that land after the k-means run are add()ed to the list of their
+nearest centroid without retraining: they are kept beside the trained lists
+(extra_*.npy, extra.json), probed with them and always scored exactly. Once
+they grow the corpus or the fullest list past the RETRAIN_* limits,
+needs_retrain() says so and retrained() runs k-means again over every row.
+"""
+import json
+import os
+
+import numpy as np
+
+from .compressed import RERANK, Codes
+
+DEFAULT_NPROBE = 8
+RETRAIN_GROWTH = 0.5     # added rows, as a share of the rows k-means saw
+RETRAIN_IMBALANCE = 2.0  # fullest list, as a multiple of the fullest list after k-means
+EXTRA = ("extra_vectors", "extra_lists")
+
+
+def _nearest_centroids(vectors, centroids, batch=65536):
+    assign = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), batch):
+        chunk = vectors[start:start + batch]
+        assign[start:start + batch] = np.argmax(chunk @ centroids.T, axis=1)
+    return assign
+
+
+def _save_npy(path, array):
+    # Written aside and swapped in: a running verifier may have the old file memory-mapped.
+    with open(path + ".tmp", "wb") as f:
+        np.save(f, array)
+    os.replace(path + ".tmp", path)
+
+
+def _normalise(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+class IVFIndex:
+    def __init__(self, centroids, offsets, vectors, meta, version=None, codes=None):
+        self.centroids = centroids  # (nlist, dim)
+        self.offsets = offsets      # (nlist + 1,) row ranges of each list in vectors
+        self.vectors = vectors      # (n, dim) rows grouped by list
+        self.meta = meta            # one record per row of vectors
+        self.version = version
+        self.codes = codes          # compressed copy of vectors, or None in the fp32 tier
+        self.trained = version      # data version k-means ran on
+        # Rows add()ed since; extra row j is meta[len(vectors) + j].
+        self.extra_vectors = np.zeros((0, vectors.shape[1] if vectors.ndim == 2 else 0), np.float32)
+        self.extra_lists = np.zeros(0, np.int64)
+
+    @property
+    def tier(self):
+        return self.codes.tier if self.codes is not None else "fp32"
+
+    def compress(self, tier):
+        self.codes = Codes.build(self.vectors, tier) if tier != "fp32" else None
+
+    def __len__(self):
+        return len(self.meta)
+
+    def add(self, vectors, meta, version):
+        """Append rows to their nearest lists, now at data version `version`; False if there are no lists."""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if len(vectors) and len(self.centroids) == 0:
+            return False
+        if len(vectors):
+            # meta first and new arrays rather than in-place growth, so a
+            # retrained() running alongside always reads rows it has meta for.
+            self.meta.extend(meta)
+            self.extra_lists = np.concatenate([self.extra_lists, _nearest_centroids(vectors, self.centroids)])
+            self.extra_vectors = np.concatenate([self.extra_vectors, vectors])
+        self.version = version
+        return True
+
+    def needs_retrain(self, growth=RETRAIN_GROWTH, imbalance=RETRAIN_IMBALANCE):
+        if len(self.extra_lists) == 0:
+            return False
+        if len(self.extra_lists) > growth * len(self.vectors):
+            return True
+        sizes = np.diff(self.offsets)
+        fullest = sizes + np.bincount(self.extra_lists, minlength=len(sizes))
+        return fullest.max() > imbalance * max(1, sizes.max())
+
+    def retrained(self, rows, version):
+        """
+        A new index built by k-means over the first `rows` rows, add()ed ones
+        included, which were all the rows there were at data `version`. Rows
+        add()ed later can be moved over with added_after().
+        """
+        extra = self.extra_vectors[:rows - len(self.vectors)]
+        vectors = np.concatenate([np.asarray(self.vectors), extra]) if len(extra) else self.vectors
+        return IVFIndex.build(vectors, self.meta[:rows], version, tier=self.tier)
+
+    def added_after(self, other):
+        """(vectors, meta) of the rows this index holds beyond the rows of `other`, e.g. its retrained()."""
+        start = len(other) - len(self.vectors)
+        return self.extra_vectors[start:], self.meta[len(other):]
+
+    @classmethod
+    def build(cls, vectors, meta, version=None, nlist=None, iterations=10, seed=0, tier="fp32"):
+        vectors = np.asarray(vectors, dtype=np.float32)
+        n = len(vectors)
+        if n == 0:
+            return cls(np.zeros((0, 0), np.float32), np.zeros(1, np.int64), vectors, [], version)
+        nlist = min(n, nlist or max(1, int(np.sqrt(n))))
+
+        rng = np.random.default_rng(seed)
+        centroids = vectors[rng.choice(n, nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = _nearest_centroids(vectors, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, vectors)
+            counts = np.bincount(assign, minlength=nlist)
+            empty = counts == 0
+            # Re-seed empty lists with random points so every list stays useful.
+            sums[empty] = vectors[rng.choice(n, int(empty.sum()))]
+            centroids = _normalise(sums)
+
+        assign = _nearest_centroids(vectors, centroids)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.searchsorted(assign[order], np.arange(nlist + 1)).astype(np.int64)
+        index = cls(centroids, offsets, vectors[order], [meta[i] for i in order], version)
+        index.compress(tier)
+        return index
+
+    def search(self, query, k=10, nprobe=DEFAULT_NPROBE, rerank=RERANK):
+        """Return up to k (meta, score) pairs, best first."""
+        if len(self) == 0:
+            return []
+        query = np.asarray(query, dtype=np.float32)
+        nprobe = min(nprobe, len(self.centroids))
+        probe = np.argpartition(-(self.centroids @ query), nprobe - 1)[:nprobe]
+
+        rows = np.concatenate([
+            np.arange(self.offsets[c], self.offsets[c + 1]) for c in probe
+        ])
+        if self.codes is not None and len(rows) > rerank:
+            approx = np.concatenate([
+                self.codes.take(slice(self.offsets[c], self.offsets[c + 1])).scores(query[:, None])[:, 0]
+                for c in probe
+            ])
+            rows = rows[np.argpartition(-approx, rerank - 1)[:rerank]]
+        scores = self.vectors[rows] @ query
+        extra = np.flatnonzero(np.isin(self.extra_lists, probe))
+        if len(extra):
+            rows = np.concatenate([rows, len(self.vectors) + extra])
+            scores = np.concatenate([scores, self.extra_vectors[extra] @ query])
+        if len(rows) == 0:
+            return []
+        k = min(k, len(rows))
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(self.meta[rows[i]], float(scores[i])) for i in top]
+
+    def save(self, directory):
+        os.makedirs(directory, exist_ok=True)
+        for name in ("centroids", "offsets", "vectors"):
+            _save_npy(os.path.join(directory, name + ".npy"), getattr(self, name))
+        if self.codes is not None:
+            self.codes.save(os.path.join(directory, "vectors"))
+        base = self.meta[:len(self.vectors)]
+        with open(os.path.join(directory, "meta.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump({"version": self.trained, "tier": self.tier, "rows": base}, f)
+        os.replace(os.path.join(directory, "meta.json.tmp"), os.path.join(directory, "meta.json"))
+        self.save_extra(directory)
+
+    def save_extra(self, directory):
+        """Save only the add()ed rows; cheap next to save(), which rewrites the trained lists."""
+        for name in EXTRA:
+            _save_npy(os.path.join(directory, name + ".npy"), getattr(self, name))
+        # Written last and tied to the trained lists, so load() never pairs them with another build.
+        with open(os.path.join(directory, "extra.json.tmp"), "w", encoding="utf-8") as f:
+            json.dump({
+                "trained": self.trained,
+                "version": self.version,
+                "rows": self.meta[len(self.vectors):],
+            }, f)
+        os.replace(os.path.join(directory, "extra.json.tmp"), os.path.join(directory, "extra.json"))
+
+    @classmethod
+    def load(cls, directory):
+        meta_path = os.path.join(directory, "meta.json")
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, "r", encoding="utf-8") as f:
+                meta = json.load(f)
+            arrays = [
+                np.load(os.path.join(directory, name + ".npy"), mmap_mode="r")
+                for name in ("centroids", "offsets", "vectors")
+            ]
+        except (OSError, ValueError):
+            return None
+        tier = meta.get("tier", "fp32")
+        codes = None
+        if tier != "fp32":
+            codes = Codes.load(os.path.join(directory, "vectors"), tier, len(arrays[2]), arrays[2].shape[1])
+        index = cls(*arrays, meta["rows"], meta.get("version"), codes)
+        index._load_extra(directory)
+        return index
+
+    def _load_extra(self, directory):
+        try:
+            with open(os.path.join(directory, "extra.json"), "r", encoding="utf-8") as f:
+                extra = json.load(f)
+            vectors, lists = (np.load(os.path.join(directory, name + ".npy")) for name in EXTRA)
+        except (OSError, ValueError):
+            return
+        if extra.get("trained") != self.trained or not len(vectors) == len(lists) == len(extra["rows"]):
+            return
+        if len(vectors) and vectors.shape[1] != self.vectors.shape[1]:
+            return
+        self.extra_vectors, self.extra_lists = vectors, lists
+        self.meta.extend(extra["rows"])
+        self.version = extra["version"]
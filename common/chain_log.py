@@ -0,0 +1,299 @@
+#!/usr/bin/env python3
+"""
+Append-only binary chain log, shared with chainlog.js.
+
+<name>.log holds a 16-byte header followed by one record per block:
+
+    u32 length | u32 crc32(payload) | payload (UTF-8 JSON of the block)
+
+<name>.log.idx holds a 16-byte header followed by one fixed 48-byte entry per
+block, so block i is found without scanning:
+
+    u64 offset | u32 length | u32 crc32 | 32-byte block hash
+
+All integers are little-endian. Appends write the record, fsync the log, then
+write and fsync the index entry; on open, a writer drops index entries whose
+record is missing or corrupt, re-indexes complete records the index missed
+and truncates a torn tail, so a crash mid-append loses at most that block.
+
+Readers memory-map both files. load_chain() returns the blocks from the log
+next to a chain JSON path when there is one and from the JSON otherwise.
+
+    python3 common/chain_log.py to-log hash_on_blockchain/chain.json    # JSON -> .log/.log.idx
+    python3 common/chain_log.py to-json hash_on_blockchain/chain.json   # .log -> JSON
+"""
+import json
+import mmap
+import os
+import struct
+import sys
+import zlib
+
+LOG_MAGIC = b"CHAINLOG"
+IDX_MAGIC = b"CHAINIDX"
+VERSION = 1
+FILE_HEADER = struct.Struct("<8sII")   # magic, version, reserved
+RECORD_HEADER = struct.Struct("<II")   # length, crc32
+INDEX_ENTRY = struct.Struct("<QII32s") # offset, length, crc32, hash
+
+
+class ChainLogError(ValueError):
+    pass
+
+
+def log_path_for(json_path):
+    """chain.json -> chain.log"""
+    root, _ = os.path.splitext(json_path)
+    return root + ".log"
+
+
+def _encode(block):
+    return json.dumps(block, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def _hash_bytes(block):
+    try:
+        return bytes.fromhex(block.get("hash") or "")[:32].ljust(32, b"\0")
+    except ValueError:
+        return bytes(32)
+
+
+def _check_header(data, magic, path):
+    if len(data) < FILE_HEADER.size:
+        raise ChainLogError(f"{path}: truncated header")
+    found, version, _ = FILE_HEADER.unpack_from(data)
+    if found != magic or version != VERSION:
+        raise ChainLogError(f"{path}: not a version {VERSION} chain log")
+
+
+class ChainLog:
+    def __init__(self, path):
+        self.path = path
+        self.idx_path = path + ".idx"
+        self._log = self._idx = None
+        self._log_map = self._idx_map = None
+        self._count = 0
+
+    # -- reading -----------------------------------------------------------
+
+    @classmethod
+    def open(cls, path):
+        log = cls(path)
+        log.refresh()
+        return log
+
+    def refresh(self):
+        """(Re)map both files, picking up blocks appended by another process."""
+        self._unmap()
+        self._log_map = self._map(self.path, LOG_MAGIC)
+        self._idx_map = self._map(self.idx_path, IDX_MAGIC)
+        entries = (len(self._idx_map) - FILE_HEADER.size) // INDEX_ENTRY.size
+        # Trust only entries whose record lies entirely inside the mapped log.
+        while entries:
+            offset, length, _, _ = self.entry(entries - 1, count=entries)
+            if offset + RECORD_HEADER.size + length <= len(self._log_map):
+                break
+            entries -= 1
+        self._count = entries
+
+    def _map(self, path, magic):
+        with open(path, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        _check_header(data, magic, path)
+        return data
+
+    def _unmap(self):
+        for m in (self._log_map, self._idx_map):
+            if m is not None:
+                m.close()
+        self._log_map = self._idx_map = None
+
+    def __len__(self):
+        return self._count
+
+    def entry(self, i, count=None):
+        """(offset, length, crc32, hash hex) of block i, from the index alone."""
+        count = self._count if count is None else count
+        if i < 0:
+            i += count
+        if not 0 <= i < count:
+            raise IndexError(i)
+        offset, length, crc, digest = INDEX_ENTRY.unpack_from(
+            self._idx_map, FILE_HEADER.size + i * INDEX_ENTRY.size
+        )
+        return offset, length, crc, digest.hex()
+
+    def payload(self, i):
+        offset, length, crc, _ = self.entry(i)
+        stored_length, stored_crc = RECORD_HEADER.unpack_from(self._log_map, offset)
+        start = offset + RECORD_HEADER.size
+        data = self._log_map[start:start + length]
+        if stored_length != length or stored_crc != crc or zlib.crc32(data) != crc:
+            raise ChainLogError(f"{self.path}: checksum mismatch in block {i}")
+        return data
+
+    def __getitem__(self, i):
+        return json.loads(self.payload(i))
+
+    def iter_from(self, start=0):
+        for i in range(start, self._count):
+            yield self[i]
+
+    def __iter__(self):
+        return self.iter_from(0)
+
+    def tip_hash(self):
+        return self.entry(-1)[3] if self._count else None
+
+    # -- writing -----------------------------------------------------------
+
+    @classmethod
+    def create(cls, path, blocks=()):
+        """Write a fresh log (atomically replacing any old one) and return it."""
+        for target, magic in ((path, LOG_MAGIC), (path + ".idx", IDX_MAGIC)):
+            with open(target + ".tmp", "wb") as f:
+                f.write(FILE_HEADER.pack(magic, VERSION, 0))
+        writer = cls(path + ".tmp")
+        writer.idx_path = path + ".idx.tmp"
+        writer.open_for_append()
+        writer.extend(blocks)
+        writer.close()
+        os.replace(path + ".idx.tmp", path + ".idx")
+        os.replace(path + ".tmp", path)
+        return cls.open(path)
+
+    def open_for_append(self):
+        """Open both files for writing and repair whatever a crash left behind."""
+        self._unmap()
+        self._log = open(self.path, "r+b")
+        self._idx = open(self.idx_path, "r+b")
+        _check_header(self._log.read(FILE_HEADER.size), LOG_MAGIC, self.path)
+        _check_header(self._idx.read(FILE_HEADER.size), IDX_MAGIC, self.idx_path)
+
+        idx_size = os.fstat(self._idx.fileno()).st_size
+        count = (idx_size - FILE_HEADER.size) // INDEX_ENTRY.size
+        end = FILE_HEADER.size
+        while count:
+            self._idx.seek(FILE_HEADER.size + (count - 1) * INDEX_ENTRY.size)
+            offset, length, crc, _ = INDEX_ENTRY.unpack(self._idx.read(INDEX_ENTRY.size))
+            if self._read_record(offset) == (length, crc):
+                end = offset + RECORD_HEADER.size + length
+                break
+            count -= 1
+        self._idx.truncate(FILE_HEADER.size + count * INDEX_ENTRY.size)
+
+        # Records that reached the log but not the index are re-indexed.
+        while True:
+            record = self._read_record(end, with_payload=True)
+            if record is None:
+                break
+            length, crc, data = record
+            self._write_entry(end, length, crc, _hash_bytes(json.loads(data)))
+            end += RECORD_HEADER.size + length
+            count += 1
+        self._log.truncate(end)
+        self._sync()
+        self._count = count
+        return self
+
+    def _read_record(self, offset, with_payload=False):
+        self._log.seek(offset)
+        head = self._log.read(RECORD_HEADER.size)
+        if len(head) < RECORD_HEADER.size:
+            return None
+        length, crc = RECORD_HEADER.unpack(head)
+        data = self._log.read(length)
+        if len(data) < length or zlib.crc32(data) != crc:
+            return None
+        return (length, crc, data) if with_payload else (length, crc)
+
+    def _write_entry(self, offset, length, crc, digest):
+        self._idx.seek(0, os.SEEK_END)
+        self._idx.write(INDEX_ENTRY.pack(offset, length, crc, digest))
+
+    def _sync(self):
+        for f in (self._log, self._idx):
+            f.flush()
+            os.fsync(f.fileno())
+
+    def extend(self, blocks):
+        """Append blocks, with one fsync of each file for the whole batch."""
+        self._log.seek(0, os.SEEK_END)
+        entries = []
+        for block in blocks:
+            data = _encode(block)
+            crc = zlib.crc32(data)
+            offset = self._log.tell()
+            self._log.write(RECORD_HEADER.pack(len(data), crc) + data)
+            entries.append((offset, len(data), crc, _hash_bytes(block)))
+        # The records are durable before any index entry points at them.
+        self._log.flush()
+        os.fsync(self._log.fileno())
+        for entry in entries:
+            self._write_entry(*entry)
+        self._idx.flush()
+        os.fsync(self._idx.fileno())
+        self._count += len(entries)
+
+    def append(self, block):
+        self.extend([block])
+
+    def close(self):
+        self._unmap()
+        for f in (self._log, self._idx):
+            if f is not None:
+                f.close()
+        self._log = self._idx = None
+
+
+# -- helpers for code that used to read the chain JSON ----------------------
+
+def chain_mtime(json_path):
+    """Modification time of whichever file load_chain() would read."""
+    log_path = log_path_for(json_path)
+    if os.path.exists(log_path + ".idx"):
+        return os.path.getmtime(log_path + ".idx")
+    return os.path.getmtime(json_path)
+
+
+def load_chain(json_path):
+    """All blocks, from the binary log when there is one and the JSON otherwise."""
+    log_path = log_path_for(json_path)
+    if os.path.exists(log_path + ".idx"):
+        log = ChainLog.open(log_path)
+        try:
+            return list(log)
+        finally:
+            log.close()
+    with open(json_path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def json_to_log(json_path):
+    with open(json_path, "r", encoding="utf-8") as f:
+        blocks = json.load(f)
+    return ChainLog.create(log_path_for(json_path), blocks)
+
+
+def log_to_json(json_path):
+    blocks = list(ChainLog.open(log_path_for(json_path)))
+    tmp = json_path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(blocks, f, indent=2, ensure_ascii=False)
+    os.replace(tmp, json_path)
+    return len(blocks)
+
+
+def main():
+    if len(sys.argv) != 3 or sys.argv[1] not in ("to-log", "to-json"):
+        print("Usage: chain_log.py to-log|to-json <chain.json>")
+        sys.exit(1)
+    if sys.argv[1] == "to-log":
+        log = json_to_log(sys.argv[2])
+        print(json.dumps({"blocks": len(log), "log": log.path}))
+    else:
+        print(json.dumps({"blocks": log_to_json(sys.argv[2]), "json": sys.argv[2]}))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+"""
+Streaming, checkpointed validation of the chain file written by a backend's
+blockchain.js, shared by the backends' chain_validator.py scripts.
+
+Blocks are decoded one at a time from the JSON array, or read through the
+index of the binary log (chain_log.py) when there is one, so memory stays flat
+however long the chain grows. After a successful run the height, tip hash and
+byte offset of the tip block are saved to chain_checkpoint.json next to the
+chain; the next run seeks straight to the tip, confirms it is unchanged and
+only checks blocks appended since. blockchain.js keeps its checkpoint in the
+same file (without the offset, in which case the prefix is read but not
+checked; see chainlog.js).
+
+What makes a block valid differs per backend, so validate() takes a
+block_error(block) hook returning an error message or None; the hash link
+between blocks is checked here. data_block_error() is the hook for the
+backends whose blocks carry a `data` field.
+"""
+import codecs
+import hashlib
+import itertools
+import json
+import os
+import sys
+
+from common.chain_log import ChainLog, log_path_for
+
+SEPARATORS = " \t\r\n,["
+
+
+def block_hash(block):
+    # Same serialisation as Block.computeHash() in blockchain.js.
+    content = json.dumps({
+        "index": block["index"],
+        "timestamp": block["timestamp"],
+        "data": block["data"],
+        "previousHash": block["previousHash"],
+        "nonce": block["nonce"],
+    }, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()
+
+
+def data_block_error(block):
+    if block["hash"] != block_hash(block):
+        return f"Invalid hash at block {block['index']}"
+    return None
+
+
+def iter_blocks(path, offset=0, chunk_size=1 << 16):
+    """Yield (block, start offset) for each block from byte `offset` on."""
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    with open(path, "rb") as f:
+        f.seek(offset)
+        buf, eof = "", False
+        while True:
+            pos = 0
+            while pos < len(buf) and buf[pos] in SEPARATORS:
+                pos += 1
+            if pos < len(buf) and buf[pos] == "]":
+                return
+            try:
+                if pos == len(buf):
+                    raise ValueError("need more data")
+                block, end = decoder.raw_decode(buf, pos)
+            except ValueError:
+                if eof:
+                    if buf[pos:].strip():
+                        raise
+                    return
+                chunk = f.read(chunk_size)
+                eof = not chunk
+                buf += utf8.decode(chunk, final=eof)
+                continue
+            start = offset + len(buf[:pos].encode("utf-8"))
+            offset += len(buf[:end].encode("utf-8"))
+            buf = buf[end:]
+            yield block, start
+
+
+def checkpoint_path(path):
+    return os.path.join(os.path.dirname(os.path.abspath(path)), "chain_checkpoint.json")
+
+
+def read_checkpoint(path):
+    try:
+        with open(checkpoint_path(path), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_checkpoint(path, height, tip_hash, tip_offset):
+    checkpoint = {"height": height, "tipHash": tip_hash}
+    if tip_offset is not None:
+        checkpoint["tipOffset"] = tip_offset
+    with open(checkpoint_path(path), "w", encoding="utf-8") as f:
+        json.dump(checkpoint, f)
+
+
+def validate(path, block_error, full=False):
+    """
+    Validate the chain file, resuming from the saved checkpoint unless `full`.
+    block_error(block) checks a block on its own; blocks after genesis must
+    pass it and link to their predecessor. Returns {"valid", "height",
+    "checked"} plus "error" when invalid.
+    """
+    checkpoint = None if full else read_checkpoint(path)
+    trusted, tip_hash, offset = 0, None, 0
+    if checkpoint and checkpoint.get("height", 0) >= 1:
+        trusted, tip_hash = checkpoint["height"], checkpoint.get("tipHash")
+        offset = checkpoint.get("tipOffset") or 0
+
+    log = None
+    log_path = log_path_for(path)
+    if os.path.exists(log_path + ".idx"):
+        # The log's index gives random access, so no byte offset is needed.
+        log = ChainLog.open(log_path)
+        height = max(trusted - 1, 0)
+        blocks = zip(log.iter_from(height), itertools.repeat(None))
+    else:
+        # Seeking to the tip skips the trusted prefix without reading it.
+        height = trusted - 1 if offset else 0
+        blocks = iter_blocks(path, offset)
+
+    checked, previous, tip_offset = 0, None, 0
+    try:
+        for block, start in blocks:
+            if not isinstance(block, dict):
+                raise ValueError(f"Expected a block object at byte {start}")
+            height += 1
+            if height < trusted:
+                continue
+            if height == trusted and block.get("hash") != tip_hash:
+                # The checkpointed tip is gone (chain rewritten); start over.
+                return validate(path, block_error, full=True)
+            if height > 1 and height > trusted:
+                error = block_error(block)
+                if error:
+                    return {"valid": False, "height": height, "checked": checked, "error": error}
+                if block["previousHash"] != previous:
+                    return {"valid": False, "height": height, "checked": checked,
+                            "error": f"Invalid previous hash link at block {block['index']}"}
+                checked += 1
+            previous, tip_offset = block["hash"], start
+    except (OSError, ValueError, KeyError) as e:
+        if trusted:
+            return validate(path, block_error, full=True)
+        return {"valid": False, "height": height, "checked": checked, "error": str(e)}
+    finally:
+        if log is not None:
+            log.close()
+
+    if height < trusted:
+        return validate(path, block_error, full=True)
+    if height:
+        write_checkpoint(path, height, previous, tip_offset)
+    return {"valid": True, "height": height, "checked": checked}
+
+
+def main(default_path, block_error):
+    """`python3 chain_validator.py [chain] [--full]` for a backend's script."""
+    args = [a for a in sys.argv[1:] if a != "--full"]
+    path = args[0] if args else default_path
+    print(json.dumps(validate(path, block_error, full="--full" in sys.argv)))
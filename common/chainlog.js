@@ -0,0 +1,269 @@
+// Append-only binary chain log; chain_log.py reads and writes the same format.
+//
+// <name>.log:      16-byte header, then per block
+//                  u32 length | u32 crc32(payload) | payload (UTF-8 JSON)
+// <name>.log.idx:  16-byte header, then a fixed 48-byte entry per block
+//                  u64 offset | u32 length | u32 crc32 | 32-byte block hash
+//
+// Little-endian throughout. Appends fsync the records before the index
+// entries that point at them; opening for append repairs a torn tail.
+const fs = require("fs");
+const path = require("path");
+const zlib = require("zlib");
+
+const LOG_MAGIC = "CHAINLOG";
+const IDX_MAGIC = "CHAINIDX";
+const VERSION = 1;
+const FILE_HEADER = 16;
+const RECORD_HEADER = 8;
+const INDEX_ENTRY = 48;
+
+function fileHeader(magic) {
+  const buf = Buffer.alloc(FILE_HEADER);
+  buf.write(magic, 0, "latin1");
+  buf.writeUInt32LE(VERSION, 8);
+  return buf;
+}
+
+function checkHeader(buf, magic, file) {
+  if (
+    buf.length < FILE_HEADER ||
+    buf.toString("latin1", 0, 8) !== magic ||
+    buf.readUInt32LE(8) !== VERSION
+  ) {
+    throw new Error(`${file}: not a version ${VERSION} chain log`);
+  }
+}
+
+function hashBytes(block) {
+  const buf = Buffer.alloc(32);
+  if (block && /^[0-9a-f]{64}$/.test(block.hash || "")) {
+    Buffer.from(block.hash, "hex").copy(buf);
+  }
+  return buf;
+}
+
+function indexEntry(offset, length, crc, hash) {
+  const buf = Buffer.alloc(INDEX_ENTRY);
+  buf.writeBigUInt64LE(BigInt(offset), 0);
+  buf.writeUInt32LE(length, 8);
+  buf.writeUInt32LE(crc, 12);
+  hash.copy(buf, 16);
+  return buf;
+}
+
+class ChainLog {
+  constructor(logPath) {
+    this.path = logPath;
+    this.idxPath = `${logPath}.idx`;
+    this.logFd = null;
+    this.idxFd = null;
+    this.end = FILE_HEADER;
+    this.length = 0;
+  }
+
+  static exists(logPath) {
+    return fs.existsSync(logPath) && fs.existsSync(`${logPath}.idx`);
+  }
+
+  // Write a fresh log holding `items`, atomically replacing any old one.
+  static create(logPath, items = []) {
+    fs.writeFileSync(`${logPath}.tmp`, fileHeader(LOG_MAGIC));
+    fs.writeFileSync(`${logPath}.idx.tmp`, fileHeader(IDX_MAGIC));
+    const tmp = new ChainLog(`${logPath}.tmp`);
+    tmp.idxPath = `${logPath}.idx.tmp`;
+    tmp.open();
+    tmp.extend(items);
+    tmp.close();
+    fs.renameSync(`${logPath}.idx.tmp`, `${logPath}.idx`);
+    fs.renameSync(`${logPath}.tmp`, logPath);
+    return new ChainLog(logPath).open();
+  }
+
+  // Open for appending, dropping index entries whose record did not make it
+  // to disk and re-indexing complete records the index missed.
+  open() {
+    const log = fs.readFileSync(this.path);
+    const idx = fs.readFileSync(this.idxPath);
+    checkHeader(log, LOG_MAGIC, this.path);
+    checkHeader(idx, IDX_MAGIC, this.idxPath);
+
+    const readRecord = (offset) => {
+      if (offset + RECORD_HEADER > log.length) return null;
+      const length = log.readUInt32LE(offset);
+      const crc = log.readUInt32LE(offset + 4);
+      const start = offset + RECORD_HEADER;
+      if (start + length > log.length) return null;
+      const payload = log.subarray(start, start + length);
+      return zlib.crc32(payload) === crc ? { length, crc, payload } : null;
+    };
+
+    let count = Math.floor((idx.length - FILE_HEADER) / INDEX_ENTRY);
+    let end = FILE_HEADER;
+    while (count > 0) {
+      const at = FILE_HEADER + (count - 1) * INDEX_ENTRY;
+      const offset = Number(idx.readBigUInt64LE(at));
+      const record = readRecord(offset);
+      if (
+        record &&
+        record.length === idx.readUInt32LE(at + 8) &&
+        record.crc === idx.readUInt32LE(at + 12)
+      ) {
+        end = offset + RECORD_HEADER + record.length;
+        break;
+      }
+      count--;
+    }
+
+    this.logFd = fs.openSync(this.path, "r+");
+    this.idxFd = fs.openSync(this.idxPath, "r+");
+    fs.ftruncateSync(this.idxFd, FILE_HEADER + count * INDEX_ENTRY);
+    const missing = [];
+    for (let record = readRecord(end); record; record = readRecord(end)) {
+      const block = JSON.parse(record.payload.toString("utf8"));
+      missing.push(indexEntry(end, record.length, record.crc, hashBytes(block)));
+      end += RECORD_HEADER + record.length;
+    }
+    fs.ftruncateSync(this.logFd, end);
+    if (missing.length) {
+      fs.writeSync(this.idxFd, Buffer.concat(missing), 0, undefined, FILE_HEADER + count * INDEX_ENTRY);
+    }
+    fs.fsyncSync(this.logFd);
+    fs.fsyncSync(this.idxFd);
+
+    this.end = end;
+    this.length = count + missing.length;
+    return this;
+  }
+
+  // Append items with one fsync per file for the whole batch.
+  extend(items) {
+    if (items.length === 0) return;
+    const records = [];
+    const entries = [];
+    let offset = this.end;
+    for (const item of items) {
+      const payload = Buffer.from(JSON.stringify(item), "utf8");
+      const crc = zlib.crc32(payload);
+      const head = Buffer.alloc(RECORD_HEADER);
+      head.writeUInt32LE(payload.length, 0);
+      head.writeUInt32LE(crc, 4);
+      records.push(head, payload);
+      entries.push(indexEntry(offset, payload.length, crc, hashBytes(item)));
+      offset += RECORD_HEADER + payload.length;
+    }
+    // Records are durable before any index entry points at them.
+    fs.writeSync(this.logFd, Buffer.concat(records), 0, undefined, this.end);
+    fs.fsyncSync(this.logFd);
+    fs.writeSync(this.idxFd, Buffer.concat(entries), 0, undefined, FILE_HEADER + this.length * INDEX_ENTRY);
+    fs.fsyncSync(this.idxFd);
+    this.end = offset;
+    this.length += items.length;
+  }
+
+  append(item) {
+    this.extend([item]);
+  }
+
+  // Hash of block i as stored in the index, without reading the record.
+  hashAt(i) {
+    const buf = Buffer.alloc(32);
+    fs.readSync(this.idxFd, buf, 0, 32, FILE_HEADER + i * INDEX_ENTRY + 16);
+    return buf.toString("hex");
+  }
+
+  readAll() {
+    const log = fs.readFileSync(this.path);
+    const idx = fs.readFileSync(this.idxPath);
+    const items = [];
+    for (let i = 0; i < this.length; i++) {
+      const at = FILE_HEADER + i * INDEX_ENTRY;
+      const start = Number(idx.readBigUInt64LE(at)) + RECORD_HEADER;
+      const payload = log.subarray(start, start + idx.readUInt32LE(at + 8));
+      if (zlib.crc32(payload) !== idx.readUInt32LE(at + 12)) {
+        throw new Error(`${this.path}: checksum mismatch in entry ${i}`);
+      }
+      items.push(JSON.parse(payload.toString("utf8")));
+    }
+    return items;
+  }
+
+  close() {
+    if (this.logFd !== null) fs.closeSync(this.logFd);
+    if (this.idxFd !== null) fs.closeSync(this.idxFd);
+    this.logFd = this.idxFd = null;
+  }
+}
+
+// chain.json -> chain.log
+function logPathFor(jsonPath) {
+  return jsonPath.replace(/\.json$/, "") + ".log";
+}
+
+// All blocks, from the log next to a chain JSON path when there is one and
+// the JSON otherwise, like chain_log.load_chain(). Read-only: a torn tail is
+// left for the next writer to repair.
+function loadChain(jsonPath) {
+  const logPath = logPathFor(jsonPath);
+  if (!ChainLog.exists(logPath)) {
+    return JSON.parse(fs.readFileSync(jsonPath, "utf8"));
+  }
+  const log = new ChainLog(logPath);
+  const idx = fs.readFileSync(log.idxPath);
+  checkHeader(idx, IDX_MAGIC, log.idxPath);
+  const logSize = fs.statSync(logPath).size;
+  let count = Math.floor((idx.length - FILE_HEADER) / INDEX_ENTRY);
+  // Trust only entries whose record lies entirely inside the log.
+  while (count > 0) {
+    const at = FILE_HEADER + (count - 1) * INDEX_ENTRY;
+    if (Number(idx.readBigUInt64LE(at)) + RECORD_HEADER + idx.readUInt32LE(at + 8) <= logSize) break;
+    count--;
+  }
+  log.length = count;
+  return log.readAll();
+}
+
+// chain_checkpoint.json next to the chain, shared with chain_validator.py:
+// the height and tip hash of the chain as last found valid.
+function checkpointPathFor(jsonPath) {
+  return path.join(path.dirname(path.resolve(jsonPath)), "chain_checkpoint.json");
+}
+
+function readCheckpoint(jsonPath) {
+  try {
+    return JSON.parse(fs.readFileSync(checkpointPathFor(jsonPath)));
+  } catch (err) {
+    return null;
+  }
+}
+
+function writeCheckpoint(jsonPath, chain) {
+  const checkpoint = {
+    height: chain.length,
+    tipHash: chain[chain.length - 1].hash,
+  };
+  fs.writeFileSync(checkpointPathFor(jsonPath), JSON.stringify(checkpoint));
+}
+
+// Index of the first block of `chain` not covered by a checkpoint whose tip
+// is still in place; everything before it was validated by an earlier run.
+function firstUncheckedBlock(jsonPath, chain) {
+  const checkpoint = readCheckpoint(jsonPath);
+  if (
+    checkpoint &&
+    checkpoint.height >= 1 &&
+    checkpoint.height <= chain.length &&
+    chain[checkpoint.height - 1].hash === checkpoint.tipHash
+  ) {
+    return checkpoint.height;
+  }
+  return 1;
+}
+
+module.exports = {
+  ChainLog,
+  logPathFor,
+  loadChain,
+  firstUncheckedBlock,
+  writeCheckpoint,
+};
@@ -0,0 +1,196 @@
+#!/usr/bin/env python3
+"""
+Compressed embedding tier for verify_quote's similarity search.
+
+Scanning fp32 rows means holding 4 bytes per dimension of every candidate in
+memory. With VERIFY_TIER set, the scan runs over a compressed copy instead
+and only each quote's VERIFY_RERANK best rows (default 256) are re-scored
+with the full-precision cosine that the thresholds are applied to:
+
+  fp32    no compression, every row scored exactly (the default)
+  int8    one int8 per dimension plus a float32 scale per row, 4x smaller;
+          scanned block by block with BLAS against the fp32 query
+  binary  one sign bit per dimension, 32x smaller; ranked by Hamming
+          distance to the query's sign bits with popcount
+
+The fp32 rows stay on disk, memory-mapped, and only the re-ranked ones are
+paged in. A row that misses the re-rank cut scores UNSCORED, below any
+threshold, so compression can lose matches but never invents one.
+
+    python3 ../common/compressed.py [embeddings/] [--tier int8] [--rerank 256] [--queries 200]
+
+reports the sizes and the recall of the re-ranked top 1 and top 10 against
+the exact ones, for noisy copies of stored rows standing in for paraphrased
+quotes.
+"""
+import argparse
+import json
+import os
+import sys
+
+import numpy as np
+
+TIERS = ("fp32", "int8", "binary")
+TIER = os.getenv("VERIFY_TIER") or "fp32"
+RERANK = int(os.getenv("VERIFY_RERANK") or 256)
+UNSCORED = np.float32(-2.0)  # below every cosine, so never a match
+BLOCK_ROWS = 65536
+
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(bits):
+    """Set bits per byte; np.bitwise_count where numpy has it (2.0+)."""
+    count = getattr(np, "bitwise_count", None)
+    return count(bits) if count is not None else _POPCOUNT[bits]
+
+
+class Codes:
+    """A compressed copy of an (n, dim) matrix of L2-normalised rows."""
+
+    def __init__(self, tier, data, scale, dim):
+        self.tier = tier
+        self.data = data    # int8 (n, dim) or packed bits uint8 (n, ceil(dim / 8))
+        self.scale = scale  # float32 (n,) for int8, else None
+        self.dim = dim
+
+    def __len__(self):
+        return len(self.data)
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + (self.scale.nbytes if self.scale is not None else 0)
+
+    @classmethod
+    def build(cls, matrix, tier):
+        n, dim = matrix.shape
+        if tier == "int8":
+            data = np.empty((n, dim), dtype=np.int8)
+            scale = np.empty(n, dtype=np.float32)
+            for start in range(0, n, BLOCK_ROWS):
+                block = np.asarray(matrix[start:start + BLOCK_ROWS], dtype=np.float32)
+                peak = np.abs(block).max(axis=1)
+                peak[peak == 0] = 1.0
+                scale[start:start + len(block)] = peak / 127
+                data[start:start + len(block)] = np.rint(block * (127 / peak)[:, None])
+            return cls(tier, data, scale, dim)
+        if tier == "binary":
+            data = np.empty((n, (dim + 7) // 8), dtype=np.uint8)
+            for start in range(0, n, BLOCK_ROWS):
+                data[start:start + BLOCK_ROWS] = np.packbits(matrix[start:start + BLOCK_ROWS] > 0, axis=1)
+            return cls(tier, data, None, dim)
+        raise ValueError(f"Unknown tier {tier!r}; expected one of {', '.join(TIERS[1:])}")
+
+    def take(self, rows):
+        return Codes(self.tier, self.data[rows], self.scale[rows] if self.scale is not None else None, self.dim)
+
+    @staticmethod
+    def paths(base, tier):
+        """Files holding a matrix's codes, base being the matrix path without .npy."""
+        return [f"{base}.{tier}.npy"] + ([f"{base}.{tier}-scale.npy"] if tier == "int8" else [])
+
+    def save(self, base):
+        for path, array in zip(self.paths(base, self.tier), (self.data, self.scale)):
+            with open(path + ".tmp", "wb") as f:
+                np.save(f, array)
+            os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, base, tier, rows, dim):
+        """Codes saved next to base, memory-mapped; None if missing or not for `rows` rows."""
+        try:
+            arrays = [np.load(path, mmap_mode="r") for path in cls.paths(base, tier)]
+        except (OSError, ValueError):
+            return None
+        if any(len(a) != rows for a in arrays):
+            return None
+        return cls(tier, arrays[0], arrays[1] if tier == "int8" else None, dim)
+
+    def scores(self, queries):
+        """Approximate (n, q) scores for queries (dim, q); only their order is meaningful."""
+        queries = np.asarray(queries, dtype=np.float32)
+        out = np.empty((len(self.data), queries.shape[1]), dtype=np.float32)
+        if self.tier == "int8":
+            for start in range(0, len(self.data), BLOCK_ROWS):
+                block = self.data[start:start + BLOCK_ROWS]
+                scale = self.scale[start:start + len(block), None]
+                out[start:start + len(block)] = (block.astype(np.float32) @ queries) * scale
+            return out
+        query_bits = np.packbits(queries.T > 0, axis=1)
+        for col, bits in enumerate(query_bits):
+            # Matching bits minus differing ones, scaled to [-1, 1] like a cosine.
+            distance = popcount(self.data ^ bits).sum(axis=1, dtype=np.int32)
+            out[:, col] = 1.0 - 2.0 * distance / self.dim
+        return out
+
+
+def rerank(matrix, codes, queries, keep=RERANK):
+    """
+    (n, q) scores of queries (dim, q) against matrix: exact cosines for the
+    `keep` rows each query's codes rank best, UNSCORED for the others. With
+    no codes, or no more rows than `keep`, every row is scored exactly.
+    """
+    queries = np.asarray(queries, dtype=np.float32)
+    if codes is None or len(matrix) <= keep:
+        return matrix @ queries
+    approx = codes.scores(queries)
+    top = np.argpartition(-approx, keep - 1, axis=0)[:keep]  # (keep, q)
+    rows = np.unique(top)
+    chosen = np.zeros(approx.shape, dtype=bool)
+    chosen[top, np.arange(approx.shape[1])] = True
+    scores = np.full(approx.shape, UNSCORED, dtype=np.float32)
+    exact = np.asarray(matrix[rows], dtype=np.float32) @ queries  # pages in only these rows
+    scores[rows] = np.where(chosen[rows], exact, UNSCORED)
+    return scores
+
+
+def recall(matrix, codes, queries, k=10, keep=RERANK):
+    """Share of each query's exact top k that the compressed scan plus re-rank also returns."""
+    exact = np.asarray(matrix, dtype=np.float32) @ queries
+    approx = rerank(matrix, codes, queries, keep)
+    k = min(k, len(matrix))
+    found = 0
+    for col in range(queries.shape[1]):
+        want = set(np.argpartition(-exact[:, col], k - 1)[:k].tolist())
+        got = set(np.argpartition(-approx[:, col], k - 1)[:k].tolist())
+        found += len(want & got)
+    return found / (k * queries.shape[1]) if queries.shape[1] else 1.0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the compressed tiers on stored embeddings.")
+    parser.add_argument("directory", nargs="?", default="embeddings", help="default: embeddings/ of the current backend")
+    parser.add_argument("--tier", choices=TIERS[1:], action="append", help="default: both")
+    parser.add_argument("--rerank", type=int, default=RERANK)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--noise", type=float, default=0.05, help="per-dimension noise added to the query rows")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    # Poster matrices are the .npy files with a keys .json beside them; codes files have none.
+    names = sorted(
+        n for n in os.listdir(args.directory)
+        if n.endswith(".npy") and os.path.exists(os.path.join(args.directory, n[:-len(".npy")] + ".json"))
+    ) if os.path.isdir(args.directory) else []
+    if not names:
+        sys.exit(f"No .npy embeddings in {args.directory}")
+    matrix = np.vstack([np.load(os.path.join(args.directory, n), mmap_mode="r") for n in names]).astype(np.float32)
+    rng = np.random.default_rng(args.seed)
+    sample = matrix[rng.choice(len(matrix), min(args.queries, len(matrix)), replace=False)]
+    queries = sample + rng.normal(scale=args.noise, size=sample.shape).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+
+    report = {"rows": len(matrix), "dim": matrix.shape[1], "fp32Bytes": matrix.nbytes, "rerank": args.rerank, "tiers": {}}
+    for tier in args.tier or TIERS[1:]:
+        codes = Codes.build(matrix, tier)
+        report["tiers"][tier] = {
+            "bytes": codes.nbytes,
+            "reduction": round(matrix.nbytes / codes.nbytes, 1),
+            "recallAt1": round(recall(matrix, codes, queries.T, 1, args.rerank), 4),
+            "recallAt10": round(recall(matrix, codes, queries.T, 10, args.rerank), 4),
+        }
+    print(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""
+Persistent candidate-embedding store for verify_quote.
+
+Every post is encoded once and kept on disk under embeddings/ next to the
+data file: one L2-normalised float32 matrix per poster (<poster>.npy) plus a
+key file (<poster>.json) listing the [post_id, sha256(content)] pair of each
+row. Matrices are memory-mapped when loaded, and a request only has to encode
+the quote itself and score it with a single matrix-vector product.
+
+A warm-state snapshot (snapshot.py) can be attached; posters it holds are
+served from it unless their files on disk are newer.
+
+ChunkStore keeps the same kind of matrices, under embeddings/chunks/, for
+pieces of each post: its sentences and overlapping word windows. A quote
+that reproduces or paraphrases only part of a long post scores against the
+piece it came from instead of being diluted by the rest of the post, and
+the pieces are encoded with the post, not per request.
+
+In a compressed tier (compressed.py) a poster's rows are first ranked by
+their int8 or binary codes, kept beside the matrix, and only the best are
+scored in full precision.
+"""
+import hashlib
+import json
+import os
+import re
+from functools import lru_cache
+
+import numpy as np
+
+from .compressed import RERANK, TIERS, Codes, rerank
+
+CHUNK_WORDS = 12      # words per sliding window
+CHUNK_STRIDE = 6
+MIN_CHUNK_WORDS = 4   # shorter sentences are left to the whole-post row
+MAX_CHUNKS = 24       # per post; sentences first, then windows
+CHUNKING = {"words": CHUNK_WORDS, "stride": CHUNK_STRIDE, "minWords": MIN_CHUNK_WORDS, "max": MAX_CHUNKS}
+
+
+@lru_cache(maxsize=1 << 18)
+def content_hash(text):
+    return hashlib.sha256((text or "").encode("utf-8")).hexdigest()
+
+
+def candidate_keys(candidates):
+    return [(str(c.get("post_id")), content_hash(c.get("content"))) for c in candidates]
+
+
+@lru_cache(maxsize=65536)
+def chunk_spans(text):
+    """
+    (start, end) character spans of the sentences and CHUNK_WORDS-word
+    windows of text worth embedding on their own; never the whole text.
+    """
+    words = [m.span() for m in re.finditer(r"\S+", text or "")]
+    if len(words) <= MIN_CHUNK_WORDS:
+        return ()
+    whole = (words[0][0], words[-1][1])
+    spans = []
+    for m in re.finditer(r"[^.!?\n]+[.!?]*", text):
+        inside = [w for w in words if m.start() <= w[0] and w[1] <= m.end()]
+        if len(inside) >= MIN_CHUNK_WORDS:
+            spans.append((inside[0][0], inside[-1][1]))
+    if len(words) > CHUNK_WORDS:
+        for i in range(0, len(words) - CHUNK_WORDS + CHUNK_STRIDE, CHUNK_STRIDE):
+            j = min(i + CHUNK_WORDS, len(words))
+            spans.append((words[j - CHUNK_WORDS][0], words[j - 1][1]))
+    return tuple(dict.fromkeys(s for s in spans if s != whole))[:MAX_CHUNKS]
+
+
+def score_with_chunks(post_matrix, chunk_matrix, offsets, queries, post_codes=None, chunk_codes=None,
+                      keep=RERANK):
+    """
+    Cosine scores of queries (dim, q) against posts, each post scoring as
+    the best of its own row and its chunks' rows (offsets[i]:offsets[i+1]
+    of chunk_matrix). Returns (scores, sources), both (posts, q); sources
+    holds the chunk row that gave each score, or -1 for the post's own row.
+    With codes, only the `keep` best rows of each matrix per query are
+    scored (see compressed.rerank).
+    """
+    post_scores = rerank(post_matrix, post_codes, queries, keep)
+    sources = np.full(post_scores.shape, -1, dtype=np.int64)
+    if chunk_matrix is None or not len(chunk_matrix):
+        return post_scores, sources
+    chunk_scores = rerank(chunk_matrix, chunk_codes, queries, keep)
+    owners = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    scores = post_scores.copy()
+    np.maximum.at(scores, owners, chunk_scores)
+    rows, cols = np.nonzero((chunk_scores > post_scores[owners]) & (chunk_scores >= scores[owners]))
+    sources[owners[rows], cols] = rows
+    return scores, sources
+
+
+class EmbeddingStore:
+    def __init__(self, directory, encode, snapshot_prefix="", tier="fp32"):
+        """
+        directory: where the per-poster .npy/.json pairs live.
+        encode: callable taking a list of texts and returning an (n, dim)
+                array of L2-normalised embeddings.
+        snapshot_prefix: put before the stem of this store's posters in a snapshot.
+        tier: "fp32", or the compressed tier codes_for() serves.
+        """
+        self.directory = directory
+        self.encode = encode
+        self.snapshot_prefix = snapshot_prefix
+        self.tier = tier
+        self._posters = {}  # file stem -> (keys, {key: row}, matrix)
+        self._on_disk = set()  # stems whose matrix was loaded from directory, not a snapshot
+        self._codes = {}  # file stem -> (matrix, Codes)
+        self._snapshot = None
+
+    @staticmethod
+    def stem(poster):
+        return re.sub(r"[^\w.-]", "_", poster.lower())
+
+    def _paths(self, stem):
+        base = os.path.join(self.directory, stem)
+        return base + ".npy", base + ".json"
+
+    def attach(self, snapshot):
+        self._snapshot = snapshot
+        self._posters = {}
+        self._on_disk = set()
+        self._codes = {}
+
+    def _from_snapshot(self, stem, keys_path):
+        if self._snapshot is None:
+            return None
+        try:
+            if os.path.getmtime(keys_path) > self._snapshot.mtime:
+                return None  # re-encoded since the snapshot was built
+        except OSError:
+            pass
+        return self._snapshot.poster(self.snapshot_prefix + stem)
+
+    def _load(self, stem):
+        entry = self._posters.get(stem)
+        if entry is not None:
+            return entry
+        matrix_path, keys_path = self._paths(stem)
+        found = self._from_snapshot(stem, keys_path)
+        if found is not None:
+            keys, matrix = found
+            entry = self._posters[stem] = (keys, {k: i for i, k in enumerate(keys)}, matrix)
+            self._on_disk.discard(stem)
+            return entry
+        keys, matrix = [], None
+        if os.path.exists(matrix_path) and os.path.exists(keys_path):
+            try:
+                with open(keys_path, "r", encoding="utf-8") as f:
+                    keys = [tuple(k) for k in json.load(f)]
+                matrix = np.load(matrix_path, mmap_mode="r")
+                if matrix.shape[0] != len(keys):
+                    keys, matrix = [], None
+            except (OSError, ValueError):
+                keys, matrix = [], None
+        entry = (keys, {k: i for i, k in enumerate(keys)}, matrix)
+        self._posters[stem] = entry
+        self._on_disk.add(stem)
+        return entry
+
+    def _save(self, stem, keys, matrix):
+        # Drop our map of the old file first; Windows refuses to replace a mapped file.
+        self._posters.pop(stem, None)
+        self._codes.pop(stem, None)
+        os.makedirs(self.directory, exist_ok=True)
+        matrix_path, keys_path = self._paths(stem)
+        # Codes of the old rows no longer line up; codes_for() rebuilds them.
+        for tier in TIERS[1:]:
+            for path in Codes.paths(os.path.join(self.directory, stem), tier):
+                try:
+                    os.remove(path)
+                except OSError:
+                    pass
+        # Write to temp files first so a crash never leaves keys and rows out of step.
+        with open(matrix_path + ".tmp", "wb") as f:
+            np.save(f, matrix)
+        with open(keys_path + ".tmp", "w", encoding="utf-8") as f:
+            json.dump([list(k) for k in keys], f)
+        os.replace(matrix_path + ".tmp", matrix_path)
+        os.replace(keys_path + ".tmp", keys_path)
+        return self._load(stem)
+
+    def preload(self):
+        """Map every stored poster matrix up front, e.g. when a long-lived service starts."""
+        if not os.path.isdir(self.directory):
+            return
+        for name in os.listdir(self.directory):
+            if name.endswith(".json"):
+                self._load(name[:-len(".json")])
+
+    def entry(self, poster):
+        """(keys, matrix) as stored for poster, for writing a snapshot."""
+        keys, _, matrix = self._load(self.stem(poster))
+        return keys, matrix
+
+    def codes_for(self, poster, matrix):
+        """
+        Compressed codes of a matrix matrix_for() returned for poster, or None
+        in the fp32 tier. A stored matrix's codes are saved beside it
+        (<poster>.int8.npy, ...), so its fp32 rows are read to build them once.
+        """
+        if self.tier == "fp32" or matrix is None:
+            return None
+        stem = self.stem(poster)
+        found = self._codes.get(stem)
+        if found is None or found[0] is not matrix:
+            base = os.path.join(self.directory, stem)
+            stored = stem in self._on_disk and self._posters[stem][2] is matrix
+            codes = None
+            if stored and self._codes_fresh(base):
+                codes = Codes.load(base, self.tier, *matrix.shape)
+            if codes is None:
+                codes = Codes.build(matrix, self.tier)
+                if stored:
+                    codes.save(base)
+            found = self._codes[stem] = (matrix, codes)
+        return found[1]
+
+    def _codes_fresh(self, base):
+        try:
+            return os.path.getmtime(Codes.paths(base, self.tier)[0]) >= os.path.getmtime(base + ".npy")
+        except OSError:
+            return False
+
+    def matrix_for(self, poster, candidates, keys=None):
+        """
+        Return an (n, dim) matrix whose rows line up with candidates.
+        Only posts that are new or whose content changed get encoded; the
+        stored matrix is then rewritten to exactly the current candidates.
+        keys, if given, replace candidate_keys(candidates) as the row keys.
+        """
+        stem = self.stem(poster)
+        keys = candidate_keys(candidates) if keys is None else keys
+        stored_keys, index, matrix = self._load(stem)
+
+        missing = [i for i, k in enumerate(keys) if k not in index]
+        if missing:
+            encoded = np.asarray(
+                self.encode([candidates[i].get("content") or "" for i in missing]),
+                dtype=np.float32,
+            )
+            new_rows = dict(zip(missing, encoded))
+            updated = np.vstack([
+                new_rows[i] if i in new_rows else matrix[index[k]] for i, k in enumerate(keys)
+            ])
+            del matrix, new_rows
+            stored_keys, index, matrix = self._save(stem, keys, updated)
+
+        if stored_keys == keys:
+            return matrix
+        return matrix[[index[k] for k in keys]]
+
+
+class ChunkStore:
+    """Sentence and window embeddings of each post; see chunk_spans()."""
+
+    SNAPSHOT_PREFIX = "chunks/"
+
+    def __init__(self, directory, encode, tier="fp32"):
+        self.store = EmbeddingStore(directory, encode, self.SNAPSHOT_PREFIX, tier)
+        self._layouts = {}  # stem -> (post keys, pieces, piece keys, offsets, spans)
+
+    def attach(self, snapshot):
+        self.store.attach(snapshot)
+
+    def preload(self):
+        self.store.preload()
+
+    def entry(self, poster):
+        return self.store.entry(poster)
+
+    def codes_for(self, poster, matrix):
+        return self.store.codes_for(poster, matrix)
+
+    def matrix_for(self, poster, candidates):
+        """
+        (matrix, offsets, spans): rows offsets[i]:offsets[i+1] of matrix are
+        the chunks of candidates[i], and spans[row] is the (start, end) of a
+        row's chunk in that post's content. A chunk is keyed by its post's
+        key and its span, so it is encoded once, like the post.
+        """
+        stem = EmbeddingStore.stem(poster)
+        post_keys = candidate_keys(candidates)
+        layout = self._layouts.get(stem)
+        if layout is None or layout[0] != post_keys:
+            pieces, piece_keys, spans, offsets = [], [], [], [0]
+            for c, (post_id, digest) in zip(candidates, post_keys):
+                content = c.get("content") or ""
+                for start, end in chunk_spans(content):
+                    pieces.append({"content": content[start:end]})
+                    piece_keys.append((f"{post_id}@{start}:{end}", digest))
+                    spans.append((start, end))
+                offsets.append(len(spans))
+            layout = self._layouts[stem] = (post_keys, pieces, piece_keys, np.asarray(offsets, np.int64), spans)
+        _, pieces, piece_keys, offsets, spans = layout
+        matrix = self.store.matrix_for(poster, pieces, piece_keys) if pieces else None
+        return matrix, offsets, spans
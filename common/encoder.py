@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+"""
+Sentence encoders for verify_quote.
+
+Two interchangeable backends produce all-MiniLM-L6-v2 embeddings, mean
+pooled and L2-normalised, as SentenceTransformer.encode() does:
+
+  torch  sentence_transformers on PyTorch in fp32, as before
+  onnx   an exported copy of the model, int8-quantized by default, run by
+         onnxruntime with the `tokenizers` tokenizer; torch is not needed
+
+VERIFY_ENCODER picks one (default torch). VERIFY_ONNX_MODEL points at the
+exported model, either its directory or an .onnx file in it (default
+models/all-MiniLM-L6-v2-int8/ at the repository root, one export for every
+backend), and VERIFY_ENCODER_THREADS caps the onnxruntime threads. Nothing is imported until an encoder is built.
+
+Embeddings already in embeddings/ stay usable after switching: the parity
+check bounds how far scores from the two backends can drift apart.
+
+    python3 common/encoder.py export [--output DIR] [--no-quantize]  # once, needs torch + transformers
+    python3 verify_quote.py --parity < inputs.json  # in a backend; torch vs onnx on real candidates
+"""
+import argparse
+import json
+import os
+import shutil
+import sys
+import time
+
+import numpy as np
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_NAME = "all-MiniLM-L6-v2"
+ONNX_DIR = os.path.join(REPO_DIR, "models", f"{MODEL_NAME}-int8")
+MAX_TOKENS = 256  # all-MiniLM-L6-v2's max_seq_length; longer texts are truncated
+BATCH_SIZE = 64
+PARITY_TOLERANCE = 0.02
+
+
+class TorchEncoder:
+    name = "torch"
+
+    def __init__(self, model_name=MODEL_NAME):
+        # Imported here: sentence_transformers pulls in torch, which takes seconds to load.
+        from sentence_transformers import SentenceTransformer
+        self.model = SentenceTransformer(model_name)
+
+    def encode(self, texts):
+        return self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+
+
+class OnnxEncoder:
+    name = "onnx"
+
+    def __init__(self, path=ONNX_DIR, threads=None):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        directory, model_path = (path, os.path.join(path, "model.onnx")) if os.path.isdir(path) \
+            else (os.path.dirname(path), path)
+        try:
+            with open(os.path.join(directory, "encoder.json"), "r", encoding="utf-8") as f:
+                config = json.load(f)
+        except (OSError, ValueError):
+            config = {}
+        self.path = model_path
+        self.tokenizer = Tokenizer.from_file(os.path.join(directory, "tokenizer.json"))
+        self.tokenizer.enable_truncation(config.get("maxTokens", MAX_TOKENS))
+        self.tokenizer.no_padding()
+
+        options = onnxruntime.SessionOptions()
+        if threads:
+            options.intra_op_num_threads = threads
+        self.session = onnxruntime.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_names = [i.name for i in self.session.get_inputs()]
+
+    def encode(self, texts, batch_size=BATCH_SIZE):
+        if isinstance(texts, str):
+            return self.encode([texts], batch_size)[0]
+        encodings = self.tokenizer.encode_batch(list(texts))
+        # Similar lengths share a batch, so little of each batch is padding.
+        order = sorted(range(len(encodings)), key=lambda i: len(encodings[i].ids))
+        rows = [None] * len(encodings)
+        for start in range(0, len(order), batch_size):
+            chunk = order[start:start + batch_size]
+            width = max(len(encodings[i].ids) for i in chunk)
+            feed = {name: np.zeros((len(chunk), width), dtype=np.int64)
+                    for name in ("input_ids", "attention_mask", "token_type_ids")}
+            for row, i in enumerate(chunk):
+                e = encodings[i]
+                feed["input_ids"][row, :len(e.ids)] = e.ids
+                feed["attention_mask"][row, :len(e.ids)] = e.attention_mask
+                feed["token_type_ids"][row, :len(e.ids)] = e.type_ids
+            hidden = self.session.run(None, {name: feed[name] for name in self.input_names})[0]
+            mask = feed["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            for row, i in enumerate(chunk):
+                rows[i] = pooled[row]
+        if not rows:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(rows).astype(np.float32)
+
+
+def load_encoder(spec=None, model_name=MODEL_NAME):
+    """
+    spec: "torch", "onnx" (the VERIFY_ONNX_MODEL export) or a path to an
+    export; defaults to VERIFY_ENCODER.
+    """
+    spec = spec or os.getenv("VERIFY_ENCODER") or "torch"
+    threads = int(os.getenv("VERIFY_ENCODER_THREADS") or 0) or None
+    if spec == "torch":
+        return TorchEncoder(model_name)
+    if spec == "onnx":
+        return OnnxEncoder(os.getenv("VERIFY_ONNX_MODEL") or ONNX_DIR, threads)
+    if os.path.exists(spec):
+        return OnnxEncoder(spec, threads)
+    raise ValueError(f"Unknown encoder {spec!r}; expected torch, onnx or a path to an ONNX export")
+
+
+def configured():
+    """What load_encoder() would build, without building it: "torch" or "onnx:<export path>"."""
+    spec = os.getenv("VERIFY_ENCODER") or "torch"
+    if spec == "torch":
+        return spec
+    path = (os.getenv("VERIFY_ONNX_MODEL") or ONNX_DIR) if spec == "onnx" else spec
+    return f"onnx:{os.path.abspath(path)}"
+
+
+def describe(encoder):
+    return f"{encoder.name}:{encoder.path}" if hasattr(encoder, "path") else encoder.name
+
+
+def parity(pairs, reference, candidate, thresholds, tolerance=PARITY_TOLERANCE):
+    """
+    Score (quote, candidate text) pairs with both encoders and compare.
+    Passes when no cosine score moves by more than tolerance, so a verdict
+    can only change for a pair already within tolerance of a threshold.
+    """
+    texts = sorted({t for pair in pairs for t in pair})
+    position = {t: i for i, t in enumerate(texts)}
+    left = [position[q] for q, _ in pairs]
+    right = [position[c] for _, c in pairs]
+
+    scores, seconds = [], []
+    for encoder in (reference, candidate):
+        encoder.encode(["warm up"])
+        started = time.perf_counter()
+        embeddings = np.asarray(encoder.encode(texts), dtype=np.float32) if texts else np.zeros((0, 0), np.float32)
+        seconds.append(time.perf_counter() - started)
+        scores.append(np.einsum("ij,ij->i", embeddings[left], embeddings[right]) if pairs else np.zeros(0))
+
+    ref, cand = scores
+    diff = np.abs(ref - cand)
+    return {
+        "reference": describe(reference),
+        "candidate": describe(candidate),
+        "pairs": len(pairs),
+        "texts": len(texts),
+        "maxDiff": round(float(diff.max()), 5) if len(diff) else 0.0,
+        "meanDiff": round(float(diff.mean()), 5) if len(diff) else 0.0,
+        "thresholds": {
+            str(t): {
+                "near": int((np.abs(ref - t) <= tolerance).sum()),
+                "flipped": int(((ref >= t) != (cand >= t)).sum()),
+            }
+            for t in thresholds
+        },
+        "encodeSeconds": {"reference": round(seconds[0], 3), "candidate": round(seconds[1], 3)},
+        "speedup": round(seconds[0] / seconds[1], 2) if seconds[1] else None,
+        "tolerance": tolerance,
+        "passed": bool(len(diff) == 0 or diff.max() <= tolerance),
+    }
+
+
+def export(output=ONNX_DIR, model_name=MODEL_NAME, quantize=True):
+    """Export the transformer to ONNX (and int8-quantize it) with its tokenizer."""
+    import torch
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+    from transformers import AutoModel, AutoTokenizer
+
+    hub_name = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    tokenizer = AutoTokenizer.from_pretrained(hub_name)
+    model = AutoModel.from_pretrained(hub_name, torchscript=True).eval()
+    os.makedirs(output, exist_ok=True)
+
+    names = ["input_ids", "attention_mask", "token_type_ids"]
+    sample = tokenizer(["An example sentence to trace the graph with."], return_tensors="pt")
+    fp32_path = os.path.join(output, "model_fp32.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model, tuple(sample[n] for n in names), fp32_path,
+            input_names=names, output_names=["last_hidden_state"],
+            dynamic_axes={n: {0: "batch", 1: "tokens"} for n in names + ["last_hidden_state"]},
+            opset_version=14,
+        )
+    model_path = os.path.join(output, "model.onnx")
+    if quantize:
+        # Dynamic quantization: int8 weights, activations quantized per batch at run time.
+        quantize_dynamic(fp32_path, model_path, weight_type=QuantType.QInt8)
+    else:
+        shutil.copyfile(fp32_path, model_path)
+    tokenizer.backend_tokenizer.save(os.path.join(output, "tokenizer.json"))
+    with open(os.path.join(output, "encoder.json"), "w", encoding="utf-8") as f:
+        json.dump({"model": model_name, "maxTokens": MAX_TOKENS, "quantized": quantize}, f, indent=2)
+    return {"output": output, "bytes": os.path.getsize(model_path), "fp32Bytes": os.path.getsize(fp32_path)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the sentence encoder for onnxruntime.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    export_parser = sub.add_parser("export", help="write model.onnx, model_fp32.onnx and tokenizer.json")
+    export_parser.add_argument("--output", default=ONNX_DIR)
+    export_parser.add_argument("--model", default=MODEL_NAME)
+    export_parser.add_argument("--no-quantize", action="store_true", help="keep model.onnx in fp32")
+    args = parser.parse_args()
+    try:
+        print(json.dumps(export(args.output, args.model, not args.no_quantize)))
+    except ImportError as e:
+        sys.exit(f"export needs torch, transformers and onnxruntime: {e}")
+
+
+if __name__ == "__main__":
+    main()
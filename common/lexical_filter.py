@@ -0,0 +1,46 @@
+"""
+Cheap lexical stage that runs before the sentence encoder.
+
+The quote and a post are compared after normalisation (case, punctuation,
+quote marks and whitespace folded away). A quote that equals a post, or is
+a long verbatim excerpt of one, is verified without ever running the model.
+Anything else (e.g. a paraphrase) is scored against every candidate's
+stored embedding as before.
+
+Normalised forms and fingerprints are cached per text, so repeat candidates
+cost a dictionary lookup.
+"""
+import hashlib
+import re
+import unicodedata
+from functools import lru_cache
+
+MIN_EXCERPT_CHARS = 40   # shorter verbatim fragments still go through the model
+
+
+@lru_cache(maxsize=65536)
+def normalize(text):
+    text = unicodedata.normalize("NFKC", text or "").lower()
+    return " ".join(re.findall(r"\w+", text))
+
+
+@lru_cache(maxsize=65536)
+def fingerprint(text):
+    return hashlib.sha256(normalize(text).encode("utf-8")).hexdigest()
+
+
+def exact_matches(quote, candidates):
+    """Indexes of candidates the quote reproduces verbatim (after normalisation)."""
+    q = normalize(quote)
+    if not q:
+        return []
+    q_hash = fingerprint(quote)
+    hits = []
+    for idx, cand in enumerate(candidates):
+        content = cand.get("content") or ""
+        if fingerprint(content) == q_hash:
+            hits.append(idx)
+        # Padded so the excerpt starts and ends on word boundaries of the post.
+        elif len(q) >= MIN_EXCERPT_CHARS and f" {q} " in f" {normalize(content)} ":
+            hits.append(idx)
+    return hits
@@ -0,0 +1,209 @@
+"""
+Opt-in timing for verify_quote.
+
+With VERIFY_TIMINGS=1 (verify_server.py --metrics sets it) every
+verify_quotes() call records where its time went, stage by stage, and each
+result carries the breakdown in a `timings` field:
+
+    {"stages": {"extract": 0.04, "candidates": 1.9, "encode": 11.2, ...},
+     "totalMs": 13.6, "batch": 1, "candidates": 412, "cache": "miss"}
+
+Stage times are milliseconds for the whole call, so results verified in one
+batch share them; batch, candidates (posts the quote was scored against) and
+cache (hit or miss) are the result's own. A stage that runs inside another
+(the model loading during the first encode, say) is only counted in the
+inner one, so the stages add up to roughly totalMs. A command-line run also
+reports "startup": interpreter start, imports and argument parsing before
+the call, which totalMs leaves out.
+
+The process also aggregates them into histograms and counters, which
+verify_server.py serves at GET /metrics in the Prometheus text format:
+
+    verify_stage_seconds{stage}      per-call time of each stage
+    verify_request_seconds           per-call total
+    verify_candidates                posts scored per quote
+    verify_results_total{cache}      results by cache outcome
+
+With the variable unset, stage() hands back one shared no-op and nothing is
+recorded.
+"""
+import os
+import threading
+import time
+
+ENABLED = os.getenv("VERIFY_TIMINGS", "").lower() in ("1", "true", "yes")
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+CANDIDATE_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000)
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets, label=None):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self.label = label
+        self.series = {}  # label value -> [count per bucket..., +Inf count, sum]
+
+    def observe(self, value, label_value=None):
+        counts = self.series.get(label_value)
+        if counts is None:
+            counts = self.series[label_value] = [0] * (len(self.buckets) + 2)
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                counts[i] += 1
+        counts[-2] += 1
+        counts[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for label_value, counts in sorted(self.series.items(), key=lambda kv: kv[0] or ""):
+            base = f'{self.label}="{label_value}",' if self.label else ""
+            for bound, count in zip(self.buckets, counts):
+                lines.append(f'{self.name}_bucket{{{base}le="{bound}"}} {count}')
+            lines.append(f'{self.name}_bucket{{{base}le="+Inf"}} {counts[-2]}')
+            labels = f"{{{base.rstrip(',')}}}" if base else ""
+            lines.append(f"{self.name}_sum{labels} {counts[-1]:.6f}")
+            lines.append(f"{self.name}_count{labels} {counts[-2]}")
+        return lines
+
+
+class Counter:
+    def __init__(self, name, help_text, label):
+        self.name = name
+        self.help = help_text
+        self.label = label
+        self.values = {}
+
+    def inc(self, label_value, amount=1):
+        self.values[label_value] = self.values.get(label_value, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f'{self.name}{{{self.label}="{v}"}} {n}' for v, n in sorted(self.values.items())]
+        return lines
+
+
+stage_seconds = Histogram("verify_stage_seconds", "Time spent in each verification stage per call.",
+                          SECONDS_BUCKETS, "stage")
+request_seconds = Histogram("verify_request_seconds", "Time per verify_quotes() call.", SECONDS_BUCKETS)
+candidate_counts = Histogram("verify_candidates", "Candidate posts each quote was scored against.",
+                             CANDIDATE_BUCKETS)
+results_total = Counter("verify_results_total", "Verification results by result cache outcome.", "cache")
+_lock = threading.Lock()
+_local = threading.local()
+_startup = None
+
+
+class Call:
+    """Timings of one verify_quotes() call."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.stages = {}
+        self.notes = {}  # id(result) -> {"candidates": n, "cache": "hit"}
+        self.stack = []  # [name, started, seconds spent in nested stages]
+
+    def note(self, result, **fields):
+        self.notes.setdefault(id(result), {}).update(fields)
+
+
+class _Stage:
+    __slots__ = ("call", "name")
+
+    def __init__(self, call, name):
+        self.call = call
+        self.name = name
+
+    def __enter__(self):
+        self.call.stack.append([self.name, time.perf_counter(), 0.0])
+
+    def __exit__(self, *exc):
+        name, started, nested = self.call.stack.pop()
+        elapsed = time.perf_counter() - started
+        self.call.stages[name] = self.call.stages.get(name, 0.0) + elapsed - nested
+        if self.call.stack:
+            self.call.stack[-1][2] += elapsed
+
+
+class _Off:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, *exc):
+        pass
+
+
+_OFF = _Off()
+
+
+def process_age():
+    """Seconds since this process started, from /proc; None where that is unavailable."""
+    try:
+        with open("/proc/self/stat", "rb") as f:
+            # Field 22, counted after the parenthesised command name, which may contain spaces.
+            started = int(f.read().rsplit(b")", 1)[1].split()[19]) / os.sysconf("SC_CLK_TCK")
+        with open("/proc/uptime", "rb") as f:
+            return max(float(f.read().split()[0]) - started, 0.0)
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def startup():
+    """Count interpreter start-up and imports as a "startup" stage of the next call (CLI runs)."""
+    global _startup
+    if ENABLED:
+        _startup = process_age()
+
+
+def begin():
+    if ENABLED:
+        _local.call = Call()
+
+
+def stage(name):
+    call = getattr(_local, "call", None)
+    return _Stage(call, name) if call is not None else _OFF
+
+
+def note(result, **fields):
+    call = getattr(_local, "call", None)
+    if call is not None:
+        call.note(result, **fields)
+
+
+def finish(results):
+    """Attach `timings` to each result and add the call to the aggregates."""
+    global _startup
+    call = getattr(_local, "call", None)
+    if call is None:
+        return
+    _local.call = None
+    total = time.perf_counter() - call.started
+    stages = dict(call.stages)
+    if _startup is not None:
+        stages["startup"], _startup = _startup, None
+    rounded = {name: round(seconds * 1000, 3) for name, seconds in stages.items()}
+    for result in results:
+        timings = {"stages": rounded, "totalMs": round(total * 1000, 3), "batch": len(results)}
+        timings.update(call.notes.get(id(result), {}))
+        result["timings"] = timings
+
+    with _lock:
+        request_seconds.observe(total)
+        for name, seconds in stages.items():
+            stage_seconds.observe(seconds, name)
+        for result in results:
+            fields = call.notes.get(id(result), {})
+            if "candidates" in fields:
+                candidate_counts.observe(fields["candidates"])
+            if "cache" in fields:
+                results_total.inc(fields["cache"])
+
+
+def render():
+    """Everything recorded so far, in the Prometheus text exposition format."""
+    with _lock:
+        lines = []
+        for metric in (stage_seconds, request_seconds, candidate_counts, results_total):
+            lines += metric.render()
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,142 @@
+"""
+The verifiers' corpus-wide index (ann_index.IVFIndex), kept in step with a
+backend's data.
+
+Each row of the index holds only a row id from the backend's corpus, never
+the post itself: quotes.db's id in the hashed and merkle backends, the
+block's chain position in the raw one. Search results are looked up again
+through the corpus, so meta.json stays small and a match always shows what
+is stored now. A corpus is any object with
+
+    version()            the data version, as result_cache sees it
+    added_since(version) (watermark, posters): row ids above watermark were
+                         added after `version`, and only those posters have
+                         any; everything for version None; None if the data
+                         no longer extends `version`
+    candidates(poster)   (posts, ids) of the poster's rows, in id order, as
+                         EmbeddingStore.matrix_for() takes them
+    posts(ids)           {id: {"poster", "post_id", "content", "tweetUrl"}}
+
+Rows added since the saved index was built join its nearest lists; the lists
+themselves are retrained on a background thread (retrain()). The first build
+embeds the whole corpus, so a long-lived service does it when it starts (see
+verify_server.py) rather than on its first request.
+"""
+import threading
+
+import numpy as np
+
+from .ann_index import IVFIndex
+
+
+class QuotesCorpus:
+    """The rows of a quotes.db (quotes_store.QuotesDB), by quotes.id."""
+
+    def __init__(self, quotes_db):
+        self.quotes_db = quotes_db
+
+    def version(self):
+        return self.quotes_db.version()
+
+    def added_since(self, version):
+        if version is None:
+            rows = [(poster,) for poster in self.quotes_db.posters()]
+            watermark = 0
+        else:
+            rows = self.quotes_db.added_since(version, "poster")
+            if rows is None:
+                return None
+            watermark = int(version) if version.isdigit() else 0
+        # by_poster() matches on poster_key, so each key is one poster.
+        posters = {poster.strip().lower(): poster for poster, in rows}
+        return watermark, list(posters.values())
+
+    def candidates(self, poster):
+        rows = self.quotes_db.by_poster(poster, "id, post_id, content, tweet_url")
+        posts = [{"post_id": r[1], "content": r[2], "tweetUrl": r[3]} for r in rows]
+        return posts, [r[0] for r in rows]
+
+    def posts(self, ids):
+        return {
+            r[0]: {"poster": r[1], "post_id": r[2], "content": r[3], "tweetUrl": r[4]}
+            for r in self.quotes_db.by_ids(ids, "id, poster, post_id, content, tweet_url")
+        }
+
+
+class PostIndex:
+    def __init__(self, directory, embedding_store, corpus, tier="fp32"):
+        self.directory = directory
+        self.embedding_store = embedding_store
+        self.corpus = corpus
+        self.tier = tier
+        self.index = None
+        self.lock = threading.Lock()  # get() vs. retrain()'s thread
+        self.retrain_thread = None
+
+    def _rows(self, since):
+        """(vectors, ids) of the rows added after `since` (all of them for None); None if it cannot say."""
+        found = self.corpus.added_since(since)
+        if found is None:
+            return None
+        watermark, posters = found
+        vectors, ids = [], []
+        for poster in posters:
+            posts, row_ids = self.corpus.candidates(poster)
+            keep = [i for i, row_id in enumerate(row_ids) if row_id > watermark]
+            if keep:
+                vectors.append(self.embedding_store.matrix_for(poster, posts)[keep])
+                ids.extend(row_ids[i] for i in keep)
+        matrix = np.vstack(vectors) if vectors else np.zeros((0, 0), dtype=np.float32)
+        return matrix, ids
+
+    def _load(self):
+        index = IVFIndex.load(self.directory)
+        # Indexes saved before rows were ids carry the posts themselves; rebuild those.
+        if index is not None and index.meta and not isinstance(index.meta[0], int):
+            return None
+        return index
+
+    def get(self, retrain=True):
+        """The index, caught up with the corpus; built from scratch if there is none that can catch up."""
+        version = self.corpus.version()
+        with self.lock:
+            if self.index is None:
+                self.index = self._load()
+            if self.index is not None and self.index.version != version:
+                added = self._rows(self.index.version)
+                if added is not None and self.index.add(*added, version):
+                    self.index.save_extra(self.directory)
+                else:
+                    self.index = None
+            if self.index is None:
+                # k-means over the whole corpus: the first build, or after rows were removed.
+                self.index = IVFIndex.build(*self._rows(None), version, tier=self.tier)
+                self.index.save(self.directory)
+            elif self.index.tier != self.tier:
+                self.index.compress(self.tier)  # in memory; saved with the next retrain
+            index = self.index
+            if retrain and index.needs_retrain() and not (self.retrain_thread and self.retrain_thread.is_alive()):
+                self.retrain_thread = threading.Thread(target=self.retrain, args=(index,), daemon=True)
+                self.retrain_thread.start()
+        return index
+
+    def retrain(self, index):
+        """Re-run k-means over every row of index, then swap the result in and save it."""
+        if len(index.extra_lists) == 0:
+            return index  # nothing added since k-means last ran
+        with self.lock:
+            rows, version = len(index), index.version
+        fresh = index.retrained(rows, version)
+        with self.lock:
+            if self.index is not index:
+                return self.index
+            fresh.add(*index.added_after(fresh), index.version)
+            fresh.save(self.directory)
+            self.index = fresh
+        return fresh
+
+    def search(self, query, k):
+        """Up to k (post, score) pairs, best first, as the corpus stores the posts now."""
+        hits = self.get().search(query, k=k)
+        posts = self.corpus.posts([row_id for row_id, _ in hits])
+        return [(posts[row_id], score) for row_id, score in hits if row_id in posts]
@@ -0,0 +1,51 @@
+// quotes.db helpers shared by the Express services that read it.
+//
+// common/quotes_store.py migrates a database to schema version 1: a
+// poster_key = lower(trim(poster)) index and quotes_fts, an FTS5 table over
+// content. quoteFilters() searches through those, and falls back to the
+// table scans they replace for a database that could not be migrated.
+const path = require("path");
+const { execFileSync } = require("child_process");
+
+const SCHEMA_VERSION = 1;
+const MIGRATE_SCRIPT = path.join(__dirname, "quotes_store.py");
+
+// Runs the migration, a no-op once done; throws if it fails (duplicate posts).
+function migrateQuotesDb(dbPath) {
+  execFileSync("python3", [MIGRATE_SCRIPT, dbPath], { stdio: "inherit" });
+}
+
+// The search text as one FTS5 phrase with its last word as a prefix, so it
+// finds the word-aligned runs `content LIKE '%text%'` finds; null without words.
+function ftsPhrase(text) {
+  const words = String(text).match(/[\p{L}\p{N}_]+/gu) || [];
+  return words.length ? `"${words.join(" ")}"*` : null;
+}
+
+// WHERE clauses and params for ?search= (substring of content) and ?author=.
+function quoteFilters({ search, author }, indexed) {
+  const where = [];
+  const params = [];
+  if (search) {
+    const phrase = indexed && ftsPhrase(search);
+    if (phrase) {
+      // The phrase narrows through the index; LIKE keeps the substring meaning.
+      where.push("id IN (SELECT rowid FROM quotes_fts WHERE quotes_fts MATCH ?)");
+      params.push(phrase);
+    }
+    where.push("content LIKE ?");
+    params.push(`%${search}%`);
+  }
+  if (author) {
+    if (indexed) {
+      where.push("poster_key = lower(trim(?)) AND poster = ?");
+      params.push(author, author);
+    } else {
+      where.push("poster = ?");
+      params.push(author);
+    }
+  }
+  return { where, params };
+}
+
+module.exports = { SCHEMA_VERSION, migrateQuotesDb, ftsPhrase, quoteFilters };
@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Indexed access to quotes.db, and the migration that makes it indexable.
+
+The original schema has no index beyond the rowid, so `lower(poster) = ?`
+and `content LIKE '%…%'` scan the whole table. migrate() brings a database
+to SCHEMA_VERSION:
+
+  - poster_key = lower(trim(poster)) with an index, filled in by a trigger
+    for rows inserted by code that does not know about it (seed.js, ...)
+  - a UNIQUE index on (platform, post_id)
+  - quotes_fts, an external-content FTS5 table over content, kept in sync
+    with quotes by triggers
+  - WAL journaling, so the verifier can read while server.js writes
+
+The migration is idempotent, so everything that writes or serves quotes.db
+runs it on start: the Express services, seed.js and import-blockchain.js
+(through common/quotes_db.js), ingest_posts.py, and the verifier when it
+first opens the database. It can also be run by hand:
+
+    python3 common/quotes_store.py <backend>/quotes.db [--drop-duplicates]
+
+QuotesDB, the verifier's view, migrates through a short-lived read-write
+connection only when the schema is behind, then answers candidate and
+lexical lookups through a read-only one. A database that cannot be migrated
+(duplicate posts) raises MigrationRequired.
+"""
+import json
+import os
+import re
+import sqlite3
+import sys
+from urllib.request import pathname2url
+
+SCHEMA_VERSION = 1
+ROW_COLUMNS = "platform, poster, post_id, content, post_time, tweet_url"
+SEARCH_LIMIT = 50
+SEARCH_TERMS = 32  # tokens ANDed into one FTS query
+
+MIGRATION = """
+CREATE INDEX IF NOT EXISTS idx_quotes_poster_key ON quotes(poster_key);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_quotes_platform_post ON quotes(platform, post_id);
+
+CREATE TRIGGER IF NOT EXISTS quotes_poster_key_insert AFTER INSERT ON quotes
+WHEN new.poster_key IS NULL BEGIN
+    UPDATE quotes SET poster_key = lower(trim(new.poster)) WHERE id = new.id;
+END;
+CREATE TRIGGER IF NOT EXISTS quotes_poster_key_update AFTER UPDATE OF poster ON quotes BEGIN
+    UPDATE quotes SET poster_key = lower(trim(new.poster)) WHERE id = new.id;
+END;
+
+CREATE VIRTUAL TABLE IF NOT EXISTS quotes_fts USING fts5(
+    content, content='quotes', content_rowid='id', tokenize='unicode61 remove_diacritics 2'
+);
+CREATE TRIGGER IF NOT EXISTS quotes_fts_insert AFTER INSERT ON quotes BEGIN
+    INSERT INTO quotes_fts(rowid, content) VALUES (new.id, new.content);
+END;
+CREATE TRIGGER IF NOT EXISTS quotes_fts_delete AFTER DELETE ON quotes BEGIN
+    INSERT INTO quotes_fts(quotes_fts, rowid, content) VALUES ('delete', old.id, old.content);
+END;
+CREATE TRIGGER IF NOT EXISTS quotes_fts_update AFTER UPDATE OF content ON quotes BEGIN
+    INSERT INTO quotes_fts(quotes_fts, rowid, content) VALUES ('delete', old.id, old.content);
+    INSERT INTO quotes_fts(rowid, content) VALUES (new.id, new.content);
+END;
+INSERT INTO quotes_fts(quotes_fts) VALUES ('rebuild');
+"""
+
+
+class MigrationRequired(RuntimeError):
+    pass
+
+
+def duplicate_posts(conn):
+    """(platform, post_id, [ids]) for every post stored more than once."""
+    rows = conn.execute("""
+        SELECT platform, post_id, group_concat(id) FROM quotes
+        GROUP BY platform, post_id HAVING count(*) > 1
+    """).fetchall()
+    return [(platform, post_id, [int(i) for i in ids.split(",")]) for platform, post_id, ids in rows]
+
+
+def migrate(conn, drop_duplicates=False):
+    """
+    Bring the database to SCHEMA_VERSION; a no-op when it is already there.
+    Raises ValueError if duplicate (platform, post_id) rows block the unique
+    index, unless drop_duplicates, which keeps the oldest row of each.
+    """
+    if conn.execute("PRAGMA user_version").fetchone()[0] >= SCHEMA_VERSION:
+        return {"version": SCHEMA_VERSION, "migrated": False, "dropped": 0}
+
+    duplicates = duplicate_posts(conn)
+    if duplicates and not drop_duplicates:
+        raise ValueError(f"{len(duplicates)} posts are stored more than once, e.g. {duplicates[0]}")
+    drop = [str(i) for _, _, ids in duplicates for i in ids[1:]]
+
+    script = ["BEGIN;"]
+    if drop:
+        script.append(f"DELETE FROM quotes WHERE id IN ({','.join(drop)});")
+    if "poster_key" not in [r[1] for r in conn.execute("PRAGMA table_info(quotes)")]:
+        script.append("ALTER TABLE quotes ADD COLUMN poster_key TEXT;")
+    script += [
+        "UPDATE quotes SET poster_key = lower(trim(poster));",
+        MIGRATION,
+        f"PRAGMA user_version = {SCHEMA_VERSION};",
+        "COMMIT;",
+    ]
+    conn.execute("PRAGMA journal_mode=WAL")
+    try:
+        conn.executescript("\n".join(script))
+    except sqlite3.Error:
+        if conn.in_transaction:
+            conn.execute("ROLLBACK")
+        raise
+    return {"version": SCHEMA_VERSION, "migrated": True, "dropped": len(drop)}
+
+
+def fts_query(text, terms=SEARCH_TERMS):
+    """An FTS5 query requiring every word of text (up to `terms` of them)."""
+    words = re.findall(r"\w+", text or "")
+    return " ".join(f'"{w}"' for w in words[:terms])
+
+
+class QuotesDB:
+    def __init__(self, path):
+        self.path = path
+        self._conn = None
+
+    @property
+    def conn(self):
+        # Opened on first use, so importing the verifier touches no files.
+        if self._conn is None:
+            conn = self._open_read_only()
+            if conn.execute("PRAGMA user_version").fetchone()[0] < SCHEMA_VERSION:
+                conn.close()
+                self._migrate()
+                conn = self._open_read_only()
+            self._conn = conn
+        return self._conn
+
+    def _open_read_only(self):
+        uri = f"file:{pathname2url(os.path.abspath(self.path))}?mode=ro"
+        return sqlite3.connect(uri, uri=True, check_same_thread=False)
+
+    def _migrate(self):
+        conn = sqlite3.connect(self.path)
+        try:
+            migrate(conn)
+        except ValueError as e:
+            raise MigrationRequired(
+                f"{self.path} cannot be migrated: {e}; "
+                f"run `python3 common/quotes_store.py {self.path} --drop-duplicates` to keep the oldest row of each"
+            ) from e
+        finally:
+            conn.close()
+
+    def posters(self):
+        """Every distinct poster, as stored."""
+        return [r[0] for r in self.conn.execute("SELECT DISTINCT poster FROM quotes ORDER BY poster")]
+
+    def version(self):
+        # Newest row id; ids are AUTOINCREMENT, so this moves whenever a quote lands.
+        return str(self.conn.execute("SELECT max(id) FROM quotes").fetchone()[0])
+
+    def added_since(self, version, columns=ROW_COLUMNS):
+        """Rows inserted after version() returned `version`; None if rows have since been removed from the end."""
+        newest = self.version()  # "None" while the table is empty
+        since = int(version) if (version or "").isdigit() else 0
+        if since > (int(newest) if newest.isdigit() else 0):
+            return None
+        return self.conn.execute(f"SELECT {columns} FROM quotes WHERE id > ? ORDER BY id", (since,)).fetchall()
+
+    def by_poster(self, poster, columns=ROW_COLUMNS):
+        sql = f"SELECT {columns} FROM quotes WHERE poster_key = lower(trim(?)) ORDER BY id"
+        return self.conn.execute(sql, (poster,)).fetchall()
+
+    def by_post_ids(self, post_ids, columns=ROW_COLUMNS):
+        post_ids = list(post_ids)
+        if not post_ids:
+            return []
+        marks = ",".join("?" * len(post_ids))
+        return self.conn.execute(f"SELECT {columns} FROM quotes WHERE post_id IN ({marks})", post_ids).fetchall()
+
+    def by_ids(self, ids, columns=ROW_COLUMNS):
+        ids = list(ids)
+        if not ids:
+            return []
+        marks = ",".join("?" * len(ids))
+        return self.conn.execute(f"SELECT {columns} FROM quotes WHERE id IN ({marks})", ids).fetchall()
+
+    def search(self, text, limit=SEARCH_LIMIT, columns=ROW_COLUMNS):
+        """Rows whose content contains every word of text, best bm25 rank first."""
+        query = fts_query(text)
+        if not query:
+            return []
+        return self.conn.execute(f"""
+            SELECT {columns} FROM quotes
+            JOIN (SELECT rowid, rank FROM quotes_fts WHERE quotes_fts MATCH ? ORDER BY rank LIMIT ?) AS hit
+              ON quotes.id = hit.rowid
+            ORDER BY hit.rank
+        """, (query, limit)).fetchall()
+
+
+def main():
+    args = [a for a in sys.argv[1:] if a != "--drop-duplicates"]
+    if len(args) != 1 or not os.path.exists(args[0]):
+        print("Usage: quotes_store.py <quotes.db> [--drop-duplicates]")
+        sys.exit(1)
+    conn = sqlite3.connect(args[0])
+    try:
+        summary = migrate(conn, drop_duplicates="--drop-duplicates" in sys.argv)
+    except ValueError as e:
+        print(json.dumps({"error": str(e), "hint": "rerun with --drop-duplicates to keep the oldest row of each"}))
+        sys.exit(1)
+    summary["rows"] = conn.execute("SELECT count(*) FROM quotes").fetchone()[0]
+    summary["journalMode"] = conn.execute("PRAGMA journal_mode").fetchone()[0]
+    print(json.dumps(summary))
+
+
+if __name__ == "__main__":
+    main()
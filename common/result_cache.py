@@ -0,0 +1,101 @@
+"""
+Verification result cache.
+
+Results are keyed by the identified poster and the normalised quote text, and
+tagged with the data version (chain tip or newest quotes.db row) they were
+computed against. An entry whose version no longer matches is treated as a
+miss, so new blocks or records invalidate it automatically. The encoder
+(VERIFY_ENCODER) and embedding tier (VERIFY_TIER) are part of the version
+too: a result scored by one encoder or tier is not served under another.
+
+The in-process tier is a bounded LRU with a TTL. An optional SQLite tier
+(VERIFY_CACHE_DB) lets results survive restarts and be shared between
+processes, e.g. the fallback `python3 verify_quote.py` runs.
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import time
+from collections import OrderedDict
+
+from .compressed import TIER
+from .encoder import configured as configured_encoder
+from .lexical_filter import normalize
+
+DEFAULT_MAX_ENTRIES = 4096
+DEFAULT_TTL = 3600  # seconds
+
+
+def cache_key(poster, quoted_text):
+    raw = f"{(poster or '').lower()}\0{normalize(quoted_text)}"
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, ttl=DEFAULT_TTL, db_path=None, settings=""):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.settings = settings  # appended to every version
+        self._entries = OrderedDict()  # key -> (version, expires, result)
+        self._db = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("""
+                CREATE TABLE IF NOT EXISTS results (
+                    key     TEXT PRIMARY KEY,
+                    version TEXT NOT NULL,
+                    expires REAL NOT NULL,
+                    result  TEXT NOT NULL
+                )
+            """)
+            self._db.commit()
+
+    def get(self, key, version):
+        """Return a copy of the cached result, or None on a miss or stale entry."""
+        version = f"{version}|{self.settings}"
+        now = time.time()
+        entry = self._entries.get(key)
+        if entry is not None:
+            cached_version, expires, result = entry
+            if cached_version == version and expires > now:
+                self._entries.move_to_end(key)
+                return json.loads(result)
+            del self._entries[key]
+
+        if self._db is not None:
+            row = self._db.execute(
+                "SELECT expires, result FROM results WHERE key=? AND version=?",
+                (key, version),
+            ).fetchone()
+            if row and row[0] > now:
+                self._remember(key, version, row[0], row[1])
+                return json.loads(row[1])
+        return None
+
+    def put(self, key, version, result):
+        version = f"{version}|{self.settings}"
+        expires = time.time() + self.ttl
+        serialized = json.dumps(result)
+        self._remember(key, version, expires, serialized)
+        if self._db is not None:
+            self._db.execute(
+                "INSERT OR REPLACE INTO results (key, version, expires, result) VALUES (?, ?, ?, ?)",
+                (key, version, expires, serialized),
+            )
+            self._db.commit()
+
+    def _remember(self, key, version, expires, serialized):
+        self._entries[key] = (version, expires, serialized)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+
+def from_env():
+    return ResultCache(
+        max_entries=int(os.getenv("VERIFY_CACHE_SIZE", DEFAULT_MAX_ENTRIES)),
+        ttl=float(os.getenv("VERIFY_CACHE_TTL", DEFAULT_TTL)),
+        db_path=os.getenv("VERIFY_CACHE_DB") or None,
+        settings=f"{configured_encoder()}|{TIER}",
+    )
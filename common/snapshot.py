@@ -0,0 +1,124 @@
+"""
+Warm-state snapshot for verify_quote.
+
+One file holding what a verifier process would otherwise rebuild or gather
+from many files when it starts: every poster's candidate embedding matrix
+with its row keys, the alias table, the poster index and the settings
+(model, encoder, embedding tier, thresholds) it was built with.
+
+    8-byte magic | u64 header length | header JSON | blobs | float32 rows
+
+Sections start on 64-byte boundaries. The header is small: the settings, the
+row range of each poster in the matrix and the byte range of each blob (a
+poster's keys, the poster index, ...). Opening a snapshot reads the header
+and memory-maps the rest; a poster's keys are parsed and its rows paged in
+the first time it is scored.
+
+    python3 verify_quote.py --build-snapshot
+"""
+import json
+import mmap
+import os
+import struct
+
+import numpy as np
+
+MAGIC = b"VSNAP001"
+PREFIX = struct.Struct("<8sQ")  # magic, header length
+ALIGN = 64
+
+
+def _align(n):
+    return -(-n // ALIGN) * ALIGN
+
+
+def write(path, posters, state, blobs=None):
+    """
+    posters: {stem: (keys, matrix)} as EmbeddingStore keeps them.
+    state:   small JSON-serialisable settings, read on every open.
+    blobs:   {name: JSON-serialisable value}, parsed only when asked for.
+    """
+    dims = {m.shape[1] for _, m in posters.values() if m is not None and len(m)}
+    if len(dims) > 1:
+        raise ValueError(f"poster matrices disagree on dimension: {sorted(dims)}")
+    dim = dims.pop() if dims else 0
+
+    payloads, blob_ranges, offset = [], {}, 0
+    named = [(f"keys/{stem}", [list(k) for k in keys]) for stem, (keys, _) in posters.items()]
+    for name, value in named + sorted((blobs or {}).items()):
+        data = json.dumps(value, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+        payloads.append(data)
+        blob_ranges[name] = [offset, len(data)]
+        offset += len(data)
+    rows, row_ranges = 0, {}
+    for stem, (keys, matrix) in posters.items():
+        row_ranges[stem] = [rows, len(keys)]
+        rows += len(keys)
+
+    header = json.dumps({
+        "state": state,
+        "dim": dim,
+        "rows": rows,
+        "blobsLength": offset,
+        "posters": row_ranges,
+        "blobs": blob_ranges,
+    }, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+    tmp = path + ".tmp"
+    with open(tmp, "wb") as f:
+        f.write(PREFIX.pack(MAGIC, len(header)) + header)
+        f.write(b"\0" * (_align(f.tell()) - f.tell()))
+        for data in payloads:
+            f.write(data)
+        f.write(b"\0" * (_align(f.tell()) - f.tell()))
+        for keys, matrix in posters.values():
+            if len(keys):
+                f.write(np.ascontiguousarray(matrix, dtype=np.float32).tobytes())
+    os.replace(tmp, path)
+    return {"posters": len(posters), "rows": rows, "bytes": os.path.getsize(path)}
+
+
+class Snapshot:
+    def __init__(self, path, header, data, blobs_start, matrix):
+        self.path = path
+        self.mtime = os.path.getmtime(path)
+        self.state = header["state"]
+        self._header = header
+        self._data = data
+        self._blobs_start = blobs_start
+        self._matrix = matrix
+
+    @classmethod
+    def open(cls, path):
+        """The snapshot at path, or None if there is none or it is unreadable."""
+        try:
+            with open(path, "rb") as f:
+                magic, length = PREFIX.unpack(f.read(PREFIX.size))
+                if magic != MAGIC:
+                    return None
+                header = json.loads(f.read(length))
+                data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError, struct.error):
+            return None
+        blobs_start = _align(PREFIX.size + length)
+        matrix_start = _align(blobs_start + header["blobsLength"])
+        rows, dim = header["rows"], header["dim"]
+        if matrix_start + rows * dim * 4 > len(data):
+            return None
+        matrix = np.frombuffer(data, dtype=np.float32, count=rows * dim, offset=matrix_start).reshape(rows, dim)
+        return cls(path, header, data, blobs_start, matrix)
+
+    def blob(self, name, default=None):
+        found = self._header["blobs"].get(name)
+        if found is None:
+            return default
+        start = self._blobs_start + found[0]
+        return json.loads(self._data[start:start + found[1]])
+
+    def poster(self, stem):
+        """(keys, matrix) for one poster, the matrix a view into the mapped file; None if absent."""
+        found = self._header["posters"].get(stem)
+        if found is None:
+            return None
+        start, count = found
+        return [tuple(k) for k in self.blob(f"keys/{stem}", [])], self._matrix[start:start + count]
@@ -0,0 +1,103 @@
+"""
+The steps of verify_quote every backend runs the same way.
+
+Each takes the backend's verify_quote module (`verifier`), as
+verify_server.py does, and uses what it defines: its stores and encoder, and
+how it turns candidates into matches (poster_candidates, apply_exact,
+apply_scores, attribute_from_index and, where quotes.db can be searched,
+attribute_exact).
+"""
+import sys
+
+import numpy as np
+
+from . import metrics
+from .embedding_store import score_with_chunks
+from .lexical_filter import exact_matches
+from .snapshot import Snapshot
+
+
+def prepare(verifier):
+    """
+    Start from the warm-state snapshot, once per process, if a matching one
+    exists. Returns the snapshot adopted, or None, so the backend can restore
+    what only it keeps there.
+    """
+    if verifier.prepared:
+        return None
+    verifier.prepared = True
+    snapshot = Snapshot.open(verifier.SNAPSHOT_PATH)
+    if snapshot is None:
+        return None
+    if snapshot.state.get("settings") != verifier.settings():
+        print(f"Ignoring {verifier.SNAPSHOT_PATH}: built with other settings, rerun --build-snapshot", file=sys.stderr)
+        return None
+    verifier.alias_matcher.restore(snapshot.blob("aliases"))
+    verifier.embedding_store.attach(snapshot)
+    verifier.chunk_store.attach(snapshot)
+    return snapshot
+
+
+def score_quotes(verifier, quotes):
+    """Fill in the results for (result, quoted text, poster) entries."""
+    by_poster = {}
+    for i, (_, _, poster) in enumerate(quotes):
+        by_poster.setdefault(poster, []).append(i)
+
+    # Verbatim quotes are settled lexically; only the rest need the model.
+    attribute_exact = getattr(verifier, "attribute_exact", None)
+    poster_posts, to_encode = {}, []
+    for poster, rows in by_poster.items():
+        if poster is None:
+            if attribute_exact is None:
+                to_encode.extend(rows)
+                continue
+            with metrics.stage("search"):
+                to_encode.extend(i for i in rows if not attribute_exact(quotes[i][0], quotes[i][1]))
+            continue
+        with metrics.stage("candidates"):
+            candidates = verifier.poster_candidates(poster)
+        if not candidates:
+            for i in rows:
+                quotes[i][0]["error"] = verifier.NO_CANDIDATES.format(poster=poster)
+            continue
+        poster_posts[poster] = candidates
+        for i in rows:
+            metrics.note(quotes[i][0], candidates=len(candidates))
+            with metrics.stage("exact"):
+                hits = exact_matches(quotes[i][1], candidates)
+            if hits:
+                verifier.apply_exact(quotes[i][0], candidates, hits)
+            else:
+                to_encode.append(i)
+    if not to_encode:
+        return
+
+    with metrics.stage("encode"):
+        quote_embs = dict(zip(to_encode, verifier.encode([quotes[i][1] for i in to_encode])))
+    for poster, rows in by_poster.items():
+        rows = [i for i in rows if i in quote_embs]
+        if not rows:
+            continue
+        if poster is None:
+            with metrics.stage("index"):
+                for i in rows:
+                    verifier.attribute_from_index(quotes[i][0], quotes[i][1], quote_embs[i])
+            continue
+        candidates = poster_posts[poster]
+        # Stored rows are L2-normalised, so the dot product is the cosine similarity.
+        with metrics.stage("embeddings"):
+            cand_emb = verifier.embedding_store.matrix_for(poster, candidates)
+            chunk_emb, chunk_offsets, chunk_spans = verifier.chunk_store.matrix_for(poster, candidates)
+            # None in the fp32 tier; otherwise rows are ranked by these codes first.
+            cand_codes = verifier.embedding_store.codes_for(poster, cand_emb)
+            chunk_codes = verifier.chunk_store.codes_for(poster, chunk_emb)
+        with metrics.stage("score"):
+            # Each post scores as the best of its own row and its sentence/window rows.
+            sims, sources = score_with_chunks(
+                cand_emb, chunk_emb, chunk_offsets, np.stack([quote_embs[i] for i in rows], axis=1),
+                cand_codes, chunk_codes,
+            )
+            for col, i in enumerate(rows):
+                verifier.apply_scores(quotes[i][0], candidates, sims[:, col].tolist(),
+                                      sources[:, col].tolist(), chunk_spans)
@@ -0,0 +1,111 @@
+"""
+Warm verification service, shared by the backends' verify_server.py.
+
+Keeps a backend's verify_quote module (its model, and its blockchain or
+quotes.db) in memory and answers JSON requests over local HTTP, so server.js
+can forward /verify and /verifyHighlighted here instead of spawning a new
+interpreter for every request. Each backend only supplies its module and
+default port:
+
+    python3 verify_server.py [--host 127.0.0.1] [--port PORT] [--metrics]
+
+POST /verify takes the same JSON object verify_quote.py takes on the command
+line and returns the same result object. POST /verifyBatch takes
+{"items": [...]} and returns {"results": [...]} in the same order, encoding
+every quote in one batch. GET /health reports liveness.
+
+With --metrics (or VERIFY_TIMINGS=1) each result carries a per-stage
+`timings` breakdown and GET /metrics serves the aggregated histograms in the
+Prometheus text format (see metrics.py).
+"""
+import argparse
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from . import metrics
+
+DEFAULT_HOST = os.getenv("VERIFIER_HOST", "127.0.0.1")
+
+# The model is shared by every request thread; run one verification at a time.
+verify_lock = threading.Lock()
+
+
+class VerifierHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    verifier = None  # the backend's verify_quote module, set by main()
+
+    def send_json(self, status, payload):
+        self.send_text(status, json.dumps(payload), "application/json")
+
+    def send_text(self, status, text, content_type):
+        body = text.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def do_GET(self):
+        if self.path == "/health":
+            self.send_json(200, {"status": "ok"})
+        elif self.path == "/metrics" and metrics.ENABLED:
+            self.send_text(200, metrics.render(), "text/plain; version=0.0.4; charset=utf-8")
+        else:
+            self.send_json(404, {"error": f"Unknown endpoint {self.path}"})
+
+    def do_POST(self):
+        if self.path not in ("/verify", "/verifyBatch"):
+            self.send_json(404, {"error": f"Unknown endpoint {self.path}"})
+            return
+        try:
+            input_data = self.read_json()
+            if not isinstance(input_data, dict):
+                raise ValueError("Expected a JSON object")
+            if self.path == "/verifyBatch" and not isinstance(input_data.get("items"), list):
+                raise ValueError('Expected {"items": [...]}')
+        except Exception as e:
+            self.send_json(400, {"error": "Invalid input JSON", "exception": str(e)})
+            return
+        try:
+            with verify_lock:
+                if self.path == "/verifyBatch":
+                    result = {"results": self.verifier.verify_quotes(input_data["items"])}
+                else:
+                    result = self.verifier.verify_quote(input_data)
+        except Exception as e:
+            self.send_json(500, {"verified": False, "error": str(e)})
+            return
+        self.send_json(200, result)
+
+
+def main(verifier, default_port):
+    parser = argparse.ArgumentParser(description="Serve verify_quote over local HTTP.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=int(os.getenv("VERIFIER_PORT") or default_port))
+    parser.add_argument("--metrics", action="store_true", help="record stage timings and serve GET /metrics")
+    args = parser.parse_args()
+    if args.metrics:
+        metrics.ENABLED = True
+
+    # A long-lived service pays the start-up costs verify_quote defers, before the first request.
+    verifier.prepare()
+    verifier.embedding_store.preload()
+    verifier.chunk_store.preload()
+    verifier.load_model()
+    # Building the corpus-wide index embeds every post; do it here, not under verify_lock.
+    verifier.post_index.get()
+    VerifierHandler.verifier = verifier
+    server = ThreadingHTTPServer((args.host, args.port), VerifierHandler)
+    print(f"Verifier listening on http://{args.host}:{args.port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
@@ -0,0 +1,25 @@
+#!/usr/bin/env python3
+"""
+Checkpointed validation of this backend's chain.json (or its binary log); the
+streaming and the checkpoint are in common/chain_validator.py.
+
+    python3 chain_validator.py [chain.json] [--full]
+"""
+import os
+import sys
+
+# The modules every backend shares live in ../common.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import chain_validator
+from common.chain_validator import data_block_error
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CHAIN_PATH = os.path.join(BASE_DIR, "chain.json")
+
+
+def validate(path=CHAIN_PATH, full=False):
+    return chain_validator.validate(path, data_block_error, full)
+
+
+if __name__ == "__main__":
+    chain_validator.main(CHAIN_PATH, data_block_error)
@@ -2,10 +2,17 @@ const fs = require("fs");
 const sqlite3 = require("sqlite3").verbose();
 const crypto = require("crypto");
 const { Blockchain } = require("./blockchain");
+const { migrateQuotesDb } = require("../common/quotes_db");
 
 async function main() {
   const rawChain = JSON.parse(fs.readFileSync("./rawChain.json", "utf8"));
 
+  // The UNIQUE (platform, post_id) index from common/quotes_store.py is what lets
+  // duplicate inserts be ignored instead of checked for row by row. Migrating
+  // is a no-op on a database that already has it, and exits non-zero (which
+  // throws here) when duplicates have to be resolved by hand first.
+  migrateQuotesDb("./quotes.db");
+
   const db = new sqlite3.Database("./quotes.db", sqlite3.OPEN_READWRITE);
   const chain = new Blockchain(2, "./chain.json");
 
@@ -14,11 +21,12 @@ async function main() {
       db.get(sql, params, (err, row) => (err ? reject(err) : resolve(row)))
     );
 
+  // Resolves to the new row id, or null when the insert was ignored.
   const runInsert = (sql, params) =>
     new Promise((resolve, reject) =>
       db.run(sql, params, function (err) {
         if (err) return reject(err);
-        resolve(this.lastID);
+        resolve(this.changes ? this.lastID : null);
       })
     );
 
@@ -36,23 +44,22 @@ async function main() {
       tweet_url: tweetUrl,
     };
 
-    let row = await getRow("SELECT id FROM quotes WHERE post_id = ?", [
-      post_id,
-    ]);
-
-    let recordId;
-    if (row) {
+    let recordId = await runInsert(
+      `INSERT OR IGNORE INTO quotes
+        (platform, poster, post_id, content, post_time, tweet_url)
+       VALUES (?, ?, ?, ?, ?, ?)`,
+      [platform, poster, post_id, content, post_time, tweetUrl]
+    );
+    if (recordId === null) {
+      const row = await getRow(
+        "SELECT id FROM quotes WHERE platform = ? AND post_id = ?",
+        [platform, post_id]
+      );
       console.log(
         `↪️  Skipping insert; post_id=${post_id} already at id=${row.id}`
       );
       recordId = row.id;
     } else {
-      recordId = await runInsert(
-        `INSERT INTO quotes 
-          (platform, poster, post_id, content, post_time, tweet_url)
-         VALUES (?, ?, ?, ?, ?, ?)`,
-        [platform, poster, post_id, content, post_time, tweetUrl]
-      );
       console.log(`➕ Inserted post_id=${post_id} as id=${recordId}`);
     }
 
@@ -2,6 +2,7 @@ const express = require("express");
 const sqlite3 = require("sqlite3").verbose();
 const cors = require("cors");
 const { Blockchain } = require("./blockchain");
+const { SCHEMA_VERSION, migrateQuotesDb, quoteFilters } = require("../common/quotes_db");
 
 const { exec } = require("child_process");
 
@@ -11,23 +12,29 @@ const PORT = 4001;
 app.use(cors()); 
 app.use(express.json());
 
+// A no-op once done. A database that cannot be migrated (duplicate posts) is
+// still served, by table scans.
+try {
+  migrateQuotesDb("./quotes.db");
+} catch (err) {
+  console.warn(`quotes.db not migrated, searches use table scans: ${err.message}`);
+}
+
 const db = new sqlite3.Database("./quotes.db", sqlite3.OPEN_READWRITE);
 const chain = new Blockchain(2, "./chain.json");
 
+let indexed = false;
+db.get("PRAGMA user_version", (err, row) => {
+  indexed = !err && row.user_version >= SCHEMA_VERSION;
+});
+
 app.get("/quotes", (req, res) => {
   let sql = `
     SELECT id, platform, poster, post_id, content, post_time, tweet_url
       FROM quotes
   `;
-  const params = [];
-  if (req.query.search) {
-    sql += " WHERE content LIKE ?";
-    params.push(`%${req.query.search}%`);
-  }
-  if (req.query.author) {
-    sql += params.length ? " AND poster=?" : " WHERE poster=?";
-    params.push(req.query.author);
-  }
+  const { where, params } = quoteFilters(req.query, indexed);
+  if (where.length) sql += ` WHERE ${where.join(" AND ")}`;
 
   db.all(sql, params, (err, rows) => {
     if (err) return res.status(500).json({ error: err.message });
@@ -75,60 +82,126 @@ app.get("/chain", (req, res) => {
   res.json(chain.chain);
 });
 
-app.post("/verify", (req, res) => {
-  console.log("→ /verify (hashed) called:", req.body);
-  const { tweetId, content } = req.body;
+// verify_server.py keeps the model warm; verify_quote.py is only spawned
+// directly when that service is not running.
+const VERIFIER_URL = process.env.VERIFIER_URL || "http://127.0.0.1:4101";
 
-  const input = { tweetId, content };
+function spawnVerifier(input, callback) {
   const inputStr = JSON.stringify(input);
 
   exec(
     `python3 verify_quote.py '${inputStr.replace(/'/g, "\\'")}'`,
     (error, stdout, stderr) => {
-      if (error) {
-        console.error("Python error:", error);
-        return res.status(500).json({ verified: false, error: error.message });
-      }
+      if (error) return callback(error);
       if (stderr) console.warn("Python stderr:", stderr);
 
+      let result;
       try {
-        const result = JSON.parse(stdout);
-        console.log("→ Python result:", result);
-        res.json(result);
+        result = JSON.parse(stdout);
       } catch (e) {
         console.error("Invalid JSON from Python:", stdout);
-        res
-          .status(500)
-          .json({ verified: false, error: "Bad JSON from verifier" });
+        return callback(new Error("Bad JSON from verifier"));
       }
+      callback(null, result);
     }
   );
+}
+
+// Batches go through stdin so a page of tweets never hits argv length limits.
+function spawnBatchVerifier(items, callback) {
+  const child = exec("python3 verify_quote.py -", (error, stdout, stderr) => {
+    if (error) return callback(error);
+    if (stderr) console.warn("Python stderr:", stderr);
+
+    let results;
+    try {
+      results = JSON.parse(stdout);
+    } catch (e) {
+      console.error("Bad JSON from python:", stdout);
+      return callback(new Error("Bad JSON from verifier"));
+    }
+    callback(null, { results });
+  });
+  child.stdin.end(JSON.stringify(items));
+}
+
+function postToVerifier(route, body, callback, fallback) {
+  fetch(`${VERIFIER_URL}${route}`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body),
+  }).then(
+    (response) =>
+      response.json().then(
+        (result) =>
+          response.ok
+            ? callback(null, result)
+            : callback(new Error(result.error || response.statusText)),
+        () => callback(new Error("Bad JSON from verifier"))
+      ),
+    (err) => {
+      console.warn(`Verifier service unreachable (${err.message}), spawning Python`);
+      fallback();
+    }
+  );
+}
+
+function runVerifier(input, callback) {
+  postToVerifier("/verify", input, callback, () => spawnVerifier(input, callback));
+}
+
+function runBatchVerifier(items, callback) {
+  postToVerifier("/verifyBatch", { items }, callback, () =>
+    spawnBatchVerifier(items, callback)
+  );
+}
+
+app.post("/verify", (req, res) => {
+  console.log("→ /verify (hashed) called:", req.body);
+  const { tweetId, content } = req.body;
+
+  runVerifier({ tweetId, content }, (error, result) => {
+    if (error) {
+      console.error("Python error:", error);
+      return res.status(500).json({ verified: false, error: error.message });
+    }
+    console.log("→ Python result:", result);
+    res.json(result);
+  });
 });
 
 app.post("/verifyHighlighted", (req, res) => {
   console.log("→ /verifyHighlighted called:", req.body);
   const input = { highlightedText: req.body.highlightedText };
-  const inputStr = JSON.stringify(input);
 
-  exec(
-    `python3 verify_quote.py '${inputStr.replace(/'/g, "\\'")}'`,
-    (error, stdout, stderr) => {
-      if (error) {
-        console.error("Python error:", error);
-        return res.status(500).json({ verified: false, error: error.message });
-      }
-      if (stderr) console.warn("Python stderr:", stderr);
+  runVerifier(input, (error, result) => {
+    if (error) {
+      console.error("Python error:", error);
+      return res.status(500).json({ verified: false, error: error.message });
+    }
+    res.json(result);
+  });
+});
 
-      try {
-        const result = JSON.parse(stdout);
-        res.json(result);
-      } catch {
-        res
-          .status(500)
-          .json({ verified: false, error: "Bad JSON from verifier" });
-      }
+// { items: [{ tweetId, content }] } -> { results: [...] }, in the same order,
+// so a page of tweets costs one round trip and one batched inference.
+app.post("/verifyBatch", (req, res) => {
+  if (!Array.isArray(req.body.items)) {
+    return res.status(400).json({ error: "Expected { items: [...] }" });
+  }
+  const items = req.body.items.map(({ tweetId, content }) => ({
+    tweetId,
+    content,
+  }));
+  console.log(`→ /verifyBatch called (${items.length} items)`);
+
+  runBatchVerifier(items, (error, result) => {
+    if (error) {
+      console.error("Python error:", error);
+      return res.status(500).json({ error: error.message });
     }
-  );
+    return res.json(result);
+  });
 });
 
 app.listen(PORT, () => {
@@ -2,18 +2,93 @@ import sys
 import json
 import os
 import re
-import sqlite3
-from sentence_transformers import SentenceTransformer, util
 
+# The modules every backend shares live in ../common.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.alias_matcher import AliasMatcher
+from common.compressed import TIER
+from common.embedding_store import CHUNKING, ChunkStore, EmbeddingStore
+from common.encoder import configured as configured_encoder, load_encoder, parity
+from common.lexical_filter import exact_matches
+from common import metrics, verification
+from common.post_index import PostIndex, QuotesCorpus
+from common.quotes_store import MigrationRequired, QuotesDB
+from common.result_cache import cache_key, from_env as result_cache_from_env
+from common.snapshot import write as write_snapshot
+
+# Data files sit next to this script unless VERIFY_DATA_DIR points elsewhere
+# (benchmark_verify.py runs the verifier against synthetic corpora that way).
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-DB_PATH = os.path.join(BASE_DIR, "quotes.db")
-TRACKED_PATH = os.path.join(BASE_DIR, "tracked_people.json")
+DATA_DIR = os.environ.get("VERIFY_DATA_DIR") or BASE_DIR
+DB_PATH = os.path.join(DATA_DIR, "quotes.db")
+TRACKED_PATH = os.path.join(DATA_DIR, "tracked_people.json")
+EMBEDDINGS_DIR = os.path.join(DATA_DIR, "embeddings")
+POST_INDEX_DIR = os.path.join(EMBEDDINGS_DIR, "index")
+CHUNKS_DIR     = os.path.join(EMBEDDINGS_DIR, "chunks")
+SNAPSHOT_PATH = os.path.join(DATA_DIR, "verifier.snapshot")
+
+SIM_THRESHOLD      = 0.70
+VERIFIED_THRESHOLD = 0.75
+INDEX_TOP_K        = 10  # matches returned when searching across every poster
+MODEL_NAME         = "all-MiniLM-L6-v2"
+NO_CANDIDATES      = "No original tweets found in DB for poster '{poster}'."
+
+alias_matcher = AliasMatcher(TRACKED_PATH, "twitter")
+
+quotes_db = QuotesDB(DB_PATH)
+model = None  # see load_model(); verbatim quotes are settled without it
 
-with open(TRACKED_PATH, "r", encoding="utf-8") as f:
-    tracked_people = json.load(f).get("twitter", {})
+def load_model():
+    # torch or onnx, per VERIFY_ENCODER (see encoder.py); built on first use,
+    # since loading either costs time that invalid and verbatim inputs never need.
+    global model
+    if model is None:
+        with metrics.stage("model"):
+            model = load_encoder(model_name=MODEL_NAME)
+    return model
+
+def encode(texts):
+    return load_model().encode(texts)
+
+embedding_store = EmbeddingStore(EMBEDDINGS_DIR, encode, tier=TIER)
+chunk_store = ChunkStore(CHUNKS_DIR, encode, TIER)
+post_index = PostIndex(POST_INDEX_DIR, embedding_store, QuotesCorpus(quotes_db), TIER)
+result_cache = result_cache_from_env()
+prepared = False
+this = sys.modules[__name__]  # for the shared steps in common/verification.py
+
+def settings():
+    # A snapshot is only adopted by a verifier with the same model, encoder, tier and thresholds.
+    return {
+        "model":             MODEL_NAME,
+        "simThreshold":      SIM_THRESHOLD,
+        "verifiedThreshold": VERIFIED_THRESHOLD,
+        "indexTopK":         INDEX_TOP_K,
+        "chunking":          CHUNKING,
+        "encoder":           configured_encoder(),
+        "tier":              TIER,
+    }
 
-conn  = sqlite3.connect(DB_PATH, check_same_thread=False)
-model = SentenceTransformer("all-MiniLM-L6-v2")
+def prepare():
+    """Start from the warm-state snapshot, once per process, if a matching one exists."""
+    quotes_db.conn  # migrates quotes.db first if its schema is behind
+    verification.prepare(this)
+
+def build_snapshot():
+    # Encodes whatever the per-poster files are missing, then packs them into one file.
+    posters = {}
+    for poster in quotes_db.posters():
+        stem = EmbeddingStore.stem(poster)
+        if stem not in posters:
+            candidates = poster_candidates(poster)
+            embedding_store.matrix_for(poster, candidates)
+            chunk_store.matrix_for(poster, candidates)
+            posters[stem] = embedding_store.entry(poster)
+            posters[ChunkStore.SNAPSHOT_PREFIX + stem] = chunk_store.entry(poster)
+    summary = write_snapshot(SNAPSHOT_PATH, posters, {"settings": settings()}, {"aliases": alias_matcher.state()})
+    # The corpus-wide index comes from the same embeddings; build it now rather than on a request.
+    summary["indexedPosts"] = len(post_index.retrain(post_index.get(retrain=False)))
+    return summary
 
 def clean_text(text: str) -> str:
     text = text.replace("✅ Verified", "")
@@ -21,23 +96,62 @@ def clean_text(text: str) -> str:
     cleaned = "\n".join(line for line in lines if not re.fullmatch(r"\s*\d+\s*", line))
     return cleaned.strip()
 
+def data_version():
+    return quotes_db.version()
+
+def search_all_posters(quote_emb):
+    matches = []
+    for post, score in post_index.search(quote_emb, INDEX_TOP_K):
+        if score >= SIM_THRESHOLD:
+            matches.append({
+                "tweetId":    post["post_id"],
+                "similarity": score,
+                "tweetUrl":   post["tweetUrl"],
+                "content":    post["content"],
+                "poster":     post["poster"]
+            })
+    return matches
+
 def extract_quote_info(content: str):
     content_clean = clean_text(content)
-    for canonical, aliases in tracked_people.items():
-        for alias in aliases:
-            if alias.lower() in content_clean.lower():
-                pat = re.compile(re.escape(alias), re.IGNORECASE)
-                quoted = pat.sub("", content_clean, count=1).strip()
-                quoted = re.sub(
-                    r'^(?:said\s+(?:that\s+)?[:]?[\s]*)',
-                    "",
-                    quoted,
-                    flags=re.IGNORECASE
-                ).strip()
-                return {"quotedPoster": canonical, "quotedText": quoted}
-    return None
+    hit = alias_matcher.find(content_clean)
+    if not hit:
+        return None
+    canonical, start, end = hit
+    quoted = (content_clean[:start] + content_clean[end:]).strip()
+    quoted = re.sub(
+        r'^(?:said\s+(?:that\s+)?[:]?[\s]*)',
+        "",
+        quoted,
+        flags=re.IGNORECASE
+    ).strip()
+    return {"quotedPoster": canonical, "quotedText": quoted}
 
-def verify_quote(input_data):
+def poster_candidates(poster: str):
+    return [
+        {"post_id": r[0], "content": r[1], "tweetUrl": r[2]}
+        for r in quotes_db.by_poster(poster, "post_id, content, tweet_url")
+    ]
+
+def attribute_exact(result, quoted: str):
+    """Full-text search for a verbatim quote when no tracked poster was named."""
+    found = [
+        {"poster": r[0], "post_id": r[1], "content": r[2], "tweetUrl": r[3]}
+        for r in quotes_db.search(quoted, columns="poster, post_id, content, tweet_url")
+    ]
+    hits = exact_matches(quoted, found)
+    if not hits:
+        return False
+    result["extractedQuoteInfo"] = {"quotedPoster": found[hits[0]]["poster"], "quotedText": quoted}
+    result["identifiedPoster"] = found[hits[0]]["poster"]
+    result["attributedBy"] = "search"
+    apply_exact(result, found, hits)
+    for match, idx in zip(result["matches"], hits):
+        match["poster"] = found[idx]["poster"]
+    return True
+
+def start_result(input_data):
+    """Build the empty result for one request and pick out the quote to encode."""
     content = input_data.get("content") or input_data.get("highlightedText", "")
     tweet_id = input_data.get("tweetId")
     result = {
@@ -48,60 +162,150 @@ def verify_quote(input_data):
 
     quote_info = extract_quote_info(content)
     if not quote_info:
-        result["error"] = "No tracked quote found in content."
-        return result
+        # No tracked alias in the text: look for the quote across every poster instead.
+        quoted = clean_text(content)
+        if not quoted:
+            result["error"] = "No tracked quote found in content."
+            return result, None
+        return result, (quoted, None)
 
     result["extractedQuoteInfo"] = quote_info
     poster = quote_info["quotedPoster"]
     result["identifiedPoster"] = poster
+    return result, (quote_info["quotedText"], poster)
 
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT post_id, content, tweet_url FROM quotes WHERE lower(poster)=?",
-        (poster.lower(),)
-    )
-    rows = cur.fetchall()
-    if not rows:
-        result["error"] = f"No original tweets found in DB for poster '{poster}'."
-        return result
-
-    candidates = [
-        {"post_id": r[0], "content": r[1], "tweetUrl": r[2]} for r in rows
-    ]
-
-    texts = [c["content"] for c in candidates]
-    embs  = model.encode(texts, convert_to_tensor=True)
-    q_emb = model.encode(quote_info["quotedText"], convert_to_tensor=True)
+def attribute_from_index(result, quoted: str, quote_emb):
+    matches = search_all_posters(quote_emb)
+    if not matches:
+        result["error"] = "No tracked quote found in content."
+        return
+    result["extractedQuoteInfo"] = {"quotedPoster": matches[0]["poster"], "quotedText": quoted}
+    result["identifiedPoster"] = matches[0]["poster"]
+    result["attributedBy"] = "index"
+    result["matches"] = matches
+    result["verified"] = matches[0]["similarity"] >= VERIFIED_THRESHOLD
 
-    scores = util.cos_sim(embs, q_emb).squeeze(1).cpu().tolist()
+def apply_exact(result, candidates, hits):
+    result["matches"] = [
+        {
+            "tweetId":    candidates[idx]["post_id"],
+            "similarity": 1.0,
+            "tweetUrl":   candidates[idx]["tweetUrl"],
+            "content":    candidates[idx]["content"]
+        }
+        for idx in hits
+    ]
+    result["matchedBy"] = "exact"
+    result["verified"] = True
 
-    THRESH = 0.70
+def apply_scores(result, candidates, scores, sources=None, spans=()):
+    """sources[i] >= 0 means candidate i's score came from chunk spans[sources[i]]."""
     for idx, sim in enumerate(scores):
-        if sim >= THRESH:
+        if sim >= SIM_THRESHOLD:
             result["matches"].append({
                 "tweetId":    candidates[idx]["post_id"],
                 "similarity": sim,
                 "tweetUrl":   candidates[idx]["tweetUrl"],
                 "content":    candidates[idx]["content"]
             })
+            if sources and sources[idx] >= 0:
+                start, end = spans[sources[idx]]
+                result["matches"][-1]["matchedSpan"] = {"start": start, "end": end, "text": candidates[idx]["content"][start:end]}
 
-    if result["matches"] and result["matches"][0]["similarity"] >= 0.75:
+    if result["matches"] and result["matches"][0]["similarity"] >= VERIFIED_THRESHOLD:
         result["verified"] = True
 
-    return result
+def verify_quotes(items):
+    """
+    Verify a list of {tweetId, content} inputs in one go. Verbatim quotes are
+    matched lexically; the rest are encoded in a single batched call and each
+    identified poster's candidates are scored against all of its quotes at
+    once. Results keep input order.
+    """
+    metrics.begin()
+    with metrics.stage("prepare"):
+        prepare()
+    with metrics.stage("version"):
+        version = data_version()
+    results, quotes, keys = [], [], []
+    for input_data in items:
+        with metrics.stage("extract"):
+            result, quote = start_result(input_data)
+        results.append(result)
+        if not quote:
+            continue
+        key = cache_key(quote[1], quote[0])
+        with metrics.stage("cache"):
+            cached = result_cache.get(key, version)
+        metrics.note(result, cache="miss" if cached is None else "hit")
+        if cached is not None:
+            result.update(cached)
+        else:
+            quotes.append((result,) + quote)
+            keys.append(key)
+
+    if quotes:
+        verification.score_quotes(this, quotes)
+    with metrics.stage("cache"):
+        for (result, _, _), key in zip(quotes, keys):
+            result_cache.put(key, version, {k: v for k, v in result.items() if k != "tweetId"})
+    metrics.finish(results)
+    return results
+
+def verify_quote(input_data):
+    return verify_quotes([input_data])[0]
+
+def parity_pairs(items):
+    """(quoted text, candidate content) for every candidate the inputs would be scored against."""
+    pairs = []
+    for item in items:
+        _, quote = start_result({"content": item.get("content") or item.get("text") or ""})
+        if quote and quote[1]:
+            pairs.extend((quote[0], c.get("content") or "") for c in poster_candidates(quote[1]))
+    return pairs
+
 
 def main():
     if len(sys.argv) != 2:
         print(json.dumps({"error": "Expected one JSON argument"}))
         sys.exit(1)
+    # VERIFY_TIMINGS=1 adds a "timings" breakdown to the printed result.
+    metrics.startup()
+    try:
+        quotes_db.conn
+    except MigrationRequired as e:
+        print(json.dumps({"error": str(e)}))
+        sys.exit(1)
+    if sys.argv[1] == "--build-index":
+        # The offline path: catch up, then retrain the lists here and now.
+        print(json.dumps({"indexedPosts": len(post_index.retrain(post_index.get(retrain=False)))}))
+        return
+    if sys.argv[1] == "--build-snapshot":
+        print(json.dumps(build_snapshot()))
+        return
+    if sys.argv[1] == "--parity":
+        # Inputs on stdin; the reference defaults to torch, the candidate is the ONNX export.
+        report = parity(
+            parity_pairs(json.load(sys.stdin)),
+            load_encoder(os.getenv("VERIFY_PARITY_REFERENCE") or "torch", MODEL_NAME),
+            load_encoder("onnx", MODEL_NAME),
+            (SIM_THRESHOLD, VERIFIED_THRESHOLD),
+        )
+        print(json.dumps(report))
+        sys.exit(0 if report["passed"] else 1)
 
     try:
-        input_data = json.loads(sys.argv[1])
+        # "-" reads the input from stdin, which batch callers use to avoid argv limits.
+        raw = sys.stdin.read() if sys.argv[1] == "-" else sys.argv[1]
+        input_data = json.loads(raw)
     except Exception as e:
         print(json.dumps({"error": "Invalid input JSON", "exception": str(e)}))
         sys.exit(1)
 
-    out = verify_quote(input_data)
+    if isinstance(input_data, list):
+        out = verify_quotes(input_data)
+    else:
+        out = verify_quote(input_data)
     print(json.dumps(out))
 
 
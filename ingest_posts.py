@@ -0,0 +1,338 @@
+#!/usr/bin/env python3
+"""
+Bulk ingestion of collected posts into a backend's quotes.db and chain.
+
+Reads the post store query_posts.py appends to (post_store.py) and any older
+{handle}_{timestamp}.json dumps under posts/<platform>/, normalizes twitter, blue_sky, truth_social and facebook
+posts to quotes rows, drops (platform, post_id) pairs already in quotes.db or
+seen earlier in the run, inserts the rest in a single transaction and commits
+them to the chain:
+
+  hashed   one {recordId, commitment} block per row, recordId = quotes.id,
+           as seed.js does
+  merkle   records {recordId: post_id, commitment} go through the pending
+           buffer and are mined in blocks of --max-records, as migrate.js does;
+           the last partial group is mined too, so the run leaves no queue
+           behind and every post it inserted can be proven
+
+New blocks are appended to the chain's binary log (chain_log.py) with one
+fsync for the whole batch, rather than rewriting chain.json per record.
+server.js keeps the chain in memory, so stop it while ingesting.
+
+    python3 ingest_posts.py hashed|merkle [--posts posts] [--difficulty 2] [--max-records 16] [--export-json]
+"""
+import argparse
+import hashlib
+import html
+import json
+import os
+import re
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+from common.chain_log import ChainLog, log_path_for, log_to_json
+from common.quotes_store import migrate
+from post_store import POST_LISTS, PostStore, list_dumps
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+POSTS_DIR = os.path.join(BASE_DIR, "posts")
+BACKENDS = {
+    "hashed": os.path.join(BASE_DIR, "hash_on_blockchain"),
+    "merkle": os.path.join(BASE_DIR, "merkle_tree_blockchain"),
+}
+DIFFICULTY = 2
+MAX_RECORDS = 16
+QUOTE_COLUMNS = "platform, poster, post_id, content, post_time, tweet_url"
+
+
+def js_iso(dt):
+    """Date.prototype.toISOString() format."""
+    return dt.strftime("%Y-%m-%dT%H:%M:%S.") + f"{dt.microsecond // 1000:03d}Z"
+
+
+def strip_html(text):
+    text = re.sub(r"<br\s*/?>|</p>\s*<p>", "\n", text or "")
+    return html.unescape(re.sub(r"<[^>]+>", "", text)).strip()
+
+
+# -- per-platform normalization ---------------------------------------------
+# Each yields (poster, post_id, content, post_time, url); `fetched` is the
+# file's timestamp, used when a post carries no time of its own.
+
+def normalize_twitter(doc, handle, fetched):
+    for tweet in doc.get("data") or []:
+        if tweet.get("id") and tweet.get("text"):
+            yield (handle, tweet["id"], tweet["text"], tweet.get("created_at") or fetched,
+                   tweet.get("url") or f"https://twitter.com/{handle}/status/{tweet['id']}")
+
+
+def normalize_blue_sky(doc, handle, fetched):
+    for record in doc.get("records") or []:
+        value = record.get("value") or {}
+        if record.get("uri") and value.get("text"):
+            rkey = record["uri"].rsplit("/", 1)[-1]
+            yield (handle, rkey, value["text"], value.get("createdAt") or fetched,
+                   f"https://bsky.app/profile/{handle}/post/{rkey}")
+
+
+def normalize_truth_social(doc, handle, fetched):
+    for status in doc.get("posts") or []:
+        content = strip_html(status.get("content"))
+        if status.get("id") and content:
+            poster = (status.get("account") or {}).get("username") or handle
+            yield (poster, str(status["id"]), content, status.get("created_at") or fetched,
+                   status.get("url") or f"https://truthsocial.com/@{poster}/{status['id']}")
+
+
+def normalize_facebook(doc, handle, fetched):
+    for post in doc.get("data") or []:
+        if post.get("id") and post.get("message"):
+            yield (handle, post["id"], post["message"], post.get("created_time") or fetched,
+                   post.get("permalink_url") or f"https://www.facebook.com/{post['id']}")
+
+
+NORMALIZERS = {
+    "twitter": normalize_twitter,
+    "blue_sky": normalize_blue_sky,
+    "truth_social": normalize_truth_social,
+    "facebook": normalize_facebook,
+}
+
+
+def iter_posts(posts_dir=POSTS_DIR):
+    """Quotes rows from the old dumps (oldest first), then from the post store."""
+    for stamp, platform, handle, path in list_dumps(posts_dir):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                doc = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Skipping {path}: {e}", file=sys.stderr)
+            continue
+        if not isinstance(doc, dict):
+            continue
+        fetched = js_iso(datetime.strptime(stamp, "%Y%m%d-%H%M%S"))
+        for poster, post_id, content, post_time, url in NORMALIZERS[platform](doc, handle, fetched):
+            yield (platform, poster, str(post_id), content, post_time, url)
+
+    for platform, handle, post in PostStore(posts_dir).iter_posts():
+        doc = {POST_LISTS[platform]: [post]}
+        fetched = js_iso(datetime.strptime(post["fetched_at"], "%Y-%m-%dT%H:%M:%SZ"))
+        for poster, post_id, content, post_time, url in NORMALIZERS[platform](doc, handle, fetched):
+            yield (platform, poster, str(post_id), content, post_time, url)
+
+
+# -- quotes.db ---------------------------------------------------------------
+
+def insert_quotes(db_path, rows):
+    """
+    Insert the rows whose (platform, post_id) is new, in one transaction,
+    after migrating the database (a no-op once done) so the verifiers can
+    read it. Returns [(id, row)] for the inserted rows, in order.
+    """
+    conn = sqlite3.connect(db_path)
+    try:
+        migrate(conn)
+        seen = set(conn.execute("SELECT platform, post_id FROM quotes"))
+        fresh = []
+        for row in rows:
+            if (row[0], row[2]) not in seen:
+                seen.add((row[0], row[2]))
+                fresh.append(row)
+        with conn:
+            start = conn.execute("SELECT COALESCE(MAX(id), 0) FROM quotes").fetchone()[0]
+            conn.executemany(f"INSERT INTO quotes ({QUOTE_COLUMNS}) VALUES (?, ?, ?, ?, ?, ?)", fresh)
+            ids = [r[0] for r in conn.execute("SELECT id FROM quotes WHERE id > ? ORDER BY id", (start,))]
+        return list(zip(ids, fresh))
+    finally:
+        conn.close()
+
+
+def commitment(row):
+    # sha256 of JSON.stringify({platform, poster, post_id, content, post_time, tweet_url}).
+    fields = dict(zip(("platform", "poster", "post_id", "content", "post_time", "tweet_url"), row))
+    data = json.dumps(fields, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+# -- chain -------------------------------------------------------------------
+
+def mine(header, difficulty):
+    """Fill in header["nonce"] and header["hash"] the way Block.mineBlock() does."""
+    header["nonce"] = 0
+    text = json.dumps(header, separators=(",", ":"), ensure_ascii=False)
+    # nonce is the last key, so everything before its value is hashed once.
+    midstate = hashlib.sha256(text[:-len("0}")].encode("utf-8"))
+    target, nonce = "0" * difficulty, 0
+    while True:
+        h = midstate.copy()
+        h.update(b"%d}" % nonce)
+        digest = h.hexdigest()
+        if digest.startswith(target):
+            header["nonce"], header["hash"] = nonce, digest
+            return header
+        nonce += 1
+
+
+class ChainAppender:
+    """Appends blocks to a chain's log, converting a chain.json-only store first."""
+
+    def __init__(self, chain_path):
+        self.chain_path = chain_path
+        self.log_path = log_path_for(chain_path)
+        self.pending = []
+        if os.path.exists(self.log_path + ".idx"):
+            reader = ChainLog.open(self.log_path)
+            last = reader[-1] if len(reader) else None
+            reader.close()
+            self.log = ChainLog(self.log_path).open_for_append()
+            self.existing = None
+        else:
+            with open(chain_path, "r", encoding="utf-8") as f:
+                self.existing = json.load(f)
+            self.log = None
+            last = self.existing[-1] if self.existing else None
+        if last is None:
+            raise SystemExit(f"{chain_path} has no genesis block; start server.js once to create it.")
+        self.tip = last
+
+    def newest(self):
+        """Stored blocks after genesis, newest first."""
+        if self.existing is not None:
+            yield from reversed(self.existing[1:])
+            return
+        reader = ChainLog.open(self.log_path)
+        try:
+            for i in range(len(reader) - 1, 0, -1):
+                yield reader[i]
+        finally:
+            reader.close()
+
+    def add(self, block):
+        self.pending.append(block)
+        self.tip = block
+
+    def commit(self):
+        if self.log is None:
+            self.log = ChainLog.create(self.log_path, [self._stored(b) for b in self.existing] + self.pending)
+        else:
+            self.log.extend(self.pending)
+        self.log.close()
+        return len(self.pending)
+
+    @staticmethod
+    def _stored(block):
+        # Older chain.json files also carry the serialised merkleTree, which toJSON() now omits.
+        return {k: v for k, v in block.items() if k != "merkleTree"}
+
+
+def append_hashed(chain_path, inserted, difficulty):
+    chain = ChainAppender(chain_path)
+    commitments = [commitment(row) for _, row in inserted]
+    for (record_id, _), digest in zip(inserted, commitments):
+        prev = chain.tip
+        chain.add(mine({
+            "index": prev["index"] + 1,
+            "timestamp": int(time.time() * 1000),
+            "data": {"recordId": record_id, "commitment": digest},
+            "previousHash": prev["hash"],
+        }, difficulty))
+    return chain.commit(), 0
+
+
+def append_merkle(chain_path, inserted, difficulty, max_records):
+    from merkle import MerkleTree
+
+    chain_dir = os.path.dirname(chain_path)
+    pending_path = os.path.join(chain_dir, "pending.json")
+    pending_log = log_path_for(pending_path)
+    if os.path.exists(pending_log + ".idx"):
+        records = list(ChainLog.open(pending_log))
+    elif os.path.exists(pending_path):
+        with open(pending_path, "r", encoding="utf-8") as f:
+            records = json.load(f)
+    else:
+        records = []
+    chain = ChainAppender(chain_path)
+    records = _drop_mined(chain, records)
+    records += [{"recordId": str(row[2]), "commitment": commitment(row)} for _, row in inserted]
+
+    while records:
+        group, records = records[:max_records], records[max_records:]
+        tree = MerkleTree([r["commitment"] for r in group])
+        prev = chain.tip
+        header = mine({
+            "index": prev["index"] + 1,
+            "timestamp": int(time.time() * 1000),
+            "merkleRoot": tree.root,
+            "previousHash": prev["hash"],
+        }, difficulty)
+        chain.add({
+            "index": header["index"],
+            "timestamp": header["timestamp"],
+            "records": group,
+            "previousHash": header["previousHash"],
+            "nonce": header["nonce"],
+            "merkleRoot": header["merkleRoot"],
+            "hash": header["hash"],
+        })
+    mined = chain.commit()
+    # Dying before this line leaves the records queued; _drop_mined() skips them next run.
+    ChainLog.create(pending_log, records).close()
+    return mined, len(records)
+
+
+def _drop_mined(chain, records):
+    """
+    Queued records already in the newest blocks, left behind by a crash
+    between appending their block and rewriting the pending queue, are
+    dropped (as blockchain.js's _dropMined() does). Only as many blocks as
+    hold that many records are read.
+    """
+    mined, seen = set(), 0
+    for block in chain.newest():
+        if seen >= len(records):
+            break
+        mined.update((r["recordId"], r["commitment"]) for r in block.get("records", ()))
+        seen += len(block.get("records", ()))
+    return [r for r in records if (r["recordId"], r["commitment"]) not in mined]
+
+
+def ingest(backend, posts_dir=POSTS_DIR, difficulty=DIFFICULTY, max_records=MAX_RECORDS, export_json=False):
+    backend_dir = BACKENDS[backend]
+    # merkle.py comes from the backend being written to.
+    sys.path.insert(0, backend_dir)
+    chain_path = os.path.join(backend_dir, "chain.json")
+
+    started = time.perf_counter()
+    rows = list(iter_posts(posts_dir))
+    inserted = insert_quotes(os.path.join(backend_dir, "quotes.db"), rows)
+    if backend == "hashed":
+        mined, pending = append_hashed(chain_path, inserted, difficulty)
+    else:
+        mined, pending = append_merkle(chain_path, inserted, difficulty, max_records)
+    if export_json:
+        log_to_json(chain_path)
+    return {
+        "posts": len(rows),
+        "inserted": len(inserted),
+        "blocks": mined,
+        "pending": pending,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ingest collected posts into quotes.db and a chain.")
+    parser.add_argument("backend", choices=sorted(BACKENDS))
+    parser.add_argument("--posts", default=POSTS_DIR)
+    parser.add_argument("--difficulty", type=int, default=DIFFICULTY)
+    parser.add_argument("--max-records", type=int, default=MAX_RECORDS)
+    parser.add_argument("--export-json", action="store_true", help="also rewrite chain.json from the log")
+    args = parser.parse_args()
+    print(json.dumps(ingest(args.backend, args.posts, args.difficulty, args.max_records, args.export_json)))
+
+
+if __name__ == "__main__":
+    main()
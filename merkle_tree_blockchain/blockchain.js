@@ -1,6 +1,12 @@
 const crypto = require("crypto");
 const fs = require("fs");
 const path = require("path");
+const {
+  ChainLog,
+  logPathFor,
+  firstUncheckedBlock,
+  writeCheckpoint,
+} = require("../common/chainlog");
 
 class MerkleTree {
   constructor(leaves) {
@@ -64,31 +70,72 @@ class Block {
     this.hash = this.computeHash();
   }
 
-  computeHash() {
+  // The tree is derived from the records, so it is left out of the stored block.
+  toJSON() {
+    const { merkleTree, ...stored } = this;
+    return stored;
+  }
+
+  // Restore a saved block as-is; the stored hash and root are trusted here
+  // and checked by isChainValid(). Its tree is only built for a proof.
+  static restore(b) {
+    const block = Object.create(Block.prototype);
+    block.index = b.index;
+    block.timestamp = b.timestamp;
+    block.records = b.records;
+    block.previousHash = b.previousHash;
+    block.nonce = b.nonce;
+    block.merkleTree = null;
+    block.merkleRoot = b.merkleRoot;
+    block.hash = b.hash;
+    return block;
+  }
+
+  tree() {
+    if (!this.merkleTree) {
+      this.merkleTree = new MerkleTree(this.records.map((r) => r.commitment));
+    }
+    return this.merkleTree;
+  }
+
+  // The header JSON up to the nonce value; the nonce is always serialised last.
+  headerPrefix() {
     const header = {
       index: this.index,
       timestamp: this.timestamp,
       merkleRoot: this.merkleRoot,
       previousHash: this.previousHash,
-      nonce: this.nonce,
+      nonce: 0,
     };
+    return JSON.stringify(header).slice(0, -"0}".length);
+  }
+
+  computeHash() {
     return crypto
       .createHash("sha256")
-      .update(JSON.stringify(header))
+      .update(`${this.headerPrefix()}${this.nonce}}`)
       .digest("hex");
   }
 
   mineBlock(difficulty) {
     const target = "0".repeat(difficulty);
+    // Hash the fixed header prefix once and only feed the nonce to a copy per try.
+    const midstate = crypto.createHash("sha256").update(this.headerPrefix());
+    const startNonce = this.nonce;
+    const started = Date.now();
     while (this.hash.substring(0, difficulty) !== target) {
       this.nonce++;
-      this.hash = this.computeHash();
+      this.hash = midstate.copy().update(`${this.nonce}}`).digest("hex");
     }
-    console.log(`Block mined (idx ${this.index}): ${this.hash}`);
+    const rate = Math.round(
+      ((this.nonce - startNonce + 1) * 1000) / Math.max(1, Date.now() - started)
+    );
+    console.log(`Block mined (idx ${this.index}): ${this.hash} (${rate} H/s)`);
   }
 }
 
 const PENDING_PATH = path.resolve("./pending.json");
+const PENDING_LOG_PATH = logPathFor(PENDING_PATH);
 
 class Blockchain {
   constructor(
@@ -100,8 +147,15 @@ class Blockchain {
     this.chainFilePath = path.resolve(chainFilePath);
     this.maxRecordsPerBlock = maxRecordsPerBlock;
 
+    this.logPath = logPathFor(this.chainFilePath);
+    this.log = null;
+    this.pendingLog = null;
+
     this.chain = [];
     this.pendingRecords = [];
+    // recordId -> [blockIndex, leafIndex]; rebuilt from the log's records on
+    // load and extended as blocks are mined, so nothing extra is written.
+    this.recordLocations = new Map();
 
     this.loadChain();
   }
@@ -112,8 +166,22 @@ class Blockchain {
     return genesis;
   }
 
+  // Called by loadChain(): the queue is only trusted against the loaded chain.
   _loadPending() {
-    if (fs.existsSync(PENDING_PATH)) {
+    if (this.pendingLog) this.pendingLog.close();
+    this.pendingLog = null;
+    this.pendingRecords = [];
+    if (ChainLog.exists(PENDING_LOG_PATH)) {
+      try {
+        this.pendingLog = new ChainLog(PENDING_LOG_PATH).open();
+        this.pendingRecords = this.pendingLog.readAll();
+      } catch (err) {
+        console.warn("Could not read pending.log, trying pending.json:", err);
+        if (this.pendingLog) this.pendingLog.close();
+        this.pendingLog = null;
+      }
+    }
+    if (!this.pendingLog && fs.existsSync(PENDING_PATH)) {
       try {
         this.pendingRecords = JSON.parse(fs.readFileSync(PENDING_PATH));
       } catch (err) {
@@ -122,65 +190,149 @@ class Blockchain {
         fs.unlinkSync(PENDING_PATH);
       }
     }
+    this._dropMined();
   }
 
-  _persistPending() {
-    fs.writeFileSync(
-      PENDING_PATH,
-      JSON.stringify(this.pendingRecords, null, 2)
+  // A crash after a block reached the log but before the pending queue was
+  // rewritten leaves the block's records queued; mining them again would
+  // commit them twice. They can only be in the newest blocks, so only as
+  // many blocks as hold that many records are checked.
+  _dropMined() {
+    const key = (r) => `${r.recordId}\n${r.commitment}`;
+    const mined = new Set();
+    let seen = 0;
+    for (let i = this.chain.length - 1; i > 0 && seen < this.pendingRecords.length; i--) {
+      this.chain[i].records.forEach((r) => mined.add(key(r)));
+      seen += this.chain[i].records.length;
+    }
+    const queued = this.pendingRecords.filter((r) => !mined.has(key(r)));
+    if (queued.length === this.pendingRecords.length) return;
+    console.warn(
+      `Dropping ${this.pendingRecords.length - queued.length} pending records already in the chain`
     );
+    this.pendingRecords = queued;
+    this._persistPending();
+  }
+
+  // Rewrites the pending log from memory; it holds at most a block's worth
+  // of records once the rest have been mined.
+  _persistPending() {
+    if (this.pendingLog) this.pendingLog.close();
+    this.pendingLog = ChainLog.create(PENDING_LOG_PATH, this.pendingRecords);
+  }
+
+  _readStoredChain() {
+    if (ChainLog.exists(this.logPath)) {
+      try {
+        this.log = new ChainLog(this.logPath).open();
+        return this.log.readAll();
+      } catch (err) {
+        console.error("Failed to load chain log, trying chain.json:", err);
+        if (this.log) this.log.close();
+        this.log = null;
+      }
+    }
+    if (!fs.existsSync(this.chainFilePath)) return null;
+    return JSON.parse(fs.readFileSync(this.chainFilePath));
   }
 
   loadChain() {
-    if (fs.existsSync(this.chainFilePath)) {
+    let parsed = null;
+    try {
+      parsed = this._readStoredChain();
+    } catch (err) {
+      console.error("Failed to load chain, recreating genesis:", err);
+    }
+    if (parsed) {
       try {
-        const raw = fs.readFileSync(this.chainFilePath);
-        const parsed = JSON.parse(raw);
-        this.chain = parsed.map((b) => {
-          const block = new Block(
-            b.index,
-            b.timestamp,
-            b.records,
-            b.previousHash,
-            b.nonce
-          );
-          block.hash = b.hash;
-          block.merkleRoot = b.merkleRoot;
-          block.merkleTree = new MerkleTree(
-            block.records.map((r) => r.commitment)
-          );
-          return block;
-        });
+        this.chain = parsed.map((b) => Block.restore(b));
+        this.rebuildProofIndex();
+        // Converts a chain.json-only store to the log once; a no-op otherwise.
+        this.saveChain();
       } catch (err) {
         console.error("Failed to load chain, recreating genesis:", err);
         this.chain = [this.createGenesisBlock()];
         this.saveChain();
+        this.rebuildProofIndex();
       }
     } else {
       this.chain = [this.createGenesisBlock()];
       this.saveChain();
+      this.rebuildProofIndex();
     }
+    this._loadPending();
+  }
+
+  _indexBlock(block) {
+    block.records.forEach((r, leaf) => {
+      // The earliest block holding a recordId answers for it, as before.
+      if (!this.recordLocations.has(r.recordId)) {
+        this.recordLocations.set(r.recordId, [block.index, leaf]);
+      }
+    });
   }
 
+  // Call after replacing this.chain wholesale (e.g. in migrate.js). Only
+  // reads the records; no tree is hashed.
+  rebuildProofIndex() {
+    this.recordLocations = new Map();
+    this.chain.forEach((block) => this._indexBlock(block));
+  }
+
+  getProof(recordId) {
+    const location = this.recordLocations.get(String(recordId));
+    if (!location) return null;
+    const [blockIndex, leafIndex] = location;
+    const block = this.chain[blockIndex];
+    return {
+      blockIndex: block.index,
+      merkleRoot: block.merkleRoot,
+      leafIndex,
+      proof: block.tree().getProof(leafIndex),
+    };
+  }
+
+  // Appends the blocks the log has not seen yet. A chain that was replaced
+  // rather than extended (different tip at the log's height) is rewritten.
   saveChain() {
-    fs.writeFileSync(this.chainFilePath, JSON.stringify(this.chain, null, 2));
+    const log = this.log;
+    const extended =
+      log &&
+      log.length <= this.chain.length &&
+      (log.length === 0 ||
+        log.hashAt(log.length - 1) === this.chain[log.length - 1].hash);
+    if (extended) {
+      log.extend(this.chain.slice(log.length));
+      return;
+    }
+    if (log) log.close();
+    this.log = ChainLog.create(this.logPath, this.chain);
+  }
+
+  // Human-readable copy of the chain for tools that still read the JSON file.
+  exportJSON(filePath = this.chainFilePath) {
+    fs.writeFileSync(filePath, JSON.stringify(this.chain, null, 2));
   }
 
   getLatestBlock() {
     return this.chain[this.chain.length - 1];
   }
 
+  // Writes the queue as a pending log, the form _loadPending() reads; a
+  // pending.json written here would be ignored once pending.log exists.
   savePending(filePath = PENDING_PATH) {
-    fs.writeFileSync(
-      path.resolve(filePath),
-      JSON.stringify(this.pendingRecords, null, 2)
-    );
+    const logPath = logPathFor(path.resolve(filePath));
+    if (logPath === PENDING_LOG_PATH) return this._persistPending();
+    ChainLog.create(logPath, this.pendingRecords).close();
   }
 
   addRecord(record) {
     this.pendingRecords.push(record);
-    this._persistPending();
-    this.savePending();
+    if (this.pendingLog) {
+      this.pendingLog.append(record);
+    } else {
+      this._persistPending();
+    }
     if (this.pendingRecords.length >= this.maxRecordsPerBlock) {
       return this._minePendingBlock();
     }
@@ -199,12 +351,16 @@ class Blockchain {
     block.mineBlock(this.difficulty);
     this.chain.push(block);
     this.saveChain();
+    this._indexBlock(block);
+    // Dying before this line leaves the records queued; _dropMined() skips them on restart.
     this._persistPending();
     return block;
   }
 
-  isChainValid() {
-    for (let i = 1; i < this.chain.length; i++) {
+  // Pass full = true to ignore the checkpoint and rescan from genesis.
+  isChainValid(full = false) {
+    const start = full ? 1 : firstUncheckedBlock(this.chainFilePath, this.chain);
+    for (let i = start; i < this.chain.length; i++) {
       const curr = this.chain[i];
       const prev = this.chain[i - 1];
 
@@ -216,6 +372,7 @@ class Blockchain {
 
       if (curr.hash !== curr.computeHash()) return false;
     }
+    writeCheckpoint(this.chainFilePath, this.chain);
     return true;
   }
 }
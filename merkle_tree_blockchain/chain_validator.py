@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Checkpointed validation of this backend's chain.json (or its binary log);
+the streaming and the checkpoint are in common/chain_validator.py. Each
+block appended since the checkpoint has its header hash and Merkle root
+checked.
+
+    python3 chain_validator.py [chain.json] [--full]
+"""
+import os
+import sys
+
+# The modules every backend shares live in ../common.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common import chain_validator
+from merkle import MerkleTree, header_hash
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+CHAIN_PATH = os.path.join(BASE_DIR, "chain.json")
+
+
+def block_error(block):
+    # Header hash as Block.computeHash(), then the root over the records.
+    if block["hash"] != header_hash(block):
+        return f"Invalid hash at block {block['index']}"
+    if block.get("merkleRoot") != MerkleTree([r["commitment"] for r in block["records"]]).root:
+        return f"Invalid Merkle root at block {block['index']}"
+    return None
+
+
+def validate(path=CHAIN_PATH, full=False):
+    return chain_validator.validate(path, block_error, full)
+
+
+if __name__ == "__main__":
+    chain_validator.main(CHAIN_PATH, block_error)
@@ -0,0 +1,171 @@
+"""
+Merkle inclusion proofs for chain.json, compatible with blockchain.js.
+
+MerkleTree mirrors the JS class byte for byte: leaves and nodes are sha256
+hex digests of strings, an odd node at the end of a layer is paired with
+itself, and proof steps are {"position": "left" | "right", "data": sibling}.
+
+ChainRoots keeps the chain's Merkle roots in memory, so verify_quote can
+check that a quotes.db row is committed on the chain with O(log n) hashing
+instead of a /proof round trip to server.js. When the chain changes only the
+blocks appended since the last refresh are read (as in poster_index.py); a
+chain whose old tip is gone is read again from the start. recordId locations
+come from the blocks' records, as in blockchain.js, and a block's tree is
+only built for its first proof.
+"""
+import hashlib
+import json
+import os
+
+from common.chain_log import ChainLog, chain_mtime, load_chain, log_path_for
+
+
+def sha256_hex(data):
+    # JSON.stringify for non-strings, with the same compact separators.
+    if not isinstance(data, str):
+        data = json.dumps(data, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(data.encode("utf-8")).hexdigest()
+
+
+def commitment(platform, poster, post_id, content, post_time, tweet_url):
+    """The record commitment migrate.js stores for a quotes row."""
+    return sha256_hex({
+        "platform": platform,
+        "poster": poster,
+        "post_id": post_id,
+        "content": content,
+        "post_time": post_time,
+        "tweet_url": tweet_url,
+    })
+
+
+def header_hash(block):
+    return sha256_hex({
+        "index": block["index"],
+        "timestamp": block["timestamp"],
+        "merkleRoot": block.get("merkleRoot"),
+        "previousHash": block["previousHash"],
+        "nonce": block["nonce"],
+    })
+
+
+class MerkleTree:
+    def __init__(self, leaves):
+        self.leaves = [sha256_hex(data) for data in leaves]
+        self.layers = [self.leaves]
+        current = self.leaves
+        while len(current) > 1:
+            current = [
+                sha256_hex(current[i] + (current[i + 1] if i + 1 < len(current) else current[i]))
+                for i in range(0, len(current), 2)
+            ]
+            self.layers.append(current)
+
+    @property
+    def root(self):
+        last = self.layers[-1]
+        return last[0] if last else None
+
+    def get_proof(self, leaf_index):
+        if leaf_index < 0 or leaf_index >= len(self.leaves):
+            return None
+        proof = []
+        for layer in self.layers[:-1]:
+            is_right = leaf_index % 2
+            pair = leaf_index - 1 if is_right else leaf_index + 1
+            sibling = layer[pair] if pair < len(layer) else layer[leaf_index]
+            proof.append({"position": "left" if is_right else "right", "data": sibling})
+            leaf_index //= 2
+        return proof
+
+
+def verify_proof(leaf, proof, root):
+    """Check a getProof()-style proof for the unhashed leaf against root."""
+    node = sha256_hex(leaf)
+    for step in proof:
+        if step["position"] == "left":
+            node = sha256_hex(step["data"] + node)
+        else:
+            node = sha256_hex(node + step["data"])
+    return node == root
+
+
+class ChainRoots:
+    def __init__(self, path):
+        self.path = path
+        self._mtime = None
+        self._source = None   # ChainLog, or the parsed chain.json without one
+        self.height = 0       # blocks read so far
+        self.tip = None       # hash of the last of them
+        self._previous = None  # hash of the last trusted block
+        self._intact = True   # whether every block read so far is trusted
+        self._roots = {}      # block index -> merkleRoot of a correctly linked block
+        self._leaves = {}     # block index -> commitments, in leaf order
+        self._locations = {}  # recordId -> [(block index, leaf index)]
+        self._trees = {}      # block index -> MerkleTree, built on first proof
+
+    def refresh(self):
+        try:
+            mtime = chain_mtime(self.path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        log_path = log_path_for(self.path)
+        if os.path.exists(log_path + ".idx"):
+            if not isinstance(self._source, ChainLog):
+                self._source = ChainLog(log_path)
+            self._source.refresh()
+        else:
+            self._source = load_chain(self.path)
+
+        # Blocks are only ever appended, so only the new ones are read;
+        # anything else means reading the chain again from the start.
+        if not self._extends(self.height, self.tip):
+            self.height, self.tip, self._previous, self._intact = 0, None, None, True
+            self._roots, self._leaves, self._locations, self._trees = {}, {}, {}, {}
+        for position in range(self.height, len(self._source)):
+            self._add(self._source[position])
+        self.height = len(self._source)
+        self._mtime = mtime
+
+    def _extends(self, height, tip):
+        """Whether the chain still starts with the `height` blocks ending in `tip`."""
+        if height > len(self._source):
+            return False
+        if isinstance(self._source, ChainLog):
+            return not height or self._source.entry(height - 1)[3] == tip
+        return not height or self._source[height - 1].get("hash") == tip
+
+    def _add(self, block):
+        self.tip = block["hash"]
+        # Only roots covered by an intact header and hash link are trusted.
+        if not self._intact:
+            return
+        if header_hash(block) != block["hash"] or (
+            self._previous is not None and block["previousHash"] != self._previous
+        ):
+            self._intact = False
+            return
+        self._previous = block["hash"]
+        self._roots[block["index"]] = block.get("merkleRoot")
+        self._leaves[block["index"]] = [r["commitment"] for r in block["records"]]
+        for leaf, record in enumerate(block["records"]):
+            self._locations.setdefault(record["recordId"], []).append((block["index"], leaf))
+
+    def prove(self, record_id, leaf):
+        """
+        Return {"blockIndex", "merkleRoot"} if the commitment `leaf` for
+        record_id is included in a trusted block, otherwise None.
+        """
+        self.refresh()
+        for index, position in self._locations.get(str(record_id), ()):
+            if index not in self._roots:
+                continue
+            tree = self._trees.get(index)
+            if tree is None:
+                tree = self._trees[index] = MerkleTree(self._leaves[index])
+            root = self._roots[index]
+            if verify_proof(leaf, tree.get_proof(position), root):
+                return {"blockIndex": index, "merkleRoot": root}
+        return None
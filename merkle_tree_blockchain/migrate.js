@@ -2,6 +2,7 @@ const fs = require("fs");
 const crypto = require("crypto");
 const path = require("path");
 const { Blockchain } = require("./blockchain");
+const { logPathFor } = require("../common/chainlog");
 
 const QUOTES_API = "http://localhost:4001/quotes";
 const NEW_CHAIN_PATH = path.resolve(__dirname, "chain.json");
@@ -22,6 +23,10 @@ async function migrate() {
 
   const bc = new Blockchain(DIFFICULTY, NEW_CHAIN_PATH, MAX_RECORDS);
   bc.chain = [bc.createGenesisBlock()];
+  bc.rebuildProofIndex();
+  // The new chain starts with an empty queue, not the old chain's.
+  bc.pendingRecords = [];
+  bc.savePending();
 
   console.log("Building commitment records...");
   const records = quotes.map((q) => {
@@ -53,10 +58,11 @@ async function migrate() {
   console.log(`${bc.pendingRecords.length} records remain pending.`);
 
   bc.saveChain();
+  bc.exportJSON();
   bc.savePending();
   console.log(`Migration complete!
   New chain written to ${NEW_CHAIN_PATH}
-  Pending buffer written to ${PENDING_PATH} (${bc.pendingRecords.length} records)`);
+  Pending buffer written to ${logPathFor(PENDING_PATH)} (${bc.pendingRecords.length} records)`);
 }
 
 migrate().catch((err) => {
@@ -9,68 +9,131 @@ app.use(express.json());
 
 const PORT = 4002;
 const bc = new Blockchain();
-if (typeof bc._loadPending === "function") bc._loadPending();
 
-app.post("/verify", (req, res) => {
-  console.log("Received verification request:", req.body);
-  const { tweetId, content } = req.body;
-  const inputStr = JSON.stringify({ tweetId, content }).replace(/'/g, "\\'");
+// verify_server.py keeps the model warm; verify_quote.py is only spawned
+// directly when that service is not running.
+const VERIFIER_URL = process.env.VERIFIER_URL || "http://127.0.0.1:4102";
+
+function spawnVerifier(input, callback) {
+  const inputStr = JSON.stringify(input).replace(/'/g, "\\'");
 
   exec(`python3 verify_quote.py '${inputStr}'`, (error, stdout, stderr) => {
-    if (error) {
-      console.error("Python error:", error);
-      return res.status(500).json({ verified: false, error: error.message });
+    if (error) return callback(error);
+    if (stderr) console.warn("Python stderr:", stderr);
+
+    let result;
+    try {
+      result = JSON.parse(stdout);
+    } catch (e) {
+      console.error("Bad JSON from python:", stdout);
+      return callback(new Error("Bad JSON from verifier"));
     }
+    callback(null, result);
+  });
+}
+
+// Batches go through stdin so a page of tweets never hits argv length limits.
+function spawnBatchVerifier(items, callback) {
+  const child = exec("python3 verify_quote.py -", (error, stdout, stderr) => {
+    if (error) return callback(error);
     if (stderr) console.warn("Python stderr:", stderr);
 
+    let results;
     try {
-      const result = JSON.parse(stdout);
-      return res.json(result);
+      results = JSON.parse(stdout);
     } catch (e) {
       console.error("Bad JSON from python:", stdout);
-      return res
-        .status(500)
-        .json({ verified: false, error: "Bad JSON from verifier" });
+      return callback(new Error("Bad JSON from verifier"));
+    }
+    callback(null, { results });
+  });
+  child.stdin.end(JSON.stringify(items));
+}
+
+function postToVerifier(route, body, callback, fallback) {
+  fetch(`${VERIFIER_URL}${route}`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body),
+  }).then(
+    (response) =>
+      response.json().then(
+        (result) =>
+          response.ok
+            ? callback(null, result)
+            : callback(new Error(result.error || response.statusText)),
+        () => callback(new Error("Bad JSON from verifier"))
+      ),
+    (err) => {
+      console.warn(`Verifier service unreachable (${err.message}), spawning Python`);
+      fallback();
+    }
+  );
+}
+
+function runVerifier(input, callback) {
+  postToVerifier("/verify", input, callback, () => spawnVerifier(input, callback));
+}
+
+function runBatchVerifier(items, callback) {
+  postToVerifier("/verifyBatch", { items }, callback, () =>
+    spawnBatchVerifier(items, callback)
+  );
+}
+
+app.post("/verify", (req, res) => {
+  console.log("Received verification request:", req.body);
+  const { tweetId, content } = req.body;
+
+  runVerifier({ tweetId, content }, (error, result) => {
+    if (error) {
+      console.error("Python error:", error);
+      return res.status(500).json({ verified: false, error: error.message });
     }
+    return res.json(result);
   });
 });
 
 app.post("/verifyHighlighted", (req, res) => {
-  const inputStr = JSON.stringify({
-    highlightedText: req.body.highlightedText,
-  }).replace(/'/g, "\\'");
+  const input = { highlightedText: req.body.highlightedText };
 
-  exec(`python3 verify_quote.py '${inputStr}'`, (error, stdout, stderr) => {
+  runVerifier(input, (error, result) => {
     if (error) {
       console.error("Python error:", error);
       return res.status(500).json({ verified: false, error: error.message });
     }
-    if (stderr) console.warn("Python stderr:", stderr);
+    return res.json(result);
+  });
+});
 
-    try {
-      const result = JSON.parse(stdout);
-      return res.json(result);
-    } catch {
-      return res
-        .status(500)
-        .json({ verified: false, error: "Bad JSON from verifier" });
+// { items: [{ tweetId, content }] } -> { results: [...] }, in the same order,
+// so a page of tweets costs one round trip and one batched inference.
+app.post("/verifyBatch", (req, res) => {
+  if (!Array.isArray(req.body.items)) {
+    return res.status(400).json({ error: "Expected { items: [...] }" });
+  }
+  const items = req.body.items.map(({ tweetId, content }) => ({
+    tweetId,
+    content,
+  }));
+  console.log(`Received batch verification request (${items.length} items)`);
+
+  runBatchVerifier(items, (error, result) => {
+    if (error) {
+      console.error("Python error:", error);
+      return res.status(500).json({ error: error.message });
     }
+    return res.json(result);
   });
 });
 
 app.post("/proof", (req, res) => {
   const { recordId } = req.body;
 
-  for (let block of bc.chain) {
-    const idx = block.records.findIndex((r) => r.recordId === recordId);
-    if (idx >= 0) {
-      const proof = block.merkleTree.getProof(idx);
-      return res.json({
-        blockIndex: block.index,
-        merkleRoot: block.merkleRoot,
-        proof,
-      });
-    }
+  const found = bc.getProof(recordId);
+  if (found) {
+    const { blockIndex, merkleRoot, proof } = found;
+    return res.json({ blockIndex, merkleRoot, proof });
   }
 
   res.status(404).json({ error: `recordId ${recordId} not in any block` });
@@ -78,7 +141,10 @@ app.post("/proof", (req, res) => {
 
 app.get("/chain", (req, res) => res.json(bc.chain));
 app.get("/pending", (req, res) => res.json(bc.pendingRecords));
-app.get("/validate", (req, res) => res.json({ valid: bc.isChainValid() }));
+// ?full=1 rescans from genesis instead of from the last validated checkpoint.
+app.get("/validate", (req, res) =>
+  res.json({ valid: bc.isChainValid(req.query.full === "1") })
+);
 
 app.listen(PORT, () => {
   console.log(`🖧 Merkle server listening on http://localhost:${PORT}`);
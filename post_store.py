@@ -0,0 +1,283 @@
+#!/usr/bin/env python3
+"""
+Partitioned, compressed store for collected posts.
+
+Posts are appended as gzip-compressed JSON Lines, one file per
+platform/handle/month:
+
+    posts/<platform>/<handle>/<YYYY-MM>.jsonl.gz
+
+Each line is the post object as the platform API returned it, plus a
+"fetched_at" timestamp. Every append writes one gzip member, so a file is
+only ever appended to and a reader can start decompressing at any member
+boundary. posts/manifest.jsonl maps (platform, handle, post_id) to the file,
+member offset and line of the post, one JSON array per post; it is appended
+alongside the data and decides what counts as a duplicate.
+
+compact() merges each partition's members into one, rewrites the manifest,
+and folds in the {handle}_{timestamp}.json dumps query_posts.py used to
+write, dropping posts already stored.
+
+    python3 post_store.py compact [--remove-dumps]
+    python3 post_store.py get <platform> <handle> <post_id>
+    python3 post_store.py stats
+"""
+import argparse
+import gzip
+import json
+import os
+import re
+import sys
+import threading
+import time
+import zlib
+from collections import Counter
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+POSTS_DIR = os.path.join(BASE_DIR, "posts")
+MANIFEST = "manifest.jsonl"
+
+# Where each platform's query result keeps its list of posts.
+POST_LISTS = {
+    "twitter": "data",
+    "blue_sky": "records",
+    "truth_social": "posts",
+    "facebook": "data",
+}
+DUMP_NAME = re.compile(r"^(?P<handle>.+)_(?P<stamp>\d{8}-\d{6})\.json$")
+MONTH = re.compile(r"^\d{4}-\d{2}")
+
+
+def post_id(platform, post):
+    if platform == "blue_sky":
+        return (post.get("uri") or "").rsplit("/", 1)[-1] or None
+    return str(post["id"]) if post.get("id") else None
+
+
+def post_month(platform, post):
+    if platform == "blue_sky":
+        created = (post.get("value") or {}).get("createdAt")
+    else:
+        created = post.get("created_at") or post.get("created_time")
+    created = created or post.get("fetched_at") or ""
+    return created[:7] if MONTH.match(created) else time.strftime("%Y-%m", time.gmtime())
+
+
+def list_dumps(root=POSTS_DIR):
+    """(stamp, platform, handle, path) of the old {handle}_{timestamp}.json dumps, oldest first."""
+    dumps = []
+    for platform in POST_LISTS:
+        folder = os.path.join(root, platform)
+        if not os.path.isdir(folder):
+            continue
+        for name in os.listdir(folder):
+            match = DUMP_NAME.match(name)
+            if match:
+                handle = match["handle"]
+                # Older twitter dumps carry a "twitter_" prefix.
+                if handle.startswith(platform + "_"):
+                    handle = handle[len(platform) + 1:]
+                dumps.append((match["stamp"], platform, handle, os.path.join(folder, name)))
+    return sorted(dumps)
+
+
+def _safe(name):
+    return re.sub(r"[^\w.@-]", "_", name)
+
+
+def _read_member(path, offset):
+    """Decompress the single gzip member starting at `offset`."""
+    decoder = zlib.decompressobj(31)
+    chunks = []
+    with open(path, "rb") as f:
+        f.seek(offset)
+        while not decoder.eof:
+            data = f.read(1 << 16)
+            if not data:
+                break
+            chunks.append(decoder.decompress(data))
+    return b"".join(chunks)
+
+
+class PostStore:
+    def __init__(self, root=POSTS_DIR):
+        self.root = root
+        self.manifest_path = os.path.join(root, MANIFEST)
+        self._lock = threading.Lock()
+        self._index = None  # (platform, handle) -> {post_id: [file, offset, line]}
+
+    # -- manifest ----------------------------------------------------------
+
+    def _load(self):
+        if self._index is not None:
+            return
+        self._index = {}
+        try:
+            with open(self.manifest_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        platform, handle, pid, rel, offset, n = json.loads(line)
+                    except ValueError:
+                        continue  # a torn last line from an interrupted append
+                    self._index.setdefault((platform, handle), {}).setdefault(pid, [rel, offset, n])
+        except OSError:
+            pass
+
+    # -- writing -----------------------------------------------------------
+
+    def append(self, platform, handle, posts):
+        """Store the posts not already stored; returns how many were new."""
+        fetched = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime())
+        with self._lock:
+            self._load()
+            known = self._index.setdefault((platform, handle), {})
+            partitions = {}
+            for post in posts:
+                pid = post_id(platform, post) if isinstance(post, dict) else None
+                if pid is None or pid in known:
+                    continue
+                post = dict(post, fetched_at=post.get("fetched_at") or fetched)
+                partitions.setdefault(post_month(platform, post), {})[pid] = post
+
+            entries = []
+            for month, batch in sorted(partitions.items()):
+                rel = os.path.join(platform, _safe(handle), f"{month}.jsonl.gz")
+                path = os.path.join(self.root, rel)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                lines = [json.dumps(p, ensure_ascii=False).encode("utf-8") + b"\n" for p in batch.values()]
+                with open(path, "ab") as f:
+                    offset = f.tell()
+                    f.write(gzip.compress(b"".join(lines), mtime=0))
+                for n, pid in enumerate(batch):
+                    known[pid] = [rel, offset, n]
+                    entries.append([platform, handle, pid, rel, offset, n])
+            if entries:
+                # Data first, then the manifest lines that point at it.
+                with open(self.manifest_path, "a", encoding="utf-8") as f:
+                    f.writelines(json.dumps(e, ensure_ascii=False) + "\n" for e in entries)
+            return len(entries)
+
+    # -- reading -----------------------------------------------------------
+
+    def get(self, platform, handle, pid):
+        with self._lock:
+            self._load()
+            location = self._index.get((platform, handle), {}).get(str(pid))
+        if location is None:
+            return None
+        rel, offset, n = location
+        lines = _read_member(os.path.join(self.root, rel), offset).splitlines()
+        return json.loads(lines[n])
+
+    def partitions(self, platform=None):
+        """(platform, handle, path) of every partition file, oldest month first."""
+        for name in sorted(POST_LISTS if platform is None else [platform]):
+            folder = os.path.join(self.root, name)
+            if not os.path.isdir(folder):
+                continue
+            for handle in sorted(os.listdir(folder)):
+                sub = os.path.join(folder, handle)
+                if os.path.isdir(sub):
+                    for month in sorted(os.listdir(sub)):
+                        if month.endswith(".jsonl.gz"):
+                            yield name, handle, os.path.join(sub, month)
+
+    def iter_posts(self, platform=None):
+        """Yield (platform, handle, post) for every stored post."""
+        for name, handle, path in self.partitions(platform):
+            with gzip.open(path, "rt", encoding="utf-8") as f:
+                for line in f:
+                    if line.strip():
+                        yield name, handle, json.loads(line)
+
+    # -- compaction --------------------------------------------------------
+
+    def compact(self, remove_dumps=False):
+        """
+        Fold legacy JSON dumps into the store, merge every partition into a
+        single gzip member and rewrite the manifest to match.
+        """
+        imported = self._import_dumps(remove_dumps)
+        with self._lock:
+            self._load()
+            # The manifest keeps the unsanitised handle; the folder name is the fallback.
+            handles = {loc[0]: handle for (_, handle), ids in self._index.items() for loc in ids.values()}
+            entries, seen = [], set()
+            for platform, folder, path in list(self.partitions()):
+                rel = os.path.relpath(path, self.root)
+                handle = handles.get(rel, folder)
+                lines = []
+                with gzip.open(path, "rt", encoding="utf-8") as f:
+                    for line in f:
+                        if not line.strip():
+                            continue
+                        post = json.loads(line)
+                        pid = post_id(platform, post)
+                        if (platform, handle, pid) in seen:
+                            continue
+                        seen.add((platform, handle, pid))
+                        lines.append(json.dumps(post, ensure_ascii=False).encode("utf-8") + b"\n")
+                        entries.append([platform, handle, pid, rel, 0, len(lines) - 1])
+                with open(path + ".tmp", "wb") as f:
+                    f.write(gzip.compress(b"".join(lines), mtime=0))
+                os.replace(path + ".tmp", path)
+            with open(self.manifest_path + ".tmp", "w", encoding="utf-8") as f:
+                f.writelines(json.dumps(e, ensure_ascii=False) + "\n" for e in entries)
+            os.replace(self.manifest_path + ".tmp", self.manifest_path)
+            self._index = None
+        return {"imported": imported, "posts": len(entries)}
+
+    def _import_dumps(self, remove):
+        imported = 0
+        # Oldest dump first, so the first copy of a post is the one kept.
+        for stamp, platform, handle, path in list_dumps(self.root):
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    doc = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"Skipping {path}: {e}", file=sys.stderr)
+                continue
+            posts = doc.get(POST_LISTS[platform]) if isinstance(doc, dict) else None
+            fetched = time.strftime("%Y-%m-%dT%H:%M:%SZ", time.strptime(stamp, "%Y%m%d-%H%M%S"))
+            imported += self.append(platform, handle, [
+                dict(p, fetched_at=p.get("fetched_at") or fetched) for p in posts or [] if isinstance(p, dict)
+            ])
+            if remove:
+                os.remove(path)
+        return imported
+
+    def stats(self):
+        with self._lock:
+            self._load()
+            counts = Counter(platform for (platform, _), ids in self._index.items() for _ in ids)
+        size = sum(os.path.getsize(path) for _, _, path in self.partitions())
+        return {"posts": dict(counts), "bytes": size}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect and compact the post store.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    compact = sub.add_parser("compact", help="merge partitions and fold in old JSON dumps")
+    compact.add_argument("--remove-dumps", action="store_true", help="delete dumps once imported")
+    get = sub.add_parser("get", help="print one stored post")
+    get.add_argument("platform")
+    get.add_argument("handle")
+    get.add_argument("post_id")
+    sub.add_parser("stats")
+    parser.add_argument("--root", default=POSTS_DIR)
+    args = parser.parse_args()
+
+    store = PostStore(args.root)
+    if args.command == "compact":
+        print(json.dumps(store.compact(args.remove_dumps)))
+    elif args.command == "get":
+        post = store.get(args.platform, args.handle, args.post_id)
+        if post is None:
+            sys.exit(f"{args.platform}/{args.handle}/{args.post_id} is not stored")
+        print(json.dumps(post, indent=2, ensure_ascii=False))
+    else:
+        print(json.dumps(store.stats()))
+
+
+if __name__ == "__main__":
+    main()
@@ -10,17 +10,42 @@ This script queries posts from:
   5. Threads – (placeholder; no official API yet)
   6. Exit
 
-The queried posts are saved as JSON files in platform‐specific subdirectories under a “posts” folder.
+The queried posts are appended to the compressed, partitioned post store under
+the “posts” folder (see post_store.py), which skips posts it already holds.
+
+Bulk mode skips the menu and collects every account in tracked_people.json
+(twitter, blue_sky, truth_social) concurrently:
+
+  python3 query_posts.py --bulk [--tracked path/to/tracked_people.json] [--workers 8]
+
+X, Blue Sky and Facebook fetches are incremental: posts/checkpoints.json keeps
+the newest post seen and the resolved user id / DID per account, and each run
+pages only through posts newer than that, up to MAX_PAGES; a run that runs out
+of pages first leaves the checkpoint where it was. The first run of an
+account fetches a single page. Rate-limited requests are retried after the reset time the API
+reports.
+
+Truth Social statuses are streamed from truthbrush line by line and stored in
+batches of STREAM_BATCH as they arrive, trimmed to TRUTH_SOCIAL_FIELDS; the stream
+stops at the newest status id saved by the previous run.
 """
 
 from dotenv import load_dotenv
 load_dotenv()
 
 import os
+import sys
 import json
 import time
+import argparse
+import threading
 import requests
 import subprocess
+import tempfile
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+from post_store import POST_LISTS, PostStore
 
 # Import atproto for Blue Sky queries.
 try:
@@ -43,16 +68,73 @@ PLATFORM_FOLDERS = {
 for folder in PLATFORM_FOLDERS.values():
     os.makedirs(folder, exist_ok=True)
 
-def parse_ndjson(output: str) -> list:
-    posts = []
-    for line in output.strip().splitlines():
-        if line.strip():
-            try:
-                obj = json.loads(line)
-                posts.append(obj)
-            except json.JSONDecodeError as e:
-                print("Error decoding line:", line, e)
-    return posts
+TRACKED_PEOPLE_PATH = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "raw_data_blockchain", "tracked_people.json"
+)
+BULK_WORKERS = 8
+CHECKPOINTS_PATH = os.path.join(BASE_POSTS_DIR, "checkpoints.json")
+PAGE_SIZE = 100
+MAX_PAGES = 50            # bound on pages followed back to a checkpoint
+RATE_LIMIT_RETRIES = 3
+MAX_BACKOFF = 900         # seconds; X resets its windows every 15 minutes
+STREAM_BATCH = 500        # truthbrush statuses per post store append
+
+# Each worker thread keeps its own keep-alive session; requests.Session is not thread-safe.
+_thread_state = threading.local()
+
+def http_session() -> requests.Session:
+    session = getattr(_thread_state, "session", None)
+    if session is None:
+        session = _thread_state.session = requests.Session()
+    return session
+
+def get_with_backoff(url: str, headers: dict = None, params: dict = None) -> requests.Response:
+    """
+    GET on the thread's session, sleeping through 429 responses until the
+    reset the API reports (x-rate-limit-reset or Retry-After), or with
+    exponential backoff when it reports none.
+    """
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        resp = http_session().get(url, headers=headers, params=params)
+        if resp.status_code != 429 or attempt == RATE_LIMIT_RETRIES:
+            return resp
+        if resp.headers.get("x-rate-limit-reset"):
+            wait = int(resp.headers["x-rate-limit-reset"]) - time.time() + 1
+        elif resp.headers.get("Retry-After", "").isdigit():
+            wait = int(resp.headers["Retry-After"])
+        else:
+            wait = 2 ** attempt
+        wait = min(max(wait, 1), MAX_BACKOFF)
+        print(f"Rate limited by {url.split('/')[2]}; retrying in {wait:.0f}s")
+        time.sleep(wait)
+    return resp
+
+# Per-account fetch state, shared by every worker thread.
+class CheckpointStore:
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                self._data = json.load(f)
+        except (OSError, ValueError):
+            self._data = {}
+
+    def get(self, platform: str, handle: str) -> dict:
+        with self._lock:
+            return dict(self._data.get(f"{platform}:{handle.lower()}", {}))
+
+    def update(self, platform: str, handle: str, **fields):
+        with self._lock:
+            entry = self._data.setdefault(f"{platform}:{handle.lower()}", {})
+            entry.update(fields, updatedAt=int(time.time()))
+            tmp = self.path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                json.dump(self._data, f, indent=2)
+            os.replace(tmp, self.path)
+
+checkpoints = CheckpointStore(CHECKPOINTS_PATH)
+post_store = PostStore(BASE_POSTS_DIR)
 
 # X (Twitter) Query Functions
 def query_x_posts(username: str) -> dict:
@@ -61,82 +143,175 @@ def query_x_posts(username: str) -> dict:
         print("Error: TWITTER_AUTH_BEARER_TOKEN environment variable not set.")
         return {}
     headers = {"Authorization": f"Bearer {bearer_token}"}
+    state = checkpoints.get("twitter", username)
 
-    url_user = f"https://api.twitter.com/2/users/by/username/{username}"
-    user_resp = requests.get(url_user, headers=headers)
-    if user_resp.status_code != 200:
-        print("Error retrieving user data:", user_resp.text)
-        return {}
-    user_data = user_resp.json().get("data", {})
-    user_id = user_data.get("id")
+    user_id = state.get("userId")
     if not user_id:
-        print("User ID not found.")
-        return {}
+        url_user = f"https://api.twitter.com/2/users/by/username/{username}"
+        user_resp = get_with_backoff(url_user, headers=headers)
+        if user_resp.status_code != 200:
+            print("Error retrieving user data:", user_resp.text)
+            return {}
+        user_data = user_resp.json().get("data", {})
+        user_id = user_data.get("id")
+        if not user_id:
+            print("User ID not found.")
+            return {}
+        checkpoints.update("twitter", username, userId=user_id)
 
+    # Pages run newest to oldest; with since_id they stop at the checkpoint.
     url_tweets = f"https://api.twitter.com/2/users/{user_id}/tweets"
-    tweets_resp = requests.get(url_tweets, headers=headers)
-    if tweets_resp.status_code != 200:
-        print("Error retrieving tweets:", tweets_resp.text)
+    params = {"max_results": PAGE_SIZE}
+    if state.get("sinceId"):
+        params["since_id"] = state["sinceId"]
+    tweets, newest_id, complete = [], None, True
+    for _ in range(MAX_PAGES if "since_id" in params else 1):
+        tweets_resp = get_with_backoff(url_tweets, headers=headers, params=params)
+        if tweets_resp.status_code != 200:
+            print("Error retrieving tweets:", tweets_resp.text)
+            complete = False
+            break
+        page = tweets_resp.json()
+        tweets.extend(page.get("data", []))
+        meta = page.get("meta", {})
+        newest_id = newest_id or meta.get("newest_id")
+        if not meta.get("next_token"):
+            break
+        params["pagination_token"] = meta["next_token"]
+    else:
+        # MAX_PAGES ran out before the checkpoint did (the first run's single
+        # page is meant to start the checkpoint, so it does not count).
+        if "since_id" in params:
+            complete = False
+    # A run cut short leaves the checkpoint alone so the gap is fetched next time.
+    if newest_id and complete:
+        checkpoints.update("twitter", username, sinceId=newest_id)
+    if not tweets:
         return {}
-    return tweets_resp.json()
+    return {"data": tweets, "meta": {"result_count": len(tweets), "newest_id": newest_id}}
 
 
 # Blue Sky Query Functions
 def query_bluesky_posts(handle: str) -> dict:
     """
     Query posts from a Blue Sky user.
-    Resolves the handle to a DID and then lists recent posts.
+    Resolves the handle to a DID (cached in the checkpoint) and then lists
+    posts, newest first, until reaching the newest one seen last run.
     """
     try:
-        client = atproto.Client()  # No login required for public read endpoints.
-        actor = None
-        try:
-            actor = client.com.atproto.identity.resolveHandle({"handle": handle})
-        except Exception as e:
-            print("resolveHandle failed, trying resolve_handle:", e)
-            actor = client.com.atproto.identity.resolve_handle({"handle": handle})
-        if not actor or "did" not in actor:
-            print("Unable to resolve Blue Sky handle for:", handle)
-            return {}
-        did = actor["did"]
-        records = client.com.atproto.repo.listRecords({
-            "repo": did,
-            "collection": "app.bsky.feed.post",
-            "limit": 10
-        })
-        return records
+        # No login required for public read endpoints; reused per thread.
+        client = getattr(_thread_state, "bluesky", None)
+        if client is None:
+            client = _thread_state.bluesky = atproto.Client()
+        state = checkpoints.get("blue_sky", handle)
+        did = state.get("did")
+        if not did:
+            actor = None
+            try:
+                actor = client.com.atproto.identity.resolveHandle({"handle": handle})
+            except Exception as e:
+                print("resolveHandle failed, trying resolve_handle:", e)
+                actor = client.com.atproto.identity.resolve_handle({"handle": handle})
+            if not actor or "did" not in actor:
+                print("Unable to resolve Blue Sky handle for:", handle)
+                return {}
+            did = actor["did"]
+            checkpoints.update("blue_sky", handle, did=did)
+
+        seen = state.get("newestUri")
+        records, cursor, complete = [], None, True
+        for _ in range(MAX_PAGES if seen else 1):
+            params = {"repo": did, "collection": "app.bsky.feed.post", "limit": PAGE_SIZE}
+            if cursor:
+                params["cursor"] = cursor
+            page = client.com.atproto.repo.listRecords(params)
+            page_records = list(page["records"] or [])
+            uris = [record["uri"] for record in page_records]
+            if seen in uris:
+                records.extend(page_records[:uris.index(seen)])
+                break
+            records.extend(page_records)
+            cursor = page["cursor"] if "cursor" in page else None
+            if not cursor:
+                break
+        else:
+            # Out of pages before reaching newestUri: keep it so the gap is fetched next time.
+            if seen:
+                complete = False
+        if records and complete:
+            checkpoints.update("blue_sky", handle, newestUri=records[0]["uri"])
+        return {"records": records} if records else {}
     except Exception as e:
         print("Error querying Blue Sky posts:", e)
         return {}
 
 
 # Truth Social Query Functions
-def query_truthsocial_posts(handle: str) -> dict:
+TRUTH_SOCIAL_FIELDS = ("id", "created_at", "content", "url")
+
+def _status_key(status_id) -> tuple:
+    # Truth Social ids are numeric strings that grow over time.
+    status_id = str(status_id or "")
+    return (len(status_id), status_id) if status_id.isdigit() else (0, "")
+
+def stream_truthsocial_posts(handle: str):
     """
-    Query posts from Truth Social for the given handle.
-    Calls the Truthbrush CLI and parses its output.
+    Read `truthbrush statuses` one line at a time (newest first) and store
+    the statuses in small batches as they arrive, so memory stays bounded
+    however long the account history is. Returns the number of statuses
+    read, or None when there was nothing new.
     """
-    try:
-        result = subprocess.run(["truthbrush", "statuses", handle],
-                                capture_output=True, text=True)
-        if result.returncode != 0:
-            print("Error querying Truth Social posts:", result.stderr)
-            return {}
-        raw_output = result.stdout
-        if raw_output.lstrip().startswith("<!DOCTYPE html>"):
-            print("Received HTML response (likely rate-limited or access denied) from Truth Social.")
-            return {}
+    since = checkpoints.get("truth_social", handle).get("newestId")
+    count, newest, stopped, batch = 0, None, False, []
+    with tempfile.TemporaryFile(mode="w+") as stderr:
         try:
-            parsed = json.loads(raw_output)
-        except json.JSONDecodeError:
-            parsed = parse_ndjson(raw_output)
-        if isinstance(parsed, list):
-            return {"posts": parsed}
-        else:
-            return parsed
-    except Exception as e:
-        print("Error executing truthbrush command:", e)
-        return {}
+            proc = subprocess.Popen(["truthbrush", "statuses", handle],
+                                    stdout=subprocess.PIPE, stderr=stderr, text=True)
+        except Exception as e:
+            print("Error executing truthbrush command:", e)
+            return None
+        for line in proc.stdout:
+            line = line.strip()
+            if not line:
+                continue
+            if count == 0 and line.startswith("<!DOCTYPE html>"):
+                print("Received HTML response (likely rate-limited or access denied) from Truth Social.")
+                stopped = True
+                break
+            try:
+                status = json.loads(line)
+            except json.JSONDecodeError as e:
+                print("Error decoding line:", line[:200], e)
+                continue
+            if not isinstance(status, dict):
+                continue
+            if since and _status_key(status.get("id")) <= _status_key(since):
+                stopped = True
+                break
+            slim = {field: status.get(field) for field in TRUTH_SOCIAL_FIELDS}
+            slim["account"] = {"username": (status.get("account") or {}).get("username")}
+            batch.append(slim)
+            newest = newest or str(status.get("id"))
+            count += 1
+            if len(batch) >= STREAM_BATCH:
+                post_store.append("truth_social", handle, batch)
+                batch = []
+        if batch:
+            post_store.append("truth_social", handle, batch)
+        if stopped:
+            proc.terminate()
+        proc.stdout.close()
+        returncode = proc.wait()
+        if returncode != 0 and not stopped:
+            stderr.seek(0)
+            print("Error querying Truth Social posts:", stderr.read())
+    if count == 0:
+        return None
+    print(f"Stored {count} Truth Social posts for '{handle}'.")
+    # Only a complete read (or one that reached the checkpoint) may move it forward.
+    if stopped or returncode == 0:
+        checkpoints.update("truth_social", handle, newestId=newest)
+    return count
 
 # Facebook Query Functions
 def query_facebook_posts(page_id: str) -> dict:
@@ -144,12 +319,34 @@ def query_facebook_posts(page_id: str) -> dict:
     if not fb_token:
         print("Error: FACEBOOK_ACCESS_TOKEN environment variable not set.")
         return {}
-    url = f"https://graph.facebook.com/v11.0/{page_id}/posts?access_token={fb_token}"
-    resp = requests.get(url)
-    if resp.status_code != 200:
-        print("Error retrieving Facebook posts:", resp.text)
-        return {}
-    return resp.json()
+    state = checkpoints.get("facebook", page_id)
+    url = f"https://graph.facebook.com/v11.0/{page_id}/posts"
+    params = {"access_token": fb_token, "limit": PAGE_SIZE}
+    if state.get("since"):
+        params["since"] = state["since"]
+    posts, complete = [], True
+    # paging.next already carries the token and query, so later pages take no params.
+    for _ in range(MAX_PAGES if "since" in params else 1):
+        resp = get_with_backoff(url, params=params)
+        if resp.status_code != 200:
+            print("Error retrieving Facebook posts:", resp.text)
+            complete = False
+            break
+        page = resp.json()
+        posts.extend(page.get("data", []))
+        url, params = page.get("paging", {}).get("next"), None
+        if not url:
+            break
+    else:
+        # Out of pages before reaching `since`: keep it so the gap is fetched next time.
+        if state.get("since"):
+            complete = False
+    times = [p["created_time"] for p in posts if p.get("created_time")]
+    if times and complete:
+        newest = max(datetime.strptime(t, "%Y-%m-%dT%H:%M:%S%z").timestamp() for t in times)
+        # `since` is inclusive, so step past the newest post already saved.
+        checkpoints.update("facebook", page_id, since=int(newest) + 1)
+    return {"data": posts} if posts else {}
 
 # Threads Query Functions (Placeholder)
 def query_threads_posts(username: str) -> dict:
@@ -157,17 +354,69 @@ def query_threads_posts(username: str) -> dict:
     return {}
 
 
-# Helper: Save Posts to File (in platform-specific folder)
+# Helper: Save Posts to the post store (partitioned by platform/handle/month)
 def save_posts_to_file(platform: str, handle: str, posts: dict):
-    timestamp = time.strftime("%Y%m%d-%H%M%S")
-    folder = PLATFORM_FOLDERS.get(platform.lower(), BASE_POSTS_DIR)
-    filename = os.path.join(folder, f"{handle}_{timestamp}.json")
+    platform = platform.lower()
+    items = posts.get(POST_LISTS.get(platform), []) if isinstance(posts, dict) else []
+    if not items:
+        print("No posts to save.")
+        return
     try:
-        with open(filename, "w") as outfile:
-            json.dump(posts, outfile, indent=2)
-        print(f"Posts saved to file: {filename}")
+        added = post_store.append(platform, handle, items)
+        print(f"Stored {added} new posts ({len(items) - added} already stored) under {PLATFORM_FOLDERS[platform]}")
     except Exception as e:
-        print("Error saving posts to file:", e)
+        print("Error saving posts:", e)
+
+# Bulk Collection
+BULK_QUERIES = {
+    "twitter": query_x_posts,
+    "blue_sky": query_bluesky_posts,
+    "truth_social": stream_truthsocial_posts,
+}
+
+def tracked_accounts(path: str) -> list:
+    """(platform, handle) for every tracked account; twitter keys are the usernames."""
+    with open(path, "r", encoding="utf-8") as f:
+        tracked = json.load(f)
+    accounts = []
+    for platform in BULK_QUERIES:
+        for name, value in tracked.get(platform, {}).items():
+            accounts.append((platform, value if isinstance(value, str) else name))
+    return accounts
+
+def collect_account(platform: str, handle: str) -> bool:
+    """Fetch and save one account's new posts; True if there were any."""
+    if platform == "truth_social":
+        # Streamed straight to disk rather than returned.
+        return bool(stream_truthsocial_posts(handle))
+    posts = BULK_QUERIES[platform](handle)
+    if posts:
+        save_posts_to_file(platform, handle, posts)
+    return bool(posts)
+
+def collect_tracked(path: str = TRACKED_PEOPLE_PATH, workers: int = BULK_WORKERS):
+    """
+    Query every tracked account at once on a bounded thread pool. HTTP calls
+    and truthbrush subprocesses overlap, so the run takes about as long as
+    the slowest account.
+    """
+    accounts = tracked_accounts(path)
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(collect_account, platform, handle): (platform, handle)
+            for platform, handle in accounts
+        }
+        for future in as_completed(futures):
+            platform, handle = futures[future]
+            try:
+                found = future.result()
+            except Exception as e:
+                print(f"Error querying {platform} posts for '{handle}':", e)
+                found = True
+            if not found:
+                print(f"No new {platform} posts for '{handle}'.")
+    print(f"Collected {len(accounts)} accounts in {time.perf_counter() - started:.1f}s")
 
 # CLI Menu (Continuous Loop)
 def main():
@@ -202,10 +451,8 @@ def main():
         elif choice == "3":
             handle = input("Enter the Truth Social handle: ").strip()
             print(f"\nQuerying Truth Social posts for '{handle}'...")
-            posts = query_truthsocial_posts(handle)
-            print("Posts from Truth Social:")
-            print(json.dumps(posts, indent=2))
-            save_posts_to_file("truth_social", handle, posts)
+            if not stream_truthsocial_posts(handle):
+                print("No new Truth Social posts.")
         elif choice == "4":
             page_id = input("Enter the Facebook page ID (or username): ").strip()
             print(f"\nQuerying Facebook posts for '{page_id}'...")
@@ -229,4 +476,13 @@ def main():
             print("Invalid choice. Please select a valid option.")
 
 if __name__ == "__main__":
-    main()
+    if len(sys.argv) > 1:
+        parser = argparse.ArgumentParser(description="Collect posts from tracked accounts.")
+        parser.add_argument("--bulk", action="store_true", required=True,
+                            help="query every account in tracked_people.json concurrently")
+        parser.add_argument("--tracked", default=TRACKED_PEOPLE_PATH)
+        parser.add_argument("--workers", type=int, default=BULK_WORKERS)
+        args = parser.parse_args()
+        collect_tracked(args.tracked, args.workers)
+    else:
+        main()
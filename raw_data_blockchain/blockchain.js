@@ -1,5 +1,11 @@
 const crypto = require("crypto");
 const fs = require("fs");
+const {
+  ChainLog,
+  logPathFor,
+  firstUncheckedBlock,
+  writeCheckpoint,
+} = require("../common/chainlog");
 
 class Block {
   constructor(index, timestamp, data, previousHash = "", nonce = 0) {
@@ -11,24 +17,39 @@ class Block {
     this.hash = this.computeHash();
   }
 
-  computeHash() {
+  // The hashed JSON up to the nonce value; the nonce is always serialised last.
+  hashPrefix() {
     const blockContent = JSON.stringify({
       index: this.index,
       timestamp: this.timestamp,
       data: this.data,
       previousHash: this.previousHash,
-      nonce: this.nonce,
+      nonce: 0,
     });
-    return crypto.createHash("sha256").update(blockContent).digest("hex");
+    return blockContent.slice(0, -"0}".length);
+  }
+
+  computeHash() {
+    return crypto
+      .createHash("sha256")
+      .update(`${this.hashPrefix()}${this.nonce}}`)
+      .digest("hex");
   }
 
   mineBlock(difficulty) {
     const target = Array(difficulty + 1).join("0");
+    // Hash the fixed prefix once and only feed the nonce to a copy per try.
+    const midstate = crypto.createHash("sha256").update(this.hashPrefix());
+    const startNonce = this.nonce;
+    const started = Date.now();
     while (this.hash.substring(0, difficulty) !== target) {
       this.nonce++;
-      this.hash = this.computeHash();
+      this.hash = midstate.copy().update(`${this.nonce}}`).digest("hex");
     }
-    console.log(`Block mined (index ${this.index}): ${this.hash}`);
+    const rate = Math.round(
+      ((this.nonce - startNonce + 1) * 1000) / Math.max(1, Date.now() - started)
+    );
+    console.log(`Block mined (index ${this.index}): ${this.hash} (${rate} H/s)`);
   }
 }
 
@@ -36,6 +57,8 @@ class Blockchain {
   constructor(difficulty = 2, chainFilePath = "./blockchain.json") {
     this.difficulty = difficulty;
     this.chainFilePath = chainFilePath;
+    this.logPath = logPathFor(chainFilePath);
+    this.log = null;
     this.chain = [];
     this.loadChain();
   }
@@ -54,10 +77,23 @@ class Blockchain {
   }
 
   loadChain() {
+    if (ChainLog.exists(this.logPath)) {
+      try {
+        this.log = new ChainLog(this.logPath).open();
+        this.chain = this.log.readAll();
+        return;
+      } catch (err) {
+        console.error("Error loading blockchain log, trying JSON:", err);
+        if (this.log) this.log.close();
+        this.log = null;
+      }
+    }
     if (fs.existsSync(this.chainFilePath)) {
       try {
         const data = fs.readFileSync(this.chainFilePath);
         this.chain = JSON.parse(data);
+        // One-time conversion; from here on blocks are appended to the log.
+        this.saveChain();
       } catch (err) {
         console.error("Error loading blockchain from file:", err);
         this.chain = [this.createGenesisBlock()];
@@ -69,8 +105,31 @@ class Blockchain {
     }
   }
 
+  // Appends the blocks the log has not seen yet. A chain that was replaced
+  // rather than extended (different tip at the log's height) is rewritten.
   saveChain() {
-    fs.writeFileSync(this.chainFilePath, JSON.stringify(this.chain, null, 2));
+    const log = this.log;
+    const extended =
+      log &&
+      log.length <= this.chain.length &&
+      (log.length === 0 ||
+        log.hashAt(log.length - 1) === this.chain[log.length - 1].hash);
+    if (extended) {
+      log.extend(this.chain.slice(log.length));
+      return;
+    }
+    if (log) log.close();
+    this.log = ChainLog.create(this.logPath, this.chain);
+  }
+
+  // What /chain serves; the open log and its paths stay out of responses.
+  toJSON() {
+    return { difficulty: this.difficulty, chain: this.chain };
+  }
+
+  // Human-readable copy of the chain for tools that still read the JSON file.
+  exportJSON(filePath = this.chainFilePath) {
+    fs.writeFileSync(filePath, JSON.stringify(this.chain, null, 2));
   }
 
   getLatestBlock() {
@@ -91,8 +150,10 @@ class Blockchain {
     return newBlock;
   }
 
-  isChainValid() {
-    for (let i = 1; i < this.chain.length; i++) {
+  // Pass full = true to ignore the checkpoint and rescan from genesis.
+  isChainValid(full = false) {
+    const start = full ? 1 : firstUncheckedBlock(this.chainFilePath, this.chain);
+    for (let i = start; i < this.chain.length; i++) {
       const current = this.chain[i];
       const previous = this.chain[i - 1];
       const recalculatedHash = crypto
@@ -114,6 +175,7 @@ class Blockchain {
         return false;
       }
     }
+    writeCheckpoint(this.chainFilePath, this.chain);
     return true;
   }
 }
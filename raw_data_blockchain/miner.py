@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Proof-of-work search over a serialised block split around its nonce.
+
+The bytes before the nonce are fixed, so they are hashed once and every
+candidate only costs a copy of that sha256 midstate plus the nonce digits and
+the short suffix. Above POOL_MIN_DIFFICULTY the nonce space is striped across
+a process pool; the first worker to find a valid nonce sets a shared event and
+the others stop at their next batch boundary.
+
+    python3 miner.py --benchmark [--difficulty 5] [--workers 4]
+"""
+import argparse
+import hashlib
+import multiprocessing as mp
+import os
+import time
+from collections import namedtuple
+
+BATCH = 4096              # nonces a worker tries between cancellation checks
+POOL_MIN_DIFFICULTY = 4   # easier targets are found faster than a pool starts
+
+
+class MiningResult(namedtuple("MiningResult", "nonce hash hashes seconds")):
+    @property
+    def rate(self):
+        """Hashes per second."""
+        return self.hashes / self.seconds if self.seconds > 0 else float(self.hashes)
+
+
+def meets_difficulty(difficulty):
+    """Return a check for digests whose hex form starts with `difficulty` zeros."""
+    full, half = divmod(difficulty, 2)
+    zeros = bytes(full)
+    if half:
+        return lambda d: d[:full] == zeros and d[full] < 0x10
+    return lambda d: d[:full] == zeros
+
+
+def _search(prefix, suffix, difficulty, first, step, found, limit=None):
+    """Try first, first + step, ... until a hit, `found` is set or `limit` nonces."""
+    midstate = hashlib.sha256(prefix)
+    ok = meets_difficulty(difficulty)
+    nonce, hashes = first, 0
+    while not (found is not None and found.is_set()):
+        for _ in range(BATCH):
+            h = midstate.copy()
+            h.update(b"%d" % nonce + suffix)
+            if ok(h.digest()):
+                return nonce, h.hexdigest(), hashes + 1
+            nonce += step
+            hashes += 1
+        if limit is not None and hashes >= limit:
+            break
+    return None, None, hashes
+
+
+def _worker(prefix, suffix, difficulty, first, step, found, results):
+    nonce, digest, hashes = _search(prefix, suffix, difficulty, first, step, found)
+    if nonce is not None:
+        found.set()
+    results.put((nonce, digest, hashes))
+
+
+def available_cpus():
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def mine(prefix, suffix, difficulty, start=0, workers=None):
+    """
+    Find a nonce >= start such that sha256(prefix + str(nonce) + suffix) has
+    `difficulty` leading hex zeros. prefix and suffix are bytes.
+    """
+    started = time.perf_counter()
+    workers = workers or available_cpus()
+    if workers == 1 or difficulty < POOL_MIN_DIFFICULTY:
+        nonce, digest, hashes = _search(prefix, suffix, difficulty, start, 1, None)
+        return MiningResult(nonce, digest, hashes, time.perf_counter() - started)
+
+    found = mp.Event()
+    results = mp.Queue()
+    procs = [
+        mp.Process(target=_worker, args=(prefix, suffix, difficulty, start + i, workers, found, results), daemon=True)
+        for i in range(workers)
+    ]
+    for p in procs:
+        p.start()
+    # Every worker reports once: the winner with its nonce, the rest after cancelling.
+    best, total = None, 0
+    for _ in procs:
+        nonce, digest, hashes = results.get()
+        total += hashes
+        if nonce is not None and (best is None or nonce < best[0]):
+            best = (nonce, digest)
+    for p in procs:
+        p.join()
+    return MiningResult(best[0], best[1], total, time.perf_counter() - started)
+
+
+def benchmark(seconds=2.0):
+    """Single-core midstate hash rate, measured for about `seconds`."""
+    prefix, suffix = b'{"index":1,"timestamp":0,"data":{},"previousHash":"","nonce":', b"}"
+    hashes, started = 0, time.perf_counter()
+    while time.perf_counter() - started < seconds:
+        # An impossible target keeps the search running for exactly `limit` nonces.
+        hashes += _search(prefix, suffix, 64, hashes, 1, None, limit=BATCH * 16)[2]
+    return hashes / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure proof-of-work mining speed.")
+    parser.add_argument("--benchmark", action="store_true", help="report single-core H/s")
+    parser.add_argument("--difficulty", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.benchmark:
+        rate = benchmark()
+        print(f"{rate:,.0f} H/s per core; difficulty {args.difficulty} needs ~{16 ** args.difficulty:,} hashes")
+    prefix = b'{"index":1,"timestamp":%d,"data":{},"previousHash":"","nonce":' % time.time_ns()
+    result = mine(prefix, b"}", args.difficulty, workers=args.workers)
+    print(f"nonce {result.nonce} -> {result.hash} in {result.seconds:.2f}s ({result.rate:,.0f} H/s)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Persisted (platform, poster) -> block positions index over the raw chain.
+
+verify_quote used to load the whole chain and scan every block per request
+to collect a poster's posts. The index maps each lowercased (platform,
+poster) pair to the positions of its blocks and is saved as JSON, so a
+lookup is a dictionary hit and startup reads the index instead of the chain.
+
+Posts are read on demand from blockchain.log by position (memory-mapped, see
+chain_log.py) and kept per poster. When only blockchain.json exists, the
+chain is loaded instead, as before. Appended blocks are indexed incrementally;
+a chain whose tip no longer matches the saved one is re-indexed from scratch.
+state()/restore() let verify_quote's snapshot stand in for the saved JSON.
+"""
+import bisect
+import json
+import os
+
+from common.chain_log import ChainLog, chain_mtime, load_chain, log_path_for
+
+
+class PosterIndex:
+    def __init__(self, chain_path, index_path):
+        self.chain_path = chain_path
+        self.index_path = index_path
+        self.height = 0
+        self.tip = None
+        self._positions = {}  # platform -> poster -> [block positions]
+        self._posts = {}      # (platform, poster) -> [post data], filled on first lookup
+        self._source = None   # open ChainLog, or the loaded chain when there is no log
+        self._mtime = None
+        self._loaded = False
+
+    @property
+    def version(self):
+        self.refresh()
+        return f"{self.height}:{self.tip or ''}"
+
+    def refresh(self):
+        try:
+            mtime = chain_mtime(self.chain_path)
+        except OSError:
+            return
+        if mtime == self._mtime:
+            return
+        if not self._loaded:
+            self._load_saved()
+            self._loaded = True
+
+        log_path = log_path_for(self.chain_path)
+        if os.path.exists(log_path + ".idx"):
+            if not isinstance(self._source, ChainLog):
+                self._source = ChainLog(log_path)
+            self._source.refresh()
+        else:
+            self._source = load_chain(self.chain_path)
+
+        # Blocks are only ever appended; anything else means re-indexing.
+        if not self._extends(self.height, self.tip):
+            self._positions, self.height, self.tip = {}, 0, None
+        start = self.height
+        for position in range(start, len(self._source)):
+            block = self._source[position]
+            data = block.get("data") or {}
+            platform = (data.get("platform") or "").lower()
+            poster = (data.get("poster") or "").lower()
+            self._positions.setdefault(platform, {}).setdefault(poster, []).append(position)
+            self._posts.pop((platform, poster), None)
+            self.tip = block.get("hash")
+        self.height = len(self._source)
+        if start == 0:
+            self._posts = {}
+        if self.height != start:
+            self._save()
+        self._mtime = mtime
+
+    def _extends(self, height, tip):
+        """Whether the chain still starts with the `height` blocks ending in `tip`."""
+        if height > len(self._source):
+            return False
+        if isinstance(self._source, ChainLog):
+            return not height or self._source.entry(height - 1)[3] == tip
+        return not height or self._source[height - 1].get("hash") == tip
+
+    def _load_saved(self):
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                saved = json.load(f)
+            self.height, self.tip, self._positions = saved["height"], saved["tip"], saved["posters"]
+        except (OSError, ValueError, KeyError):
+            self.height, self.tip, self._positions = 0, None, {}
+
+    def state(self):
+        """What _save() writes, for verify_quote's snapshot."""
+        self.refresh()
+        return {"height": self.height, "tip": self.tip, "posters": self._positions}
+
+    def restore(self, state):
+        """Start from a state() instead of the saved index; later blocks are indexed as usual."""
+        self.height, self.tip, self._positions = state["height"], state["tip"], state["posters"]
+        self._posts, self._source, self._mtime = {}, None, None
+        self._loaded = True
+
+    def _save(self):
+        tmp = self.index_path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"height": self.height, "tip": self.tip, "posters": self._positions}, f)
+        os.replace(tmp, self.index_path)
+
+    def posters(self, platform):
+        self.refresh()
+        return list(self._positions.get(platform.lower(), {}))
+
+    def added_since(self, platform, version):
+        """
+        {poster: n} for posters on platform whose last n posts were appended
+        after `version`; None if the chain no longer extends that version.
+        """
+        self.refresh()
+        height, _, tip = (version or "").partition(":")
+        if not height.isdigit() or self._source is None or not self._extends(int(height), tip or None):
+            return None
+        added = {}
+        for poster, positions in self._positions.get(platform.lower(), {}).items():
+            n = len(positions) - bisect.bisect_left(positions, int(height))
+            if n:
+                added[poster] = n
+        return added
+
+    def candidates(self, platform, poster):
+        """The data of every block posted by poster on platform, in chain order."""
+        self.refresh()
+        key = (platform.lower(), poster.lower())
+        posts = self._posts.get(key)
+        if posts is None:
+            positions = self._positions.get(key[0], {}).get(key[1], [])
+            posts = self._posts[key] = [self._source[i].get("data") or {} for i in positions]
+        return posts
+
+    def positions(self, platform, poster):
+        """Chain positions of the blocks candidates() returns, in the same order."""
+        self.refresh()
+        return self._positions.get(platform.lower(), {}).get(poster.lower(), [])
+
+    def blocks_at(self, positions):
+        """{position: block data} for the positions the chain has."""
+        self.refresh()
+        if self._source is None:
+            return {}
+        return {i: self._source[i].get("data") or {} for i in positions if 0 <= i < len(self._source)}
+
+
+class ChainCorpus:
+    """One platform's posts on the chain, by block position, for common/post_index.py."""
+
+    def __init__(self, poster_index, platform):
+        self.poster_index = poster_index
+        self.platform = platform
+
+    def version(self):
+        return self.poster_index.version
+
+    def added_since(self, version):
+        if version is None:
+            return -1, self.poster_index.posters(self.platform)
+        added = self.poster_index.added_since(self.platform, version)
+        if added is None:
+            return None
+        # Positions below the version's height were there already.
+        return int(version.partition(":")[0]) - 1, list(added)
+
+    def candidates(self, poster):
+        return (self.poster_index.candidates(self.platform, poster),
+                self.poster_index.positions(self.platform, poster))
+
+    def posts(self, ids):
+        return {
+            i: {"poster": d.get("poster"), "post_id": d.get("post_id"),
+                "content": d.get("content"), "tweetUrl": d.get("tweetUrl")}
+            for i, d in self.poster_index.blocks_at(ids).items()
+        }
@@ -1,14 +1,22 @@
 const sqlite3 = require("sqlite3").verbose();
-const fs = require("fs");
+const { loadChain } = require("../../common/chainlog");
+const { migrateQuotesDb } = require("../../common/quotes_db");
 
-const raw = fs.readFileSync("./blockchain.json", "utf8");
-const chain = JSON.parse(raw);
+// Reads ./blockchain.json, or the chain JSON or .log given as the argument.
+// server.js appends to ../blockchain.log and no longer rewrites its JSON, so
+// import the live chain with `node import-blockchain.js ../blockchain.log`.
+const chainPath = (process.argv[2] || "./blockchain.json").replace(/\.log$/, ".json");
+const chain = loadChain(chainPath);
 
 const dbFile = "./quotes.db";
 const db = new sqlite3.Database(dbFile);
 
 db.serialize(() => {
+  // Start from the original schema; the migration below re-adds poster_key
+  // and quotes_fts, whose user_version would otherwise claim they are there.
+  db.run("DROP TABLE IF EXISTS quotes_fts");
   db.run("DROP TABLE IF EXISTS quotes");
+  db.run("PRAGMA user_version = 0");
   db.run(`
     CREATE TABLE quotes (
       id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -34,6 +42,6 @@ db.serialize(() => {
 
   stmt.finalize(() => {
     console.log(`Imported ${chain.length} records into 'quotes' table.`);
-    db.close();
+    db.close(() => migrateQuotesDb(dbFile));
   });
 });
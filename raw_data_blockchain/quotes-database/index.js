@@ -2,6 +2,7 @@
 const express = require("express");
 const sqlite3 = require("sqlite3").verbose();
 const cors = require("cors");
+const { SCHEMA_VERSION, migrateQuotesDb, quoteFilters } = require("../../common/quotes_db");
 
 const app = express();
 const PORT = process.env.PORT || 4000;
@@ -14,8 +15,21 @@ app.use(
 
 app.use(express.json());
 
+// A no-op once done (import-blockchain.js migrates too). A database that
+// cannot be migrated (duplicate posts) is still served, by table scans.
+try {
+  migrateQuotesDb("./quotes.db");
+} catch (err) {
+  console.warn(`quotes.db not migrated, searches use table scans: ${err.message}`);
+}
+
 const db = new sqlite3.Database("./quotes.db", sqlite3.OPEN_READONLY);
 
+let indexed = false;
+db.get("PRAGMA user_version", (err, row) => {
+  indexed = !err && row.user_version >= SCHEMA_VERSION;
+});
+
 app.get("/api/quotes", (req, res) => {
   let sql = `
     SELECT
@@ -28,17 +42,8 @@ app.get("/api/quotes", (req, res) => {
       tweet_url
     FROM quotes
   `;
-  const params = [];
-
-  if (req.query.search) {
-    sql += " WHERE content LIKE ?";
-    params.push(`%${req.query.search}%`);
-  }
-
-  if (req.query.author) {
-    sql += params.length ? " AND poster = ?" : " WHERE poster = ?";
-    params.push(req.query.author);
-  }
+  const { where, params } = quoteFilters(req.query, indexed);
+  if (where.length) sql += ` WHERE ${where.join(" AND ")}`;
 
   db.all(sql, params, (err, rows) => {
     if (err) {
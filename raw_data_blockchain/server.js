@@ -66,6 +66,81 @@ if (fs.existsSync(postsFolder)) {
   });
 }
 
+// verify_server.py keeps the model warm; verify_quote.py is only spawned
+// directly when that service is not running.
+const verifierUrl = process.env.VERIFIER_URL || "http://127.0.0.1:3101";
+
+function spawnVerifier(input, callback) {
+  const inputStr = JSON.stringify(input);
+
+  exec(`python3 verify_quote.py '${inputStr}'`, (error, stdout, stderr) => {
+    if (error) return callback(error);
+    if (stderr) {
+      console.error(`Python stderr: ${stderr}`);
+    }
+    let result;
+    try {
+      result = JSON.parse(stdout);
+    } catch (parseErr) {
+      return callback(new Error("Invalid response from verification script"));
+    }
+    callback(null, result);
+  });
+}
+
+// Batches go through stdin so a page of tweets never hits argv length limits.
+function spawnBatchVerifier(items, callback) {
+  const child = exec("python3 verify_quote.py -", (error, stdout, stderr) => {
+    if (error) return callback(error);
+    if (stderr) {
+      console.error(`Python stderr: ${stderr}`);
+    }
+    let results;
+    try {
+      results = JSON.parse(stdout);
+    } catch (parseErr) {
+      return callback(new Error("Invalid response from verification script"));
+    }
+    callback(null, { results });
+  });
+  child.stdin.end(JSON.stringify(items));
+}
+
+function postToVerifier(route, body, callback, fallback) {
+  fetch(`${verifierUrl}${route}`, {
+    method: "POST",
+    headers: { "Content-Type": "application/json" },
+    body: JSON.stringify(body),
+  }).then(
+    (response) =>
+      response.json().then(
+        (result) =>
+          response.ok
+            ? callback(null, result)
+            : callback(new Error(result.error || response.statusText)),
+        () => callback(new Error("Invalid response from verification service"))
+      ),
+    (err) => {
+      console.warn(
+        `Verifier service unreachable (${err.message}), spawning verify_quote.py`
+      );
+      fallback();
+    }
+  );
+}
+
+function runVerifier(input, callback) {
+  postToVerifier("/verify", input, callback, () =>
+    spawnVerifier(input, callback)
+  );
+}
+
+function runBatchVerifier(items, callback) {
+  postToVerifier("/verifyBatch", { items }, callback, () =>
+    spawnBatchVerifier(items, callback)
+  );
+}
+
 app.post("/verify", (req, res) => {
   const { tweetId, content, poster, tweetUrl } = req.body;
   console.log("Received verification request:", {
@@ -76,27 +151,38 @@ app.post("/verify", (req, res) => {
   });
 
   const input = { tweetId, content, poster, tweetUrl };
-  const inputStr = JSON.stringify(input);
 
-  exec(`python3 verify_quote.py '${inputStr}'`, (error, stdout, stderr) => {
+  runVerifier(input, (error, result) => {
     if (error) {
       console.error(`Error executing python script: ${error}`);
       res.status(500).json({ verified: false, error: error.message });
       return;
     }
-    if (stderr) {
-      console.error(`Python stderr: ${stderr}`);
-    }
-    try {
-      const result = JSON.parse(stdout);
-      console.log("Verification result from Python:", result);
-      res.json(result);
-    } catch (parseErr) {
-      res.status(500).json({
-        verified: false,
-        error: "Invalid response from verification script",
-      });
+    console.log("Verification result from Python:", result);
+    res.json(result);
+  });
+});
+
+// Verifies a page of tweets in one round trip: { items: [{ tweetId, content }] }
+// -> { results: [...] }, in the same order.
+app.post("/verifyBatch", (req, res) => {
+  if (!Array.isArray(req.body.items)) {
+    res.status(400).json({ error: "Expected { items: [...] }" });
+    return;
+  }
+  const items = req.body.items.map(({ tweetId, content }) => ({
+    tweetId,
+    content,
+  }));
+  console.log(`Received batch verification request (${items.length} items)`);
+
+  runBatchVerifier(items, (error, result) => {
+    if (error) {
+      console.error(`Error executing python script: ${error}`);
+      res.status(500).json({ error: error.message });
+      return;
     }
+    res.json(result);
   });
 });
 
@@ -110,25 +196,13 @@ app.post("/verifyHighlighted", (req, res) => {
   const { highlightedText } = req.body;
   console.log("Received highlighted text:", highlightedText);
   const input = { highlightedText };
-  const inputStr = JSON.stringify(input);
 
-  exec(`python3 verify_quote.py '${inputStr}'`, (error, stdout, stderr) => {
+  runVerifier(input, (error, result) => {
     if (error) {
       res.status(500).json({ verified: false, error: error.message });
       return;
     }
-    if (stderr) {
-      console.error(`Python stderr: ${stderr}`);
-    }
-    try {
-      const result = JSON.parse(stdout);
-      res.json(result);
-    } catch (parseErr) {
-      res.status(500).json({
-        verified: false,
-        error: "Invalid response from verification script",
-      });
-    }
+    res.json(result);
   });
 });
 
@@ -2,7 +2,9 @@ import hashlib
 import json
 import time
 import unittest
-from typing import List, Dict
+from typing import List, Dict, Optional, Tuple
+
+import miner
 
 # =======================================================
 # Simulated API Data: Tracked Social Media Users & Posts
@@ -69,20 +71,37 @@ class Block:
         block_string = json.dumps(block_content, sort_keys=True).encode()
         return hashlib.sha256(block_string).hexdigest()
 
+    def hash_parts(self) -> Tuple[bytes, bytes]:
+        """
+        Split the serialised block around the nonce value, so the miner can hash the fixed prefix once.
+        """
+        block_content = {
+            "index": self.index,
+            "timestamp": self.timestamp,
+            "data": self.data,
+            "previous_hash": self.previous_hash,
+            "nonce": 0
+        }
+        block_string = json.dumps(block_content, sort_keys=True)
+        # Keys are sorted, so only previous_hash and timestamp follow the top-level nonce.
+        split = block_string.rindex('"nonce": 0') + len('"nonce": ')
+        return block_string[:split].encode(), block_string[split + 1:].encode()
+
     def mine(self, difficulty: int):
         """
         Simple Proof-of-Work: find a nonce such that the hash starts with a given number of zeros.
+        The search itself runs in miner.py, across several processes for higher difficulties.
         """
-        prefix = '0' * difficulty
-        while not self.hash.startswith(prefix):
-            self.nonce += 1
-            self.hash = self.compute_hash()
-        print(f"Block mined: Index {self.index}, Nonce {self.nonce}, Hash {self.hash}")
+        prefix, suffix = self.hash_parts()
+        result = miner.mine(prefix, suffix, difficulty, start=self.nonce)
+        self.nonce, self.hash = result.nonce, result.hash
+        print(f"Block mined: Index {self.index}, Nonce {self.nonce}, Hash {self.hash} ({result.rate:,.0f} H/s)")
 
 class Blockchain:
     def __init__(self, difficulty: int = 2):
         self.chain: List[Block] = []
         self.difficulty = difficulty
+        self.checkpoint: Optional[Tuple[int, str]] = None  # (height, tip hash) of the last valid chain
         self.create_genesis_block()
 
     def create_genesis_block(self):
@@ -126,11 +145,17 @@ class Blockchain:
         self.chain.append(new_block)
         return True
 
-    def is_chain_valid(self) -> bool:
+    def is_chain_valid(self, since_checkpoint: bool = False) -> bool:
         """
         Verify the integrity of the blockchain by ensuring each block's hash is correct and that the blocks are properly linked.
+        With since_checkpoint, only blocks appended after the last successful validation are rehashed.
         """
-        for i in range(1, len(self.chain)):
+        start = 1
+        if since_checkpoint and self.checkpoint:
+            height, tip_hash = self.checkpoint
+            if height <= len(self.chain) and self.chain[height - 1].hash == tip_hash:
+                start = height
+        for i in range(start, len(self.chain)):
             current = self.chain[i]
             previous = self.chain[i - 1]
             if current.hash != current.compute_hash():
@@ -139,6 +164,7 @@ class Blockchain:
             if current.previous_hash != previous.hash:
                 print(f"Invalid previous hash link at block {current.index}")
                 return False
+        self.checkpoint = (len(self.chain), self.chain[-1].hash)
         return True
 
 # =======================================================
@@ -225,6 +251,21 @@ class TestSocialMediaBlockchain(unittest.TestCase):
         self.blockchain.chain[1].data["content"] = "Tampered content"
         self.assertFalse(self.blockchain.is_chain_valid())
 
+    def test_checkpointed_validation(self):
+        self.assertTrue(self.blockchain.is_chain_valid())
+        self.assertEqual(self.blockchain.checkpoint, (2, self.blockchain.chain[-1].hash))
+        self.blockchain.add_block({
+            "platform": "twitter",
+            "poster": "bob",
+            "post_id": "003",
+            "content": "Python for the win.",
+            "post_time": "2025-01-03T12:00:00Z"
+        })
+        # Only the block appended since the checkpoint is rehashed.
+        self.blockchain.chain[2].data["content"] = "Tampered content"
+        self.assertFalse(self.blockchain.is_chain_valid(since_checkpoint=True))
+        self.assertEqual(self.blockchain.checkpoint[0], 2)
+
 # =======================================================
 # Main entry point: run tests or interactive mode
 # =======================================================
@@ -2,8 +2,12 @@
 import json
 import os
 import re
+import sys
 from sentence_transformers import SentenceTransformer, util
 
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.chain_log import load_chain
+
 # Load a pre‑trained Sentence‑BERT model.
 model = SentenceTransformer('all-MiniLM-L6-v2')
 
@@ -19,7 +23,7 @@ TRACKED_PEOPLE_PATH = os.path.join(os.getcwd(), "tracked_people.json")
 
 # Load the testing inputs, blockchain, and tracked people.
 testing_inputs = load_json(TEST_INPUTS_PATH)
-blockchain = load_json(BLOCKCHAIN_PATH)
+blockchain = load_chain(BLOCKCHAIN_PATH)  # blockchain.log when server.js has written one
 tracked_people = load_json(TRACKED_PEOPLE_PATH)
 
 # --- Quote Extraction ---
@@ -2,20 +2,97 @@ import sys
 import json
 import os
 import re
-from sentence_transformers import SentenceTransformer, util
 
+# The modules every backend shares live in ../common.
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from common.alias_matcher import AliasMatcher
+from common.compressed import TIER
+from common.embedding_store import CHUNKING, ChunkStore, EmbeddingStore
+from common.encoder import configured as configured_encoder, load_encoder, parity
+from common import metrics, verification
+from common.post_index import PostIndex
+from common.result_cache import cache_key, from_env as result_cache_from_env
+from common.snapshot import write as write_snapshot
+from poster_index import ChainCorpus, PosterIndex
+
+# Data files sit next to this script unless VERIFY_DATA_DIR points elsewhere
+# (benchmark_verify.py runs the verifier against synthetic corpora that way).
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-BLOCKCHAIN_PATH = os.path.join(BASE_DIR, "blockchain.json")
-TRACKED_PEOPLE_PATH = os.path.join(BASE_DIR, "tracked_people.json")
+DATA_DIR = os.environ.get("VERIFY_DATA_DIR") or BASE_DIR
+BLOCKCHAIN_PATH = os.path.join(DATA_DIR, "blockchain.json")
+TRACKED_PEOPLE_PATH = os.path.join(DATA_DIR, "tracked_people.json")
+EMBEDDINGS_DIR = os.path.join(DATA_DIR, "embeddings")
+POST_INDEX_DIR = os.path.join(EMBEDDINGS_DIR, "index")
+CHUNKS_DIR     = os.path.join(EMBEDDINGS_DIR, "chunks")
+POSTER_INDEX_PATH = os.path.join(DATA_DIR, "poster_index.json")
+SNAPSHOT_PATH = os.path.join(DATA_DIR, "verifier.snapshot")
+
+SIM_THRESHOLD = 0.70  # Only consider matches with similarity >= 0.70.
+VERIFIED_THRESHOLD = 0.75
+INDEX_TOP_K = 10  # Matches returned when searching across every poster.
+MODEL_NAME = 'all-MiniLM-L6-v2'
+NO_CANDIDATES = "No original tweets found for poster {poster} in blockchain."
+
+# Loaded on first use; picks up blocks server.js appends while verify_server.py runs.
+poster_index = PosterIndex(BLOCKCHAIN_PATH, POSTER_INDEX_PATH)
+alias_matcher = AliasMatcher(TRACKED_PEOPLE_PATH, "twitter")
+
+model = None  # see load_model(); verbatim quotes are settled without it
 
-def load_json(filename):
-    with open(filename, "r", encoding="utf-8") as f:
-        return json.load(f)
+def load_model():
+    # torch or onnx, per VERIFY_ENCODER (see encoder.py); built on first use,
+    # since loading either costs time that invalid and verbatim inputs never need.
+    global model
+    if model is None:
+        with metrics.stage("model"):
+            model = load_encoder(model_name=MODEL_NAME)
+    return model
+
+def encode(texts):
+    return load_model().encode(texts)
+
+embedding_store = EmbeddingStore(EMBEDDINGS_DIR, encode, tier=TIER)
+chunk_store = ChunkStore(CHUNKS_DIR, encode, TIER)
+post_index = PostIndex(POST_INDEX_DIR, embedding_store, ChainCorpus(poster_index, "twitter"), TIER)
+result_cache = result_cache_from_env()
+prepared = False
+this = sys.modules[__name__]  # for the shared steps in common/verification.py
+
+def settings():
+    # A snapshot is only adopted by a verifier with the same model, encoder, tier and thresholds.
+    return {
+        "model": MODEL_NAME,
+        "simThreshold": SIM_THRESHOLD,
+        "verifiedThreshold": VERIFIED_THRESHOLD,
+        "indexTopK": INDEX_TOP_K,
+        "chunking": CHUNKING,
+        "encoder": configured_encoder(),
+        "tier": TIER,
+    }
 
-blockchain = load_json(BLOCKCHAIN_PATH)
-tracked_people = load_json(TRACKED_PEOPLE_PATH)
+def prepare():
+    """Start from the warm-state snapshot, once per process, if a matching one exists."""
+    snapshot = verification.prepare(this)
+    if snapshot is not None:
+        poster_index.restore(snapshot.blob("posterIndex"))
 
-model = SentenceTransformer('all-MiniLM-L6-v2')
+def build_snapshot():
+    # Encodes whatever the per-poster files are missing, then packs them into one file.
+    posters = {}
+    for poster, posts in corpus_posts().items():
+        if posts:
+            stem = EmbeddingStore.stem(poster)
+            embedding_store.matrix_for(poster, posts)
+            chunk_store.matrix_for(poster, posts)
+            posters[stem] = embedding_store.entry(poster)
+            posters[ChunkStore.SNAPSHOT_PREFIX + stem] = chunk_store.entry(poster)
+    summary = write_snapshot(
+        SNAPSHOT_PATH, posters, {"settings": settings()},
+        {"aliases": alias_matcher.state(), "posterIndex": poster_index.state()},
+    )
+    # The corpus-wide index comes from the same embeddings; build it now rather than on a request.
+    summary["indexedPosts"] = len(post_index.retrain(post_index.get(retrain=False)))
+    return summary
 
 def clean_text(text):
     text = text.replace("✅ Verified", "")
@@ -23,20 +100,44 @@ def clean_text(text):
     cleaned = "\n".join(line for line in lines if not re.fullmatch(r'\s*\d+\s*', line))
     return cleaned.strip()
 
+def corpus_posts():
+    return {
+        poster: poster_index.candidates("twitter", poster)
+        for poster in poster_index.posters("twitter")
+    }
+
+def data_version():
+    # Chain length and tip hash; changes whenever a block is appended.
+    return poster_index.version
+
+def search_all_posters(quote_embedding):
+    matches = []
+    for post, score in post_index.search(quote_embedding, INDEX_TOP_K):
+        if score >= SIM_THRESHOLD:
+            matches.append({
+                "tweetId": post["post_id"],
+                "similarity": score,
+                "tweetUrl": post["tweetUrl"],
+                "content": post["content"],
+                "poster": post["poster"]
+            })
+    return matches
+
+def poster_candidates(identified_poster):
+    return poster_index.candidates("twitter", identified_poster)
+
 def extract_quote_info(content):
     content_clean = clean_text(content)
-    tracked_twitter = tracked_people.get("twitter", {})
+    hit = alias_matcher.find(content_clean)
+    if not hit:
+        return None
+    canonical, start, end = hit
+    quoted_text = (content_clean[:start] + content_clean[end:]).strip()
+    quoted_text = re.sub(r'^(?:said\s+(?:that\s+)?[:]?[\s]*)', "", quoted_text, flags=re.IGNORECASE)
+    return {"quotedPoster": canonical, "quotedText": quoted_text}
 
-    for canonical, aliases in tracked_twitter.items():
-        for alias in aliases:
-            if alias.lower() in content_clean.lower():
-                pattern = re.compile(re.escape(alias), re.IGNORECASE)
-                quoted_text = pattern.sub("", content_clean, count=1).strip()
-                quoted_text = re.sub(r'^(?:said\s+(?:that\s+)?[:]?[\s]*)', "", quoted_text, flags=re.IGNORECASE)
-                return {"quotedPoster": canonical, "quotedText": quoted_text}
-    return None
-
-def verify_quote(input_data):
+def start_result(input_data):
+    """Build the empty result for one request and queue its quote for encoding."""
     tweetId = input_data.get("tweetId")
     content = input_data.get("content") or input_data.get("highlightedText", "")
     
@@ -48,35 +149,47 @@ def verify_quote(input_data):
     
     quote_info = extract_quote_info(content)
     if not quote_info:
-        result["error"] = "No tracked quote found in content."
-        return result
+        # No tracked alias in the text: look for the quote across every poster instead.
+        quoted_text = clean_text(content)
+        if not quoted_text:
+            result["error"] = "No tracked quote found in content."
+            return result, None
+        return result, (quoted_text, None)
 
     result["extractedQuoteInfo"] = quote_info
     identified_poster = quote_info.get("quotedPoster")
     if not identified_poster:
         result["error"] = "Could not identify quoted poster."
-        return result
+        return result, None
     result["identifiedPoster"] = identified_poster
+    return result, (quote_info["quotedText"], identified_poster)
 
-    candidates = []
-    for block in blockchain:
-        data = block.get("data", {})
-        if (data.get("platform", "").lower() == "twitter" and 
-            data.get("poster", "").lower() == identified_poster.lower()):
-            candidates.append(data)
-    if not candidates:
-        result["error"] = f"No original tweets found for poster {identified_poster} in blockchain."
-        return result
-
-    original_texts = [cand.get("content", "") for cand in candidates]
-    candidate_embeddings = model.encode(original_texts, convert_to_tensor=True)
-    
-    quote_embedding = model.encode(quote_info["quotedText"], convert_to_tensor=True)
-    
-    cosine_scores = util.cos_sim(candidate_embeddings, quote_embedding).squeeze(1)
-    cosine_scores = cosine_scores.cpu().tolist()  # Convert to list of floats.
-    
-    SIM_THRESHOLD = 0.70  # Only consider matches with similarity >= 0.70.
+def attribute_from_index(result, quoted_text, quote_embedding):
+    matches = search_all_posters(quote_embedding)
+    if not matches:
+        result["error"] = "No tracked quote found in content."
+        return
+    result["extractedQuoteInfo"] = {"quotedPoster": matches[0]["poster"], "quotedText": quoted_text}
+    result["identifiedPoster"] = matches[0]["poster"]
+    result["attributedBy"] = "index"
+    result["matches"] = matches
+    result["verified"] = matches[0]["similarity"] >= VERIFIED_THRESHOLD
+
+def apply_exact(result, candidates, hits):
+    result["matches"] = [
+        {
+            "tweetId": candidates[idx].get("post_id"),
+            "similarity": 1.0,
+            "tweetUrl": candidates[idx].get("tweetUrl"),
+            "content": candidates[idx].get("content")
+        }
+        for idx in hits
+    ]
+    result["matchedBy"] = "exact"
+    result["verified"] = True
+
+def apply_scores(result, candidates, cosine_scores, sources=None, spans=()):
+    """sources[i] >= 0 means candidate i's score came from chunk spans[sources[i]]."""
     matches = []
     for idx, score in enumerate(cosine_scores):
         if score >= SIM_THRESHOLD:
@@ -86,25 +199,99 @@ def verify_quote(input_data):
                 "tweetUrl": candidates[idx].get("tweetUrl"),
                 "content": candidates[idx].get("content")
             })
+            if sources and sources[idx] >= 0:
+                start, end = spans[sources[idx]]
+                matches[-1]["matchedSpan"] = {"start": start, "end": end, "text": candidates[idx].get("content")[start:end]}
     
     if matches:
         matches.sort(key=lambda x: x["similarity"], reverse=True)
         result["matches"] = matches
-        if matches[0]["similarity"] >= 0.75:
+        if matches[0]["similarity"] >= VERIFIED_THRESHOLD:
             result["verified"] = True
-    return result
+
+def verify_quotes(items):
+    """
+    Verify a list of {tweetId, content} inputs in one go. Verbatim quotes are
+    matched lexically; the rest are encoded in a single batched call and each
+    identified poster's candidates are scored against all of its quotes at
+    once. Results keep input order.
+    """
+    metrics.begin()
+    with metrics.stage("prepare"):
+        prepare()
+    with metrics.stage("version"):
+        version = data_version()
+    results, quotes, keys = [], [], []
+    for input_data in items:
+        with metrics.stage("extract"):
+            result, quote = start_result(input_data)
+        results.append(result)
+        if not quote:
+            continue
+        key = cache_key(quote[1], quote[0])
+        with metrics.stage("cache"):
+            cached = result_cache.get(key, version)
+        metrics.note(result, cache="miss" if cached is None else "hit")
+        if cached is not None:
+            result.update(cached)
+        else:
+            quotes.append((result,) + quote)
+            keys.append(key)
+
+    if quotes:
+        verification.score_quotes(this, quotes)
+    with metrics.stage("cache"):
+        for (result, _, _), key in zip(quotes, keys):
+            result_cache.put(key, version, {k: v for k, v in result.items() if k != "tweetId"})
+    metrics.finish(results)
+    return results
+
+def verify_quote(input_data):
+    return verify_quotes([input_data])[0]
+
+def parity_pairs(items):
+    """(quoted text, candidate content) for every candidate the inputs would be scored against."""
+    pairs = []
+    for item in items:
+        _, quote = start_result({"content": item.get("content") or item.get("text") or ""})
+        if quote and quote[1]:
+            pairs.extend((quote[0], c.get("content") or "") for c in poster_candidates(quote[1]))
+    return pairs
 
 def main():
     if len(sys.argv) < 2:
         print(json.dumps({"error": "No input provided"}))
         sys.exit(1)
+    # VERIFY_TIMINGS=1 adds a "timings" breakdown to the printed result.
+    metrics.startup()
+    if sys.argv[1] == "--build-index":
+        # The offline path: catch up, then retrain the lists here and now.
+        print(json.dumps({"indexedPosts": len(post_index.retrain(post_index.get(retrain=False)))}))
+        return
+    if sys.argv[1] == "--build-snapshot":
+        print(json.dumps(build_snapshot()))
+        return
+    if sys.argv[1] == "--parity":
+        # Inputs on stdin; the reference defaults to torch, the candidate is the ONNX export.
+        report = parity(
+            parity_pairs(json.load(sys.stdin)),
+            load_encoder(os.getenv("VERIFY_PARITY_REFERENCE") or "torch", MODEL_NAME),
+            load_encoder("onnx", MODEL_NAME),
+            (SIM_THRESHOLD, VERIFIED_THRESHOLD),
+        )
+        print(json.dumps(report))
+        sys.exit(0 if report["passed"] else 1)
     try:
-        input_str = sys.argv[1]
+        # "-" reads the input from stdin, which batch callers use to avoid argv limits.
+        input_str = sys.stdin.read() if sys.argv[1] == "-" else sys.argv[1]
         input_data = json.loads(input_str)
     except Exception as e:
         print(json.dumps({"error": "Invalid input JSON", "exception": str(e)}))
         sys.exit(1)
-    result = verify_quote(input_data)
+    if isinstance(input_data, list):
+        result = verify_quotes(input_data)
+    else:
+        result = verify_quote(input_data)
     print(json.dumps(result))
 
 if __name__ == "__main__":
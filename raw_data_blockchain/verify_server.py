@@ -0,0 +1,15 @@
+#!/usr/bin/env python3
+"""
+Warm verification service for this backend; the service itself is
+common/verify_server.py. Keeps verify_quote's model and blockchain in memory
+and answers /verify and /verifyBatch over local HTTP for server.js.
+
+    python3 verify_server.py [--host 127.0.0.1] [--port 3101] [--metrics]
+"""
+import verify_quote  # also puts the repository root, and so common/, on sys.path
+from common import verify_server
+
+DEFAULT_PORT = 3101
+
+if __name__ == "__main__":
+    verify_server.main(verify_quote, DEFAULT_PORT)
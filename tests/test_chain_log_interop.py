@@ -0,0 +1,153 @@
+"""
+chain_log.py and chainlog.js share one on-disk format: a log written by
+either side must read back the same on the other, a torn last record must be
+ignored by readers and repaired by the next writer, and a corrupt record must
+be refused rather than returned.
+"""
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+from common.chain_log import ChainLog, ChainLogError, load_chain
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NODE = shutil.which("node")
+
+pytestmark = pytest.mark.skipif(NODE is None, reason="needs node")
+
+# node <script> read <chain.json>       prints loadChain()
+# node <script> append <chain.json> <n> opens the log for append, adds block n, prints it all
+# node <script> create <chain.json> <n> writes blocks 0..n-1, prints n
+SCRIPT = """
+const { ChainLog, logPathFor, loadChain } = require(process.env.CHAINLOG);
+const block = (i) => ({ index: i, hash: i.toString(16).padStart(64, "0"), data: "blok ñ " + i });
+const [cmd, jsonPath, n] = process.argv.slice(2);
+try {
+  if (cmd === "read") {
+    console.log(JSON.stringify(loadChain(jsonPath)));
+  } else if (cmd === "append") {
+    const log = new ChainLog(logPathFor(jsonPath)).open();
+    log.append(block(Number(n)));
+    console.log(JSON.stringify(log.readAll()));
+    log.close();
+  } else {
+    const log = ChainLog.create(logPathFor(jsonPath), [...Array(Number(n)).keys()].map(block));
+    console.log(log.length);
+    log.close();
+  }
+} catch (err) {
+  console.log(JSON.stringify({ error: err.message }));
+}
+"""
+
+
+def block(i):
+    return {"index": i, "hash": format(i, "064x"), "data": f"blok ñ {i}"}
+
+
+@pytest.fixture
+def chain(tmp_path):
+    script = tmp_path / "chainlog_cli.js"
+    script.write_text(SCRIPT)
+    return tmp_path / "chain.json", script
+
+
+def node(script, *args):
+    out = subprocess.run([NODE, str(script), *map(str, args)], check=True, capture_output=True, text=True,
+                         env={**os.environ, "CHAINLOG": os.path.join(ROOT, "common", "chainlog.js")}).stdout
+    return json.loads(out)
+
+
+def write_python(json_path, n):
+    ChainLog.create(str(json_path.with_suffix(".log")), [block(i) for i in range(n)]).close()
+
+
+def tear_last_record(json_path):
+    """Cut the log inside its last record, as a crash mid-write would."""
+    log_path = json_path.with_suffix(".log")
+    os.truncate(log_path, os.path.getsize(log_path) - 5)
+
+
+def corrupt_last_record(json_path):
+    """Flip one payload byte of the last record, leaving its length and crc."""
+    log_path = json_path.with_suffix(".log")
+    with open(log_path, "r+b") as f:
+        f.seek(-2, os.SEEK_END)
+        byte = f.read(1)
+        f.seek(-2, os.SEEK_END)
+        f.write(bytes([byte[0] ^ 0x01]))
+
+
+def test_python_writes_node_reads(chain):
+    json_path, script = chain
+    write_python(json_path, 5)
+    assert node(script, "read", json_path) == [block(i) for i in range(5)]
+
+
+def test_node_writes_python_reads(chain):
+    json_path, script = chain
+    node(script, "create", json_path, 5)
+    assert load_chain(str(json_path)) == [block(i) for i in range(5)]
+    log = ChainLog.open(str(json_path.with_suffix(".log")))
+    assert log.tip_hash() == block(4)["hash"]
+    log.close()
+
+
+def test_appends_alternate_between_writers(chain):
+    json_path, script = chain
+    write_python(json_path, 2)
+    assert node(script, "append", json_path, 2) == [block(i) for i in range(3)]
+    log = ChainLog(str(json_path.with_suffix(".log"))).open_for_append()
+    log.append(block(3))
+    log.close()
+    assert node(script, "read", json_path) == [block(i) for i in range(4)]
+
+
+@pytest.mark.parametrize("writer", ["python", "node"])
+def test_torn_last_record(chain, writer):
+    json_path, script = chain
+    if writer == "python":
+        write_python(json_path, 4)
+    else:
+        node(script, "create", json_path, 4)
+    tear_last_record(json_path)
+
+    # Readers on both sides stop before the torn block.
+    assert node(script, "read", json_path) == [block(i) for i in range(3)]
+    assert load_chain(str(json_path)) == [block(i) for i in range(3)]
+
+    # The next writer, on the other side, cuts it off and appends in its place.
+    if writer == "python":
+        assert node(script, "append", json_path, 3) == [block(i) for i in range(4)]
+    else:
+        log = ChainLog(str(json_path.with_suffix(".log"))).open_for_append()
+        log.append(block(3))
+        log.close()
+    assert load_chain(str(json_path)) == [block(i) for i in range(4)]
+    assert node(script, "read", json_path) == [block(i) for i in range(4)]
+
+
+@pytest.mark.parametrize("writer", ["python", "node"])
+def test_crc_mismatch(chain, writer):
+    json_path, script = chain
+    if writer == "python":
+        write_python(json_path, 4)
+    else:
+        node(script, "create", json_path, 4)
+    corrupt_last_record(json_path)
+
+    # Readers refuse the corrupt block instead of returning it.
+    assert "checksum mismatch" in node(script, "read", json_path)["error"]
+    with pytest.raises(ChainLogError, match="checksum mismatch"):
+        load_chain(str(json_path))
+
+    # A writer drops it and the blocks before it read back intact.
+    assert node(script, "append", json_path, 3) == [block(i) for i in range(4)]
+    corrupt_last_record(json_path)
+    log = ChainLog(str(json_path.with_suffix(".log"))).open_for_append()
+    assert len(log) == 3
+    log.close()
+    assert load_chain(str(json_path)) == [block(i) for i in range(3)]
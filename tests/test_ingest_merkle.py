@@ -0,0 +1,78 @@
+"""
+ingest_posts.py merkle followed by a blockchain.js restart: the queue the
+server had, and the posts ingested, must all end up on chain, and the next
+addRecord must queue behind them rather than replace the pending log.
+"""
+import json
+import os
+import shutil
+import subprocess
+
+import pytest
+
+import ingest_posts
+from common.chain_log import ChainLog
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+NODE = shutil.which("node")
+
+# Prints the chain's records and the queue after an optional addRecord.
+SCRIPT = """
+const { Blockchain } = require("./blockchain");
+const bc = new Blockchain(1, "./chain.json", 4);
+for (const id of process.argv.slice(2)) bc.addRecord({ recordId: id, commitment: "c" + id });
+console.log(JSON.stringify({
+  chain: bc.chain.slice(1).map((b) => b.records.map((r) => r.recordId)),
+  pending: bc.pendingRecords.map((r) => r.recordId),
+  valid: bc.isChainValid(true),
+}));
+"""
+
+
+@pytest.fixture
+def backend(tmp_path, monkeypatch):
+    shutil.copytree(os.path.join(ROOT, "common"), tmp_path / "common",
+                    ignore=shutil.ignore_patterns("__pycache__"))
+    backend_dir = tmp_path / "merkle_tree_blockchain"
+    backend_dir.mkdir()
+    for name in ("blockchain.js", "merkle.py", "quotes.db"):
+        shutil.copy(os.path.join(ROOT, "merkle_tree_blockchain", name), backend_dir)
+    (backend_dir / "state.js").write_text(SCRIPT)
+    monkeypatch.setitem(ingest_posts.BACKENDS, "merkle", str(backend_dir))
+    return backend_dir
+
+
+def run_node(backend_dir, *record_ids):
+    out = subprocess.run([NODE, "state.js", *record_ids], cwd=backend_dir,
+                         check=True, capture_output=True, text=True).stdout
+    return json.loads(out.splitlines()[-1])
+
+
+def write_dump(posts_dir, ids):
+    folder = posts_dir / "twitter"
+    folder.mkdir(parents=True)
+    doc = {"data": [{"id": i, "text": f"post number {i}", "created_at": "2024-01-01T00:00:00.000Z"} for i in ids]}
+    (folder / "alice_20240101-000000.json").write_text(json.dumps(doc))
+
+
+@pytest.mark.skipif(NODE is None, reason="needs node")
+def test_ingest_then_restart_keeps_the_queue(backend, tmp_path):
+    # The server queued two records, short of a block, then stopped.
+    before = run_node(backend, "q1", "q2")
+    assert before["pending"] == ["q1", "q2"]
+
+    ids = [f"t{i}" for i in range(7)]
+    write_dump(tmp_path / "posts", ids)
+    summary = ingest_posts.ingest("merkle", str(tmp_path / "posts"), difficulty=1, max_records=4)
+    assert summary["inserted"] == 7
+    assert summary["pending"] == 0
+    assert len(ChainLog.open(str(backend / "pending.log"))) == 0
+
+    after = run_node(backend, "n1")
+    assert after["valid"]
+    assert [r for block in after["chain"] for r in block] == ["q1", "q2"] + ids
+    assert after["pending"] == ["n1"]
+
+    # A second restart still sees the record queued by the first.
+    again = run_node(backend, "n2")
+    assert again["pending"] == ["n1", "n2"]
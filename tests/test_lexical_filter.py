@@ -0,0 +1,22 @@
+from common.lexical_filter import exact_matches
+
+POST = {"content": "We will build the greatest infrastructure this country has ever seen, believe me!"}
+
+
+def test_exact_match_ignores_case_and_punctuation():
+    quote = "we will build the GREATEST infrastructure this country has ever seen -- believe me"
+    assert exact_matches(quote, [POST]) == [0]
+
+
+def test_long_excerpt_matches():
+    assert exact_matches("the greatest infrastructure this country has ever seen", [POST]) == [0]
+
+
+def test_excerpt_must_start_and_end_on_word_boundaries():
+    # One letter off at either end is a different word, not an excerpt.
+    assert exact_matches("he greatest infrastructure this country has ever seen", [POST]) == []
+    assert exact_matches("the greatest infrastructure this country has ever see", [POST]) == []
+
+
+def test_short_excerpt_is_left_to_the_model():
+    assert exact_matches("believe me", [POST]) == []
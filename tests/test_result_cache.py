@@ -0,0 +1,19 @@
+from common import result_cache
+from common.result_cache import ResultCache, cache_key
+
+
+def test_settings_are_part_of_the_version(tmp_path):
+    db = str(tmp_path / "cache.db")
+    key = cache_key("alice", "A quote")
+    ResultCache(db_path=db, settings="torch|fp32").put(key, "7", {"verified": True})
+
+    assert ResultCache(db_path=db, settings="torch|fp32").get(key, "7") == {"verified": True}
+    assert ResultCache(db_path=db, settings="torch|int8").get(key, "7") is None
+    assert ResultCache(db_path=db, settings="onnx:/models/x|fp32").get(key, "7") is None
+
+
+def test_from_env_tags_encoder_and_tier(monkeypatch):
+    monkeypatch.setenv("VERIFY_ENCODER", "onnx")
+    monkeypatch.setenv("VERIFY_ONNX_MODEL", "/models/minilm")
+    monkeypatch.setattr(result_cache, "TIER", "binary")
+    assert result_cache.from_env().settings == "onnx:/models/minilm|binary"